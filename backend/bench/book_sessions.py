@@ -0,0 +1,149 @@
+"""Concurrent booking benchmark for studio sessions
+
+Fires N simultaneous bookings at one session through the same code path as
+POST /sessions/{id}/book, then cancels some seats concurrently, and checks
+that the seat counter, bookings and waitlist still agree:
+
+    python bench/book_sessions.py --bookings 1000 --capacity 50
+    python bench/book_sessions.py --in-memory
+
+Runs against MONGO_URL/DB_NAME from backend/.env in a throwaway database
+(suffixed _bench, dropped afterwards); --in-memory uses mongomock instead,
+which checks correctness but says little about real latency.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+app = typer.Typer(add_completion=False)
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+async def timed(coro, latencies):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        latencies.append((time.perf_counter() - started) * 1000)
+
+def report(label: str, latencies, elapsed: float):
+    typer.echo(
+        f"{label}: {len(latencies)} requests in {elapsed:.2f}s "
+        f"({len(latencies) / elapsed:.0f}/s), latency ms "
+        f"p50={statistics.median(latencies):.1f} p95={percentile(latencies, 0.95):.1f} "
+        f"p99={percentile(latencies, 0.99):.1f} max={max(latencies):.1f}"
+    )
+
+async def check_consistency(session_id: str, capacity: int) -> dict:
+    """Seat counter, bookings and waitlist must agree"""
+    session = await server.db.studio_sessions.find_one({"session_id": session_id}, {"_id": 0, "booked": 1})
+    counts = {
+        status: await server.db.session_bookings.count_documents({"session_id": session_id, "status": status})
+        for status in ("booked", "waitlisted")
+    }
+    problems = []
+    if session["booked"] != counts["booked"]:
+        problems.append(f"seat counter {session['booked']} != {counts['booked']} booked")
+    if counts["booked"] > capacity:
+        problems.append(f"{counts['booked']} booked over capacity {capacity}")
+    if counts["waitlisted"] and counts["booked"] < capacity:
+        problems.append(f"{counts['waitlisted']} waitlisted with free seats")
+    return {**counts, "problems": problems}
+
+async def run(bookings: int, capacity: int, cancels: int) -> bool:
+    start_time = datetime.now(timezone.utc) + timedelta(days=1)
+    session = server.StudioSession(
+        title="Booking benchmark",
+        start_time=start_time,
+        end_time=start_time + timedelta(hours=2),
+        max_participants=capacity,
+        session_type="music",
+        created_by="bench"
+    )
+    await server.db.studio_sessions.insert_one(session.dict())
+    users = [
+        server.User(user_id=f"bench_{i}_{uuid.uuid4().hex[:6]}", email=f"bench{i}@example.com", name=f"Bench {i}")
+        for i in range(bookings)
+    ]
+    
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        timed(server.book_session(session.session_id, user), latencies) for user in users
+    ], return_exceptions=True)
+    report("book", latencies, time.perf_counter() - started)
+    errors = [r for r in results if isinstance(r, Exception)]
+    
+    state = await check_consistency(session.session_id, capacity)
+    typer.echo(f"  booked={state['booked']} waitlisted={state['waitlisted']} errors={len(errors)}")
+    ok = not errors and not state["problems"] and state["booked"] == min(capacity, bookings)
+    
+    booked = [
+        user for user, result in zip(users, results)
+        if not isinstance(result, Exception) and result["status"] == "booked"
+    ][:cancels]
+    if booked:
+        latencies = []
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            timed(server.cancel_booking(session.session_id, user), latencies) for user in booked
+        ], return_exceptions=True)
+        report("cancel", latencies, time.perf_counter() - started)
+        errors = [r for r in results if isinstance(r, Exception)]
+        promoted = sum(len(r["promoted"]) for r in results if not isinstance(r, Exception))
+        
+        after = await check_consistency(session.session_id, capacity)
+        typer.echo(
+            f"  booked={after['booked']} waitlisted={after['waitlisted']} "
+            f"promoted={promoted} errors={len(errors)}"
+        )
+        state["problems"] += after["problems"]
+        ok = ok and not errors and after["booked"] == min(capacity, bookings - len(booked))
+    
+    for problem in state["problems"]:
+        typer.echo(f"  INCONSISTENT: {problem}")
+    return ok and not state["problems"]
+
+@app.command()
+def main(
+    bookings: int = typer.Option(1000, help="Concurrent booking requests"),
+    capacity: int = typer.Option(50, help="Seats in the session"),
+    cancels: int = typer.Option(25, help="Booked seats to cancel concurrently afterwards"),
+    in_memory: bool = typer.Option(False, "--in-memory", help="Use mongomock instead of MongoDB")
+):
+    if in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient(tz_aware=True)
+    else:
+        client = server.AsyncIOMotorClient(os.environ["MONGO_URL"], maxPoolSize=200)
+    database = f"{os.environ['DB_NAME']}_bench"
+    server.db = client[database]
+    
+    async def go():
+        await server.db.session_bookings.create_index(
+            [("session_id", server.ASCENDING), ("user_id", server.ASCENDING)], unique=True
+        )
+        try:
+            return await run(bookings, capacity, cancels)
+        finally:
+            await client.drop_database(database)
+    
+    ok = asyncio.run(go())
+    typer.echo("consistent" if ok else "FAILED")
+    raise typer.Exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,187 @@
+"""Leaderboard aggregation benchmark for music_impact and gaming_ranked
+
+Seeds a year of game scores, tracks and contributions, then times the
+period-aware pipelines in compute_leaderboard against the pipelines they
+replaced (an all-time track scan plus a separate contribution pass for
+music_impact, and an unprojected gaming_ranked scan):
+
+    python bench/compute_leaderboard.py --scores 1000000 --contributions 1000000
+    python bench/compute_leaderboard.py --period-days 7 --repeat 10
+
+Runs against MONGO_URL/DB_NAME from backend/.env in a throwaway database
+(suffixed _bench, dropped afterwards) with the indexes from ensure_indexes.
+There is no in-memory mode: mongomock has no $unionWith.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+app = typer.Typer(add_completion=False)
+
+async def seed(users: int, tracks: int, contributions: int, scores: int, days: int, now: datetime):
+    """Insert history spread evenly over the last `days` days"""
+    rng = random.Random(7)
+    
+    def when():
+        return now - timedelta(seconds=rng.uniform(0, days * 86400))
+    
+    def user():
+        return f"bench_user_{rng.randrange(users)}"
+    
+    game_types = [t.value for t in server.GameType]
+    batches = {
+        "tracks": (tracks, lambda i: {
+            "track_id": f"track_{i}", "title": f"Track {i}", "created_by": user(),
+            "listens": rng.randrange(0, 5000), "likes": rng.randrange(0, 300), "created_at": when()
+        }),
+        "track_contributions": (contributions, lambda i: {
+            "contribution_id": f"contrib_{i}", "track_id": f"track_{rng.randrange(max(tracks, 1))}",
+            "user_id": user(), "contribution_type": rng.choice(server.CONTRIBUTION_TYPES), "created_at": when()
+        }),
+        "game_scores": (scores, lambda i: {
+            "score_id": f"score_{i}", "match_id": f"match_{i // 4}", "user_id": user(),
+            "score": rng.randrange(0, 3000), "kills": rng.randrange(0, 30), "deaths": rng.randrange(0, 30),
+            "assists": rng.randrange(0, 20), "rank_position": rng.randrange(1, 5),
+            "game_type": rng.choice(game_types), "game_name": "Bench", "created_at": when()
+        })
+    }
+    for name, (count, make) in batches.items():
+        started = time.perf_counter()
+        for start in range(0, count, 10000):
+            await server.db[name].insert_many(
+                [make(i) for i in range(start, min(start + 10000, count))], ordered=False
+            )
+        typer.echo(f"seeded {count} {name} in {time.perf_counter() - started:.1f}s")
+
+async def old_music_impact(limit: int):
+    """music_impact before it was period-aware: all tracks, contributions merged in Python"""
+    pipeline = [
+        {"$group": {
+            "_id": "$created_by",
+            "tracks_created": {"$sum": 1},
+            "total_listens": {"$sum": "$listens"},
+            "total_likes": {"$sum": "$likes"}
+        }},
+        {"$addFields": {
+            "score": {"$add": [
+                {"$multiply": ["$tracks_created", 50]},
+                {"$divide": ["$total_listens", 10]},
+                {"$multiply": ["$total_likes", 5]}
+            ]}
+        }},
+        {"$sort": {"score": -1}},
+        {"$limit": limit}
+    ]
+    results = await server.db.tracks.aggregate(pipeline).to_list(limit)
+    contribs = await server.db.track_contributions.aggregate([
+        {"$group": {"_id": "$user_id", "contributions": {"$sum": 1}}}
+    ]).to_list(1000)
+    contrib_map = {c["_id"]: c["contributions"] for c in contribs}
+    for r in results:
+        r["contributions"] = contrib_map.get(r["_id"], 0)
+        r["score"] += r["contributions"] * 30
+    return results
+
+async def old_gaming_ranked(start_date: datetime, end_date: datetime, limit: int):
+    """gaming_ranked before its scan was projected down to indexed fields"""
+    pipeline = [
+        {"$match": {"created_at": {"$gte": start_date, "$lt": end_date}}},
+        {"$group": {
+            "_id": "$user_id",
+            "total_score": {"$sum": "$score"},
+            "total_kills": {"$sum": "$kills"},
+            "total_deaths": {"$sum": "$deaths"},
+            "wins": {"$sum": {"$cond": [{"$eq": ["$rank_position", 1]}, 1, 0]}},
+            "matches": {"$sum": 1}
+        }},
+        {"$addFields": server.GAMING_SCORE_FIELDS},
+        {"$sort": {"score": -1}},
+        {"$limit": limit}
+    ]
+    return await server.db.game_scores.aggregate(pipeline).to_list(limit)
+
+async def time_runs(label: str, make, repeat: int):
+    """Run a pipeline `repeat` times and report its latency"""
+    latencies, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await make()
+        latencies.append((time.perf_counter() - started) * 1000)
+    typer.echo(
+        f"{label}: {repeat} runs, latency ms "
+        f"min={min(latencies):.1f} p50={statistics.median(latencies):.1f} max={max(latencies):.1f}"
+    )
+    return result
+
+async def run(
+    users: int,
+    tracks: int,
+    contributions: int,
+    scores: int,
+    days: int,
+    period_days: int,
+    limit: int,
+    repeat: int
+) -> bool:
+    now = datetime.now(timezone.utc)
+    await server.ensure_indexes()
+    await seed(users, tracks, contributions, scores, days, now)
+    start_date, end_date = now - timedelta(days=period_days), now + timedelta(seconds=1)
+    
+    await time_runs("music_impact old (all time)", lambda: old_music_impact(limit), repeat)
+    await time_runs(
+        f"music_impact new ({period_days}d)",
+        lambda: server.compute_leaderboard("music_impact", start_date, end_date, limit), repeat
+    )
+    old = await time_runs("gaming_ranked old", lambda: old_gaming_ranked(start_date, end_date, limit), repeat)
+    new = await time_runs(
+        "gaming_ranked new",
+        lambda: server.compute_leaderboard("gaming_ranked", start_date, end_date, limit), repeat
+    )
+    
+    # The gaming projection must not change the ranking
+    def ranking(rows):
+        return [(r["_id"], round(r["score"], 6)) for r in rows]
+    if ranking(old) != ranking(new):
+        typer.echo("  MISMATCH: gaming_ranked rankings differ")
+        return False
+    return True
+
+@app.command()
+def main(
+    users: int = typer.Option(20000, help="Distinct users in the seeded history"),
+    tracks: int = typer.Option(100000, help="Tracks to seed"),
+    contributions: int = typer.Option(1000000, help="Track contributions to seed"),
+    scores: int = typer.Option(1000000, help="Game scores to seed"),
+    days: int = typer.Option(365, help="Days of history to spread the seed over"),
+    period_days: int = typer.Option(30, help="Leaderboard window in days"),
+    limit: int = typer.Option(50, help="Leaderboard entries"),
+    repeat: int = typer.Option(5, help="Timed runs per pipeline")
+):
+    client = server.AsyncIOMotorClient(os.environ["MONGO_URL"])
+    database = f"{os.environ['DB_NAME']}_bench"
+    server.db = client[database]
+    
+    async def go():
+        try:
+            return await run(users, tracks, contributions, scores, days, period_days, limit, repeat)
+        finally:
+            await client.drop_database(database)
+    
+    ok = asyncio.run(go())
+    typer.echo("consistent" if ok else "FAILED")
+    raise typer.Exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,358 @@
+"""Offline rebuild of user XP, levels, streaks and badges from history
+
+Replays attendance, tracks, contributions, game scores, match wins, season
+rewards and badges with the scoring rules in server.py, so a rule change can
+be applied retroactively:
+
+    python rebuild.py --dry-run
+    python rebuild.py --workers 8 --max-writes-per-second 1000
+
+Users are split into batches that worker processes replay independently;
+writes are applied from the main process with throttled bulk_writes. Running
+API workers pick up the new XP on their next ranking sync.
+"""
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Dict, Any
+import json
+import os
+import time
+
+from pymongo import MongoClient, UpdateOne, DeleteOne
+import typer
+
+from server import (
+    ROOT_DIR, STREAK_BADGES, LEVEL_BADGES, TRACK_CREATED_XP, CONTRIBUTION_XP, MATCH_WIN_XP,
+    UserBadge, as_utc, attendance_xp, score_xp, level_progress, total_xp
+)
+
+app = typer.Typer(add_completion=False)
+
+# Badges whose award rules are replayed; any other earned badge is kept as is
+ONBOARDING_BADGE = "first_steps"
+RULE_BADGES = {ONBOARDING_BADGE, *STREAK_BADGES.values(), *LEVEL_BADGES.values()}
+
+# Per worker process, set up by init_worker
+worker_db = None
+worker_rewards: Dict[str, int] = {}
+worker_now: datetime = None
+
+def init_worker(mongo_url: str, db_name: str, rewards: Dict[str, int], now: datetime):
+    global worker_db, worker_rewards, worker_now
+    worker_db = MongoClient(mongo_url, tz_aware=True)[db_name]
+    worker_rewards = rewards
+    worker_now = now
+
+def replay_user(
+    user: Dict[str, Any],
+    events: List[tuple],
+    badges: Dict[str, datetime],
+    rewards: Dict[str, int],
+    now: datetime
+) -> Dict[str, Any]:
+    """Recompute one user's state from their time-ordered history
+    
+    `events` holds (time, order, kind, value) tuples where kind is "xp" (value
+    is the amount), "badge" (value is the badge id) or "check_in". Mirrors
+    add_xp, award_badge, check_level_badges, update_streak and the nightly
+    streak reset. Like the API, the streak counts from the signup day, which
+    get_current_user records as last_active, so a first check-in that same
+    day leaves the streak at 0.
+    """
+    signup = user.get("created_at")
+    state = {"total": 0, "streak": 0, "last_day": as_utc(signup).date() if signup else None}
+    earned: Dict[str, datetime] = {}
+    
+    def gain(amount: int, at: datetime):
+        before = level_progress(state["total"])[0]
+        state["total"] += amount
+        after = level_progress(state["total"])[0]
+        if after > before:
+            for threshold, badge_id in LEVEL_BADGES.items():
+                if after >= threshold:
+                    award(badge_id, at)
+    
+    def award(badge_id: str, at: datetime):
+        if badge_id in earned or (badge_id in RULE_BADGES and badge_id not in rewards):
+            return
+        earned[badge_id] = at
+        if rewards.get(badge_id, 0) > 0:
+            gain(rewards[badge_id], at)
+    
+    # Onboarding and badges awarded outside the replayed rules
+    if user.get("onboarding_completed"):
+        events.append((badges.get(ONBOARDING_BADGE) or as_utc(user["created_at"]), 0, "badge", ONBOARDING_BADGE))
+    for badge_id, at in badges.items():
+        if badge_id not in RULE_BADGES:
+            events.append((at, 0, "badge", badge_id))
+    
+    for at, _, kind, value in sorted(events, key=lambda e: (e[0], e[1])):
+        if kind == "xp":
+            gain(value, at)
+        elif kind == "badge":
+            award(value, at)
+        elif kind == "check_in":
+            day = at.date()
+            last_day = state["last_day"]
+            if last_day is None or (day - last_day).days > 1:
+                state["streak"] = 1
+            elif (day - last_day).days == 1:
+                state["streak"] += 1
+            state["last_day"] = day
+            for threshold, badge_id in STREAK_BADGES.items():
+                if state["streak"] >= threshold:
+                    award(badge_id, at)
+    
+    # Anyone who missed yesterday has lost their streak
+    if state["last_day"] is None or state["last_day"] < (now - timedelta(days=1)).date():
+        state["streak"] = 0
+    
+    level, xp = level_progress(state["total"])
+    return {
+        "level": level,
+        "xp": xp,
+        "streak_days": state["streak"],
+        "badges": earned
+    }
+
+def load_histories(user_ids: List[str]) -> Dict[str, List[tuple]]:
+    """Every XP-earning event and check-in of a batch of users"""
+    history: Dict[str, List[tuple]] = {user_id: [] for user_id in user_ids}
+    members = {"$in": user_ids}
+    
+    for a in worker_db.attendance.find(
+        {"user_id": members},
+        {"_id": 0, "user_id": 1, "check_in": 1, "check_out": 1, "duration_minutes": 1}
+    ):
+        history[a["user_id"]].append((as_utc(a["check_in"]), 0, "check_in", None))
+        if a.get("check_out"):
+            history[a["user_id"]].append(
+                (as_utc(a["check_out"]), 1, "xp", attendance_xp(a.get("duration_minutes", 0)))
+            )
+    
+    for t in worker_db.tracks.find({"created_by": members}, {"_id": 0, "created_by": 1, "created_at": 1}):
+        history[t["created_by"]].append((as_utc(t["created_at"]), 1, "xp", TRACK_CREATED_XP))
+    
+    for c in worker_db.track_contributions.find({"user_id": members}, {"_id": 0, "user_id": 1, "created_at": 1}):
+        history[c["user_id"]].append((as_utc(c["created_at"]), 1, "xp", CONTRIBUTION_XP))
+    
+    for s in worker_db.game_scores.find(
+        {"user_id": members},
+        {"_id": 0, "user_id": 1, "score": 1, "kills": 1, "rank_position": 1, "created_at": 1}
+    ):
+        xp_earned = score_xp(s["score"], s.get("kills", 0), s.get("rank_position", 0))
+        history[s["user_id"]].append((as_utc(s["created_at"]), 1, "xp", xp_earned))
+    
+    for m in worker_db.game_matches.find(
+        {"winner_id": members, "status": "completed"},
+        {"_id": 0, "winner_id": 1, "ended_at": 1, "created_at": 1}
+    ):
+        history[m["winner_id"]].append((as_utc(m.get("ended_at") or m["created_at"]), 1, "xp", MATCH_WIN_XP))
+    
+    # Season rewards come from final standings that no longer exist, so the
+    # granted amounts are replayed as recorded
+    for e in worker_db.gamification_events.find(
+        {"user_id": members, "event_type": "season_reward"},
+        {"_id": 0, "user_id": 1, "xp_amount": 1, "created_at": 1}
+    ):
+        history[e["user_id"]].append((as_utc(e["created_at"]), 1, "xp", e["xp_amount"]))
+    
+    return history
+
+def rebuild_batch(user_ids: List[str]) -> List[Dict[str, Any]]:
+    """Replay a batch of users and return the ones whose state changed"""
+    users = worker_db.users.find(
+        {"user_id": {"$in": user_ids}},
+        {"_id": 0, "user_id": 1, "created_at": 1, "onboarding_completed": 1,
+         "xp": 1, "level": 1, "streak_days": 1}
+    )
+    badges: Dict[str, Dict[str, datetime]] = {user_id: {} for user_id in user_ids}
+    for b in worker_db.user_badges.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "badge_id": 1, "earned_at": 1}):
+        badges[b["user_id"]].setdefault(b["badge_id"], as_utc(b["earned_at"]))
+    history = load_histories(user_ids)
+    
+    diffs = []
+    for user in users:
+        user_id = user["user_id"]
+        rebuilt = replay_user(user, history[user_id], badges[user_id], worker_rewards, worker_now)
+        
+        changes = {
+            field: [user.get(field), rebuilt[field]]
+            for field in ("level", "xp", "streak_days")
+            if user.get(field) != rebuilt[field]
+        }
+        added = sorted(set(rebuilt["badges"]) - set(badges[user_id]))
+        removed = sorted(set(badges[user_id]) - set(rebuilt["badges"]))
+        if changes or added or removed:
+            diffs.append({
+                "user_id": user_id,
+                "changes": changes,
+                "xp_delta": total_xp(rebuilt["level"], rebuilt["xp"])
+                            - total_xp(user.get("level", 1), user.get("xp", 0)),
+                "badges_added": {badge_id: rebuilt["badges"][badge_id] for badge_id in added},
+                "badges_removed": removed,
+                "state": {k: rebuilt[k] for k in ("level", "xp", "streak_days")},
+                "read": {k: user.get(k) for k in ("level", "xp", "streak_days")}
+            })
+    return diffs
+
+def diff_writes(diff: Dict[str, Any]) -> Dict[str, list]:
+    """Write operations applying a diff
+    
+    The user update only matches while the user still has the values the
+    replay read, so XP earned or a check-in made meanwhile is not overwritten;
+    such users are reported as skipped instead.
+    """
+    user_id = diff["user_id"]
+    state = {k: v for k, v in diff["state"].items() if v is not None}
+    # Lets running API workers pick up the new XP on their next ranking sync
+    state["xp_updated_at"] = datetime.now(timezone.utc)
+    badge_ops = [
+        UpdateOne(
+            {"user_id": user_id, "badge_id": badge_id},
+            {"$setOnInsert": UserBadge(user_id=user_id, badge_id=badge_id, earned_at=earned_at).dict()},
+            upsert=True
+        )
+        for badge_id, earned_at in diff["badges_added"].items()
+    ]
+    badge_ops += [DeleteOne({"user_id": user_id, "badge_id": badge_id}) for badge_id in diff["badges_removed"]]
+    return {
+        "users": [UpdateOne({"user_id": user_id, **diff["read"]}, {"$set": state})],
+        "user_badges": badge_ops
+    }
+
+class ThrottledWriter:
+    """Buffers write operations per collection and applies them as bulk_writes
+    no faster than `max_per_second` operations
+    """
+    
+    def __init__(self, db, batch_size: int, max_per_second: float):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_per_second = max_per_second
+        self.pending: Dict[str, list] = {}
+        self.written = 0
+        # Operations per collection whose filter matched nothing
+        self.unmatched: Dict[str, int] = {}
+    
+    def add(self, collection: str, ops: list):
+        self.pending.setdefault(collection, []).extend(ops)
+        if len(self.pending[collection]) >= self.batch_size:
+            self.flush(collection)
+    
+    def flush(self, collection: Optional[str] = None):
+        for name in [collection] if collection else list(self.pending):
+            ops = self.pending.pop(name, [])
+            for i in range(0, len(ops), self.batch_size):
+                batch = ops[i:i + self.batch_size]
+                started = time.monotonic()
+                result = self.db[name].bulk_write(batch, ordered=False)
+                self.written += len(batch)
+                applied = result.matched_count + result.upserted_count + result.deleted_count
+                if applied < len(batch):
+                    self.unmatched[name] = self.unmatched.get(name, 0) + len(batch) - applied
+                if self.max_per_second > 0:
+                    time.sleep(max(0.0, len(batch) / self.max_per_second - (time.monotonic() - started)))
+
+def find_skipped(db, targets: Dict[str, tuple]) -> List[str]:
+    """Users whose stored state is not what the rebuild wrote"""
+    skipped = []
+    user_ids = list(targets)
+    for i in range(0, len(user_ids), 1000):
+        for u in db.users.find(
+            {"user_id": {"$in": user_ids[i:i + 1000]}},
+            {"_id": 0, "user_id": 1, "level": 1, "xp": 1, "streak_days": 1}
+        ):
+            if (u.get("level"), u.get("xp"), u.get("streak_days")) != targets[u["user_id"]]:
+                skipped.append(u["user_id"])
+    return sorted(skipped)
+
+def format_diff(diff: Dict[str, Any]) -> str:
+    parts = [f"{field} {old} -> {new}" for field, (old, new) in diff["changes"].items()]
+    parts += [f"+{badge_id}" for badge_id in diff["badges_added"]]
+    parts += [f"-{badge_id}" for badge_id in diff["badges_removed"]]
+    return f"{diff['user_id']}: {', '.join(parts)} (xp {diff['xp_delta']:+d})"
+
+@app.command()
+def rebuild(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Report differences without writing"),
+    user_id: Optional[List[str]] = typer.Option(None, "--user-id", help="Only rebuild these users"),
+    workers: int = typer.Option(os.cpu_count() or 2, help="Replay processes"),
+    batch_size: int = typer.Option(500, help="Users replayed per task"),
+    write_batch: int = typer.Option(500, help="Operations per bulk_write"),
+    max_writes_per_second: float = typer.Option(2000, help="Write throttle, 0 for unthrottled"),
+    show: int = typer.Option(20, help="Changed users to print"),
+    json_output: bool = typer.Option(False, "--json", help="Print every diff as JSON lines")
+):
+    """Recompute xp, level, streak and badges for every user from history"""
+    from dotenv import load_dotenv
+    load_dotenv(ROOT_DIR / '.env')
+    mongo_url, db_name = os.environ['MONGO_URL'], os.environ['DB_NAME']
+    db = MongoClient(mongo_url, tz_aware=True)[db_name]
+    now = datetime.now(timezone.utc)
+    
+    rewards = {b["badge_id"]: b.get("xp_reward", 0) for b in db.badges.find({}, {"_id": 0, "badge_id": 1, "xp_reward": 1})}
+    query = {"user_id": {"$in": user_id}} if user_id else {}
+    writer = ThrottledWriter(db, write_batch, max_writes_per_second)
+    totals = {"users": 0, "changed": 0, "xp_delta": 0, "badges_added": 0, "badges_removed": 0}
+    # State written per changed user, to spot users whose conditional update was skipped
+    targets: Dict[str, tuple] = {}
+    
+    def handle(diffs: List[Dict[str, Any]]):
+        for diff in diffs:
+            if json_output:
+                typer.echo(json.dumps(diff, default=str))
+            elif totals["changed"] < show:
+                typer.echo(format_diff(diff))
+            totals["changed"] += 1
+            totals["xp_delta"] += diff["xp_delta"]
+            totals["badges_added"] += len(diff["badges_added"])
+            totals["badges_removed"] += len(diff["badges_removed"])
+            if not dry_run:
+                state = diff["state"]
+                targets[diff["user_id"]] = (state["level"], state["xp"], state["streak_days"])
+                for collection, ops in diff_writes(diff).items():
+                    if ops:
+                        writer.add(collection, ops)
+    
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(mongo_url, db_name, rewards, now)
+    ) as pool:
+        inflight = set()
+        batch: List[str] = []
+        # Bounded number of queued batches keeps memory flat on large collections
+        cursor = db.users.find(query, {"_id": 0, "user_id": 1}).batch_size(batch_size)
+        for u in cursor:
+            batch.append(u["user_id"])
+            if len(batch) == batch_size:
+                inflight.add(pool.submit(rebuild_batch, batch))
+                totals["users"] += len(batch)
+                batch = []
+            if len(inflight) >= 2 * workers:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future.result())
+        if batch:
+            inflight.add(pool.submit(rebuild_batch, batch))
+            totals["users"] += len(batch)
+        for future in inflight:
+            handle(future.result())
+    
+    writer.flush()
+    skipped = find_skipped(db, targets) if writer.unmatched.get("users") else []
+    if json_output:
+        if skipped:
+            typer.echo(json.dumps({"skipped": skipped}))
+    else:
+        typer.echo(
+            f"{'Would change' if dry_run else 'Changed'} {totals['changed'] - len(skipped)} of {totals['users']} users "
+            f"(xp {totals['xp_delta']:+d}, badges +{totals['badges_added']} -{totals['badges_removed']})"
+        )
+        if skipped:
+            typer.echo(
+                f"Skipped {len(skipped)} users updated while rebuilding; rerun with --user-id for: "
+                + " ".join(skipped[:show]) + (" ..." if len(skipped) > show else "")
+            )
+
+if __name__ == "__main__":
+    app()
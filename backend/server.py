@@ -1,16 +1,39 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne, ReturnDocument, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from gridfs.errors import NoFile
+from bson import ObjectId, Binary
+from collections import deque, Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import os
+import re
+import io
+import csv
+import json
+import base64
+import hashlib
+import bisect
+import math
+import time
+import random
+import asyncio
 import logging
+import ipaddress
+import socket
+import multiprocessing
+from urllib.parse import urlsplit, urljoin
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Awaitable
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
+import numpy as np
 from enum import Enum
 import jwt
 
@@ -78,6 +101,7 @@ class User(BaseModel):
     email: str
     name: str
     picture: Optional[str] = None
+    picture_image_id: Optional[str] = None
     roles: List[UserRole] = []
     level: int = 1
     xp: int = 0
@@ -113,10 +137,19 @@ class StudioSession(BaseModel):
     start_time: datetime
     end_time: datetime
     max_participants: int = 10
+    booked: int = 0
     session_type: str  # music, gaming, hybrid
     created_by: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class SessionBooking(BaseModel):
+    booking_id: str = Field(default_factory=lambda: f"booking_{uuid.uuid4().hex[:12]}")
+    session_id: str
+    user_id: str
+    status: str = "booked"  # booked, waitlisted
+    queued_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class StudioSessionCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -146,12 +179,16 @@ class Track(BaseModel):
     genre: Optional[str] = None
     duration_seconds: int = 0
     cover_image: Optional[str] = None
+    cover_image_id: Optional[str] = None
     audio_url: Optional[str] = None
+    audio_file_id: Optional[str] = None
     created_by: str
     contributors: List[str] = []
+    contribution_types: List[str] = []
     listens: int = 0
     likes: int = 0
     shares: int = 0
+    trending_score: Optional[float] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TrackCreate(BaseModel):
@@ -175,6 +212,12 @@ class ContributionCreate(BaseModel):
     notes: Optional[str] = None
 
 # Gaming
+class MatchSummary(BaseModel):
+    score_count: int = 0
+    top_score: Optional[int] = None
+    top_user_id: Optional[str] = None
+    totals: List[Dict[str, Any]] = []
+
 class GameMatch(BaseModel):
     match_id: str = Field(default_factory=lambda: f"match_{uuid.uuid4().hex[:12]}")
     title: str
@@ -186,6 +229,7 @@ class GameMatch(BaseModel):
     created_by: str
     started_at: Optional[datetime] = None
     ended_at: Optional[datetime] = None
+    summary: MatchSummary = Field(default_factory=MatchSummary)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class MatchCreate(BaseModel):
@@ -194,6 +238,10 @@ class MatchCreate(BaseModel):
     game_name: str
     participants: List[str] = []
 
+class MatchmakingRequest(BaseModel):
+    mode: str = "teams"  # teams, bracket
+    team_count: int = 2
+
 class GameScore(BaseModel):
     score_id: str = Field(default_factory=lambda: f"score_{uuid.uuid4().hex[:12]}")
     match_id: str
@@ -204,6 +252,9 @@ class GameScore(BaseModel):
     assists: int = 0
     rank_position: int = 0
     xp_earned: int = 0
+    # Denormalized from the match so per-genre rankings need no join
+    game_type: Optional[GameType] = None
+    game_name: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ScoreSubmit(BaseModel):
@@ -240,6 +291,8 @@ class GamificationEvent(BaseModel):
     xp_amount: int
     description: str
     metadata: Dict[str, Any] = {}
+    # Stored explicitly so "not flagged" is an indexed equality match
+    flagged: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # Leaderboard
@@ -255,7 +308,10 @@ class LeaderboardSnapshot(BaseModel):
     snapshot_id: str = Field(default_factory=lambda: f"snap_{uuid.uuid4().hex[:12]}")
     category: LeaderboardCategory
     period: LeaderboardPeriod
+    season_id: Optional[str] = None
     entries: List[Dict[str, Any]] = []
+    size: int = 0
+    is_final: bool = False
     calculated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # Seasons
@@ -265,7 +321,9 @@ class Season(BaseModel):
     start_date: datetime
     end_date: datetime
     is_active: bool = False
+    category: LeaderboardCategory = LeaderboardCategory.HYBRID_MASTER
     rewards: List[Dict[str, Any]] = []
+    finalized: bool = False
 
 # Audit Logs
 class AuditLog(BaseModel):
@@ -341,8 +399,13 @@ async def get_current_user(request: Request) -> User:
                     is_admin=False
                 )
                 
-                await db.users.insert_one(new_user.dict())
+                await db.users.insert_one({
+                    **new_user.dict(),
+                    **user_search_fields(name, email),
+                    "xp_updated_at": new_user.created_at
+                })
                 user_doc = new_user.dict()
+                xp_ranking.update(user_id, 0)
             
             return User(**user_doc)
             
@@ -386,6 +449,302 @@ async def get_optional_user(request: Request) -> Optional[User]:
     except HTTPException:
         return None
 
+# ============== REQUEST COALESCING ==============
+
+class SingleFlight:
+    """Let concurrent identical calls share one in-flight computation
+    
+    Callers passing the same key while a computation is running await that
+    computation instead of starting their own. With a ttl, the finished
+    result is also reused for that many seconds.
+    """
+    MAX_CACHED_RESULTS = 1000
+    
+    def __init__(self, name: str, ttl: float = 0):
+        self.name = name
+        self.ttl = ttl
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self._results: Dict[Any, tuple] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        SINGLE_FLIGHTS[name] = self
+    
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._results.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return cached[1]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        
+        # Shielded so one caller disconnecting doesn't cancel it for the others
+        return await asyncio.shield(task)
+    
+    async def _run(self, key, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await fn()
+            if self.ttl > 0:
+                if len(self._results) >= self.MAX_CACHED_RESULTS:
+                    now = time.monotonic()
+                    self._results = {k: v for k, v in self._results.items() if v[0] > now}
+                self._results[key] = (time.monotonic() + self.ttl, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "in_flight": len(self._inflight),
+            "ttl_seconds": self.ttl
+        }
+
+# Every coalescing layer, by name, for the admin metrics endpoint
+SINGLE_FLIGHTS: Dict[str, SingleFlight] = {}
+
+# ============== RATE LIMITING ==============
+
+# Per-user token buckets for write hot paths: (requests per minute, burst).
+# Override with RATE_LIMITS='{"like": [10, 3]}'.
+RATE_LIMITS: Dict[str, tuple] = {
+    "listen": (30, 10),
+    "like": (20, 5),
+    "score": (60, 20),
+    "check_in": (6, 3),
+    **{k: tuple(v) for k, v in json.loads(os.environ.get("RATE_LIMITS", "{}")).items()}
+}
+# "local" keeps buckets in this worker; "mongo" shares them across workers
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local")
+
+class LocalBuckets:
+    """Token buckets held in process memory"""
+    MAX_BUCKETS = 100000
+    
+    def __init__(self):
+        self.buckets: Dict[str, List[float]] = {}
+    
+    async def take(self, key: str, per_second: float, burst: int) -> float:
+        """Spend a token; 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                self.prune(now)
+            bucket = self.buckets[key] = [float(burst), now]
+        
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * per_second)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / per_second
+    
+    def prune(self, now: float):
+        # Buckets idle long enough to have refilled carry no state worth keeping
+        slowest = min(per_minute / 60 for per_minute, _ in RATE_LIMITS.values())
+        max_burst = max(burst for _, burst in RATE_LIMITS.values())
+        idle = max_burst / slowest
+        self.buckets = {k: b for k, b in self.buckets.items() if now - b[1] < idle}
+
+class MongoBuckets:
+    """Token buckets shared by all workers, refilled and spent in one atomic write"""
+    
+    async def take(self, key: str, per_second: float, burst: int) -> float:
+        now = datetime.now(timezone.utc)
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        update = [
+            {"$set": {
+                "tokens": {"$min": [
+                    burst,
+                    {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, per_second]}]}
+                ]},
+                "updated_at": now
+            }},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", 1]},
+                "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]}
+            }}
+        ]
+        try:
+            bucket = await db.rate_limits.find_one_and_update(
+                {"key": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker created the bucket first
+            bucket = await db.rate_limits.find_one_and_update(
+                {"key": key}, update, return_document=ReturnDocument.AFTER
+            )
+        if bucket["allowed"]:
+            return 0
+        return (1 - bucket["tokens"]) / per_second
+
+class RateLimiter:
+    """Per-user, per-route token-bucket limiter with throttling counters"""
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.throttled_users: Counter = Counter()
+    
+    async def take(self, name: str, user_id: str) -> float:
+        """0 if the call may proceed, else the seconds to wait"""
+        per_minute, burst = RATE_LIMITS[name]
+        retry_after = await self.backend.take(f"{name}:{user_id}", per_minute / 60, burst)
+        if retry_after:
+            self.throttled[name] += 1
+            self.throttled_users[user_id] += 1
+            if len(self.throttled_users) > 10000:
+                self.throttled_users = Counter(dict(self.throttled_users.most_common(1000)))
+        else:
+            self.allowed[name] += 1
+        return retry_after
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": RATE_LIMIT_BACKEND,
+            "limits": {name: {"per_minute": p, "burst": b} for name, (p, b) in RATE_LIMITS.items()},
+            "allowed": dict(self.allowed),
+            "throttled": dict(self.throttled),
+            "top_throttled_users": self.throttled_users.most_common(10)
+        }
+
+rate_limiter = RateLimiter(MongoBuckets() if RATE_LIMIT_BACKEND == "mongo" else LocalBuckets())
+
+def rate_limited(name: str):
+    """Dependency resolving the current user after spending one of their `name` tokens"""
+    async def dependency(user: User = Depends(get_current_user)) -> User:
+        retry_after = await rate_limiter.take(name, user.user_id)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        return user
+    return dependency
+
+# ============== LIVE STREAMS ==============
+
+# Seconds between SSE keep-alive comments on idle connections
+STREAM_HEARTBEAT_SECONDS = 15
+
+class EventChannel:
+    """In-process pub/sub channel with a replay buffer for reconnects
+    
+    Published events get increasing ids and are kept in a bounded ring buffer,
+    so a reconnecting subscriber can catch up from its Last-Event-ID. Each
+    subscriber reads from its own bounded queue; when a slow subscriber falls
+    behind, its oldest undelivered events are dropped so publishers never block.
+    """
+    
+    def __init__(self, buffer_size: int = 200, queue_size: int = 100):
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.subscribers: set = set()
+        self.last_id = 0
+        self.published = 0
+        self.dropped = 0
+    
+    def _offer(self, queue: asyncio.Queue, event: tuple):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(event)
+    
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        self.last_id += 1
+        self.published += 1
+        event = (self.last_id, event_type, jsonable_encoder(data))
+        self.buffer.append(event)
+        for queue in self.subscribers:
+            self._offer(queue, event)
+        return self.last_id
+    
+    def subscribe(self, last_event_id: Optional[int] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            for event in self.buffer:
+                if event[0] > last_event_id:
+                    self._offer(queue, event)
+        self.subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+    
+    def close(self):
+        """End every subscriber's stream after its pending events"""
+        for queue in self.subscribers:
+            self._offer(queue, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "buffered": len(self.buffer)
+        }
+
+def parse_last_event_id(request: Request) -> Optional[int]:
+    """Read the SSE Last-Event-ID header sent by reconnecting clients"""
+    value = request.headers.get("Last-Event-ID")
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def format_sse(event: tuple) -> str:
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+async def sse_events(
+    request: Request,
+    channel: EventChannel,
+    queue: asyncio.Queue,
+    initial: Optional[tuple] = None
+):
+    """Format a subscriber queue as a Server-Sent Events stream"""
+    try:
+        if initial:
+            yield format_sse(initial)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                # Channel closed
+                break
+            yield format_sse(event)
+    finally:
+        channel.unsubscribe(queue)
+
+def sse_response(
+    request: Request,
+    channel: EventChannel,
+    queue: asyncio.Queue,
+    initial: Optional[tuple] = None
+) -> StreamingResponse:
+    return StreamingResponse(
+        sse_events(request, channel, queue, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ============== AUTH ENDPOINTS ==============
 
 # Note: Authentication is now handled by Supabase on the client side
@@ -394,7 +753,7 @@ async def get_optional_user(request: Request) -> Optional[User]:
 @api_router.get("/auth/me")
 async def get_me(user: User = Depends(get_current_user)):
     """Get current authenticated user"""
-    return user.dict()
+    return {**user.dict(), "picture_variants": image_variants(user.picture_image_id)}
 
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
@@ -430,6 +789,7 @@ async def get_profile(user: User = Depends(get_current_user)):
     
     return {
         **user.dict(),
+        "picture_variants": image_variants(user.picture_image_id),
         "stats": {
             "attendance_count": attendance_count,
             "track_count": track_count,
@@ -444,13 +804,14 @@ async def get_profile(user: User = Depends(get_current_user)):
 async def update_profile(update: ProfileUpdate, user: User = Depends(get_current_user)):
     """Update user profile"""
     update_data = {k: v for k, v in update.dict().items() if v is not None}
+    update_data.update(user_search_fields(update_data.get("name")))
     if update_data:
         await db.users.update_one(
             {"user_id": user.user_id},
             {"$set": update_data}
         )
     
-    updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0})
+    updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0, "name_lower": 0, "email_lower": 0})
     return updated_user
 
 @api_router.post("/users/onboarding")
@@ -460,6 +821,7 @@ async def complete_onboarding(data: OnboardingData, user: User = Depends(get_cur
         {"user_id": user.user_id},
         {"$set": {
             "name": data.name,
+            **user_search_fields(data.name),
             "roles": [r.value for r in data.roles],
             "goals": data.goals,
             "onboarding_completed": True
@@ -472,7 +834,7 @@ async def complete_onboarding(data: OnboardingData, user: User = Depends(get_cur
     # Log gamification event
     await log_gamification_event(user.user_id, "onboarding_complete", 100, "Completed onboarding")
     
-    updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0})
+    updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0, "name_lower": 0, "email_lower": 0})
     return updated_user
 
 # ============== STUDIO SESSIONS ==============
@@ -508,10 +870,238 @@ async def create_session(
     await db.studio_sessions.insert_one(new_session.dict())
     return new_session.dict()
 
+async def claim_seat(session_id: str) -> bool:
+    """Take one seat if the session has room, in a single conditional write"""
+    session = await db.studio_sessions.find_one_and_update(
+        {
+            "session_id": session_id,
+            "$expr": {"$lt": [{"$ifNull": ["$booked", 0]}, "$max_participants"]}
+        },
+        {"$inc": {"booked": 1}},
+        projection={"_id": 0, "session_id": 1}
+    )
+    return session is not None
+
+async def fill_from_waitlist(session_id: str) -> List[str]:
+    """Move waitlisted users into free seats, oldest first"""
+    promoted = []
+    while await claim_seat(session_id):
+        # Atomic queue pop of the oldest waitlisted booking
+        booking = await db.session_bookings.find_one_and_update(
+            {"session_id": session_id, "status": "waitlisted"},
+            {"$set": {"status": "booked", "promoted_at": datetime.now(timezone.utc)}},
+            sort=[("queued_at", 1)],
+            projection={"_id": 0, "user_id": 1}
+        )
+        if not booking:
+            # Nobody waiting; give the seat back
+            await db.studio_sessions.update_one({"session_id": session_id}, {"$inc": {"booked": -1}})
+            break
+        promoted.append(booking["user_id"])
+    return promoted
+
+async def release_seat(session_id: str) -> List[str]:
+    """Give a seat back and hand it to the waitlist"""
+    await db.studio_sessions.update_one({"session_id": session_id}, {"$inc": {"booked": -1}})
+    return await fill_from_waitlist(session_id)
+
+@api_router.post("/sessions/{session_id}/book")
+async def book_session(session_id: str, user: User = Depends(get_current_user)):
+    """Book a seat in a session, or join its waitlist when full"""
+    if await db.session_bookings.count_documents({"session_id": session_id, "user_id": user.user_id}, limit=1):
+        raise HTTPException(status_code=400, detail="Already booked")
+    
+    if await claim_seat(session_id):
+        status = "booked"
+    elif await db.studio_sessions.count_documents({"session_id": session_id}, limit=1):
+        status = "waitlisted"
+    else:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Written only once the seat is settled, so a failed request leaves no booking behind
+    booking = SessionBooking(session_id=session_id, user_id=user.user_id, status=status)
+    try:
+        await db.session_bookings.insert_one(booking.dict())
+    except DuplicateKeyError:
+        # A concurrent request from the same user got in first
+        if status == "booked":
+            await release_seat(session_id)
+        raise HTTPException(status_code=400, detail="Already booked")
+    
+    if status == "waitlisted":
+        # A seat may have been released while we were joining the queue
+        if user.user_id in await fill_from_waitlist(session_id):
+            status = "booked"
+    
+    return {"booking_id": booking.booking_id, "session_id": session_id, "status": status}
+
+async def seat_for_check_in(session_id: str, user_id: str) -> bool:
+    """Make sure a member checking in holds a booked seat
+    
+    Walk-ins and waitlisted members take a free seat the way a booking does;
+    returns False when there is none left.
+    """
+    booking = await db.session_bookings.find_one(
+        {"session_id": session_id, "user_id": user_id}, {"_id": 0, "status": 1}
+    )
+    if booking and booking["status"] == "booked":
+        return True
+    if not await claim_seat(session_id):
+        return False
+    
+    if booking:
+        promoted = await db.session_bookings.update_one(
+            {"session_id": session_id, "user_id": user_id, "status": "waitlisted"},
+            {"$set": {"status": "booked", "promoted_at": datetime.now(timezone.utc)}}
+        )
+        if promoted.modified_count:
+            return True
+    else:
+        try:
+            await db.session_bookings.insert_one(SessionBooking(session_id=session_id, user_id=user_id).dict())
+            return True
+        except DuplicateKeyError:
+            pass
+    
+    # A concurrent booking or promotion settled this member's seat first
+    await release_seat(session_id)
+    return bool(await db.session_bookings.count_documents(
+        {"session_id": session_id, "user_id": user_id, "status": "booked"}, limit=1
+    ))
+
+@api_router.post("/sessions/{session_id}/cancel")
+async def cancel_booking(session_id: str, user: User = Depends(get_current_user)):
+    """Cancel a booking or leave the waitlist"""
+    booking = await db.session_bookings.find_one_and_delete(
+        {"session_id": session_id, "user_id": user.user_id, "status": {"$in": ["booked", "waitlisted"]}},
+        projection={"_id": 0}
+    )
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
+    promoted = []
+    if booking["status"] == "booked":
+        promoted = await release_seat(session_id)
+    
+    return {"success": True, "promoted": promoted}
+
+@api_router.get("/sessions/{session_id}/bookings")
+async def get_session_bookings(session_id: str, user: User = Depends(get_current_user)):
+    """Get a session's seat count, bookings and waitlist"""
+    session = await db.studio_sessions.find_one({"session_id": session_id}, {"_id": 0})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    bookings = await db.session_bookings.find(
+        {"session_id": session_id, "status": {"$in": ["booked", "waitlisted"]}},
+        {"_id": 0}
+    ).sort("queued_at", 1).to_list(None)
+    
+    return {
+        "session_id": session_id,
+        "max_participants": session["max_participants"],
+        "booked": session.get("booked", 0),
+        "bookings": [b for b in bookings if b["status"] == "booked"],
+        "waitlist": [b for b in bookings if b["status"] == "waitlisted"]
+    }
+
+# ============== STUDIO PRESENCE ==============
+
+# Seconds between resyncs of the local registry from studio_presence
+PRESENCE_SYNC_INTERVAL = 10
+
+class PresenceRegistry:
+    """Members currently in the studio, with running per-role and per-session counts
+    
+    Updated in memory by check-in/check-out and mirrored to the small
+    studio_presence collection, which every worker periodically resyncs from
+    so check-ins handled elsewhere show up here too.
+    """
+    
+    def __init__(self):
+        self.members: Dict[str, Dict[str, Any]] = {}
+        self.by_role: Counter = Counter()
+        self.by_session: Counter = Counter()
+    
+    def add(self, entry: Dict[str, Any]):
+        self.remove(entry["user_id"])
+        self.members[entry["user_id"]] = entry
+        self.by_role.update(entry.get("roles", []))
+        self.by_session[entry.get("session_id") or "drop_in"] += 1
+    
+    def remove(self, user_id: str):
+        entry = self.members.pop(user_id, None)
+        if entry:
+            for counter, keys in (
+                (self.by_role, entry.get("roles", [])),
+                (self.by_session, [entry.get("session_id") or "drop_in"])
+            ):
+                for key in keys:
+                    counter[key] -= 1
+                    if counter[key] <= 0:
+                        del counter[key]
+    
+    def replace_all(self, entries: List[Dict[str, Any]]):
+        self.members, self.by_role, self.by_session = {}, Counter(), Counter()
+        for entry in entries:
+            self.add(entry)
+
+presence = PresenceRegistry()
+
+async def mark_present(user: User, session_id: Optional[str], since: datetime):
+    """Record a check-in in the local registry and the shared mirror"""
+    entry = {
+        "user_id": user.user_id,
+        "name": user.name,
+        "picture": user.picture,
+        "level": user.level,
+        "roles": [r.value if isinstance(r, UserRole) else r for r in user.roles],
+        "session_id": session_id,
+        "since": since
+    }
+    presence.add(entry)
+    await db.studio_presence.replace_one({"user_id": user.user_id}, entry, upsert=True)
+
+async def mark_absent(user_id: str):
+    """Record a check-out in the local registry and the shared mirror"""
+    presence.remove(user_id)
+    await db.studio_presence.delete_one({"user_id": user_id})
+
+async def sync_presence():
+    """Reload the registry from the shared studio_presence mirror"""
+    entries = await db.studio_presence.find({}, {"_id": 0}).to_list(None)
+    presence.replace_all(entries)
+
+async def seed_presence():
+    """Build the mirror from open attendance the first time it is empty"""
+    if await db.studio_presence.estimated_document_count() == 0:
+        open_attendance = await db.attendance.find(
+            {"check_out": None},
+            {"_id": 0, "user_id": 1, "session_id": 1, "check_in": 1}
+        ).to_list(None)
+        users = await db.users.find(
+            {"user_id": {"$in": [a["user_id"] for a in open_attendance]}},
+            {"_id": 0}
+        ).to_list(None)
+        users_by_id = {u["user_id"]: User(**u) for u in users}
+        for a in open_attendance:
+            if a["user_id"] in users_by_id:
+                await mark_present(users_by_id[a["user_id"]], a.get("session_id"), a["check_in"])
+    await sync_presence()
+
+async def presence_sync_loop():
+    """Background job keeping this worker's registry in line with the mirror"""
+    while True:
+        await asyncio.sleep(PRESENCE_SYNC_INTERVAL)
+        try:
+            await sync_presence()
+        except Exception:
+            logger.exception("Presence sync failed")
+
 # ============== ATTENDANCE ==============
 
 @api_router.post("/attendance/check-in")
-async def check_in(data: AttendanceCheckIn, user: User = Depends(get_current_user)):
+async def check_in(data: AttendanceCheckIn, user: User = Depends(rate_limited("check_in"))):
     """Check in to studio"""
     # Check if already checked in
     active_attendance = await db.attendance.find_one({
@@ -522,6 +1112,14 @@ async def check_in(data: AttendanceCheckIn, user: User = Depends(get_current_use
     if active_attendance:
         raise HTTPException(status_code=400, detail="Already checked in")
     
+    if data.session_id:
+        if not await db.studio_sessions.count_documents({"session_id": data.session_id}, limit=1):
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # Everyone in the room holds a seat, walk-ins included
+        if not await seat_for_check_in(data.session_id, user.user_id):
+            raise HTTPException(status_code=400, detail="Session is full")
+    
     attendance = Attendance(
         user_id=user.user_id,
         session_id=data.session_id,
@@ -529,6 +1127,8 @@ async def check_in(data: AttendanceCheckIn, user: User = Depends(get_current_use
     )
     
     await db.attendance.insert_one(attendance.dict())
+    await record_bucket(user.user_id, "attendance", attendance.check_in, {"sessions": 1})
+    await mark_present(user, data.session_id, attendance.check_in)
     
     # Update streak
     await update_streak(user.user_id)
@@ -558,8 +1158,8 @@ async def check_out(user: User = Depends(get_current_user)):
     
     duration = int((check_out_time - check_in_time).total_seconds() / 60)
     
-    # Calculate XP (1 XP per minute, max 120)
-    xp_earned = min(duration, 120)
+    # Calculate XP (1 XP per minute, capped)
+    xp_earned = attendance_xp(duration)
     
     await db.attendance.update_one(
         {"attendance_id": active_attendance["attendance_id"]},
@@ -569,6 +1169,8 @@ async def check_out(user: User = Depends(get_current_user)):
             "xp_earned": xp_earned
         }}
     )
+    await record_bucket(user.user_id, "attendance", check_in_time, {"duration": duration})
+    await mark_absent(user.user_id)
     
     # Update user XP
     await add_xp(user.user_id, xp_earned, "attendance", f"Studio session ({duration} mins)")
@@ -582,6 +1184,16 @@ async def check_out(user: User = Depends(get_current_user)):
         "xp_earned": xp_earned
     }
 
+@api_router.get("/attendance/live")
+async def get_live_attendance(user: User = Depends(get_current_user)):
+    """Who is in the studio right now, with counts per role and session"""
+    return {
+        "count": len(presence.members),
+        "by_role": dict(presence.by_role),
+        "by_session": dict(presence.by_session),
+        "members": list(presence.members.values())
+    }
+
 @api_router.get("/attendance/history")
 async def get_attendance_history(
     limit: int = 50,
@@ -639,13 +1251,21 @@ async def get_attendance_status(user: User = Depends(get_current_user)):
 async def get_tracks(
     limit: int = 20,
     offset: int = 0,
+    sort: str = "recent",
     user: User = Depends(get_current_user)
 ):
-    """Get all tracks"""
+    """Get all tracks, newest first or by trending score"""
+    if sort == "trending":
+        order = [("trending_score", -1), ("created_at", -1)]
+    elif sort == "recent":
+        order = [("created_at", -1)]
+    else:
+        raise HTTPException(status_code=400, detail="Sort must be recent or trending")
+    
     tracks = await db.tracks.find(
         {},
         {"_id": 0}
-    ).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
+    ).sort(order).skip(offset).limit(limit).to_list(limit)
     
     # Enrich with contributor details
     for track in tracks:
@@ -657,9 +1277,12 @@ async def get_tracks(
         contributor_ids = list(set([c["user_id"] for c in contributors]))
         contributor_users = await db.users.find(
             {"user_id": {"$in": contributor_ids}},
-            {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
+            {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1}
         ).to_list(100)
+        for u in contributor_users:
+            u["picture_variants"] = image_variants(u.get("picture_image_id"))
         
+        track["cover_variants"] = image_variants(track.get("cover_image_id"))
         track["contributor_details"] = contributor_users
         track["contribution_breakdown"] = contributors
     
@@ -678,15 +1301,86 @@ async def create_track(
     )
     
     await db.tracks.insert_one(track.dict())
+    await record_bucket(user.user_id, "music", track.created_at, {"tracks": 1})
     
     # Award XP for creating track
-    await add_xp(user.user_id, 50, "music", "Created a new track")
+    await add_xp(user.user_id, TRACK_CREATED_XP, "music", "Created a new track")
     
     # Log activity
     await log_activity(user.user_id, user.name, "track_created", f"{user.name} created track: {track.title}")
     
     return track.dict()
 
+@api_router.get("/tracks/search")
+async def search_tracks(
+    q: Optional[str] = None,
+    genre: Optional[str] = None,
+    contributor: Optional[str] = None,
+    contribution_type: Optional[ContributionType] = None,
+    limit: int = 20,
+    offset: int = 0,
+    user: User = Depends(get_current_user)
+):
+    """Search tracks by text with genre/contributor filters and facet counts"""
+    match: Dict[str, Any] = {}
+    if q and q.strip():
+        match["$text"] = {"$search": q.strip()}
+    if genre:
+        match["genre"] = genre
+    if contributor:
+        match["contributors"] = contributor
+    if contribution_type:
+        match["contribution_types"] = contribution_type.value
+    
+    # The page is an indexed find; facet counts scan every match, so they are cached
+    projection: Dict[str, Any] = {"_id": 0}
+    if "$text" in match:
+        projection["relevance"] = {"$meta": "textScore"}
+        order = [("relevance", {"$meta": "textScore"}), ("created_at", -1)]
+    else:
+        order = [("created_at", -1)]
+    
+    limit = max(1, min(limit, 100))
+    tracks = await db.tracks.find(match, projection).sort(order).skip(max(offset, 0)).limit(limit).to_list(limit)
+    for track in tracks:
+        track["cover_variants"] = image_variants(track.get("cover_image_id"))
+    
+    key = (match.get("$text", {}).get("$search"), genre, contributor, match.get("contribution_types"))
+    facets = await track_facet_flight.do(key, lambda: count_track_facets(match))
+    
+    return {"tracks": tracks, **facets}
+
+track_facet_flight = SingleFlight("track_facets", ttl=60)
+
+async def count_track_facets(match: Dict[str, Any]) -> Dict[str, Any]:
+    """Total and per-genre / per-contribution-type counts for a track search"""
+    result = await db.tracks.aggregate([
+        {"$match": match},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "genres": [
+                {"$group": {"_id": "$genre", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ],
+            "contribution_types": [
+                {"$unwind": "$contribution_types"},
+                {"$group": {"_id": "$contribution_types", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ]
+        }}
+    ]).to_list(1)
+    facets = result[0]
+    
+    return {
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "facets": {
+            "genre": [{"value": g["_id"], "count": g["count"]} for g in facets["genres"]],
+            "contribution_type": [
+                {"value": c["_id"], "count": c["count"]} for c in facets["contribution_types"]
+            ]
+        }
+    }
+
 @api_router.get("/tracks/{track_id}")
 async def get_track(track_id: str, user: User = Depends(get_current_user)):
     """Get track details"""
@@ -705,11 +1399,14 @@ async def get_track(track_id: str, user: User = Depends(get_current_user)):
     contributor_ids = list(set([c["user_id"] for c in contributions]))
     contributors = await db.users.find(
         {"user_id": {"$in": contributor_ids}},
-        {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1}
     ).to_list(100)
+    for u in contributors:
+        u["picture_variants"] = image_variants(u.get("picture_image_id"))
     
     return {
         **track,
+        "cover_variants": image_variants(track.get("cover_image_id")),
         "contributions": contributions,
         "contributor_details": contributors
     }
@@ -730,19 +1427,24 @@ async def add_contribution(
         user_id=user.user_id,
         contribution_type=data.contribution_type,
         notes=data.notes,
-        xp_earned=30
+        xp_earned=CONTRIBUTION_XP
     )
     
     await db.track_contributions.insert_one(contribution.dict())
+    await record_bucket(user.user_id, "music", contribution.created_at, {"contributions": 1})
+    record_collaboration(contribution)
     
-    # Add user to track contributors
+    # Add user and contribution type to the track for search filters
     await db.tracks.update_one(
         {"track_id": track_id},
-        {"$addToSet": {"contributors": user.user_id}}
+        {"$addToSet": {
+            "contributors": user.user_id,
+            "contribution_types": data.contribution_type.value
+        }}
     )
     
     # Award XP
-    await add_xp(user.user_id, 30, "music", f"Contributed {data.contribution_type.value} to track")
+    await add_xp(user.user_id, CONTRIBUTION_XP, "music", f"Contributed {data.contribution_type.value} to track")
     
     # Log activity
     await log_activity(
@@ -753,126 +1455,1159 @@ async def add_contribution(
     return contribution.dict()
 
 @api_router.post("/tracks/{track_id}/listen")
-async def record_listen(track_id: str, user: User = Depends(get_current_user)):
+async def record_listen(track_id: str, user: User = Depends(rate_limited("listen"))):
     """Record a track listen"""
     await db.tracks.update_one(
         {"track_id": track_id},
         {"$inc": {"listens": 1}}
     )
+    await record_track_activity(track_id, {"listens": 1})
     return {"success": True}
 
 @api_router.post("/tracks/{track_id}/like")
-async def like_track(track_id: str, user: User = Depends(get_current_user)):
+async def like_track(track_id: str, user: User = Depends(rate_limited("like"))):
     """Like a track"""
     await db.tracks.update_one(
         {"track_id": track_id},
         {"$inc": {"likes": 1}}
     )
+    await record_track_activity(track_id, {"likes": 1})
     return {"success": True}
 
-# ============== GAMING ==============
+# ============== TRACK AUDIO ==============
 
-@api_router.get("/matches")
-async def get_matches(
-    status: Optional[str] = None,
-    limit: int = 20,
+# Audio is stored in the track_audio GridFS bucket. Upload chunks are written
+# straight into track_audio.chunks so an interrupted upload can resume from
+# the last stored chunk; the files document is only inserted once complete.
+audio_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="track_audio")
+
+AUDIO_CHUNK_SIZE = 255 * 1024
+AUDIO_MAX_BYTES = 200 * 1024 * 1024
+AUDIO_CONTENT_TYPES = {"audio/mpeg", "audio/mp4", "audio/aac", "audio/wav", "audio/x-wav", "audio/ogg", "audio/flac"}
+# Bytes read from GridFS per streamed response chunk
+AUDIO_READ_SIZE = 64 * 1024
+# Uploads untouched for this long are abandoned and their chunks deleted
+AUDIO_UPLOAD_TTL = timedelta(days=1)
+# Seconds between sweeps for abandoned uploads
+AUDIO_UPLOAD_CLEANUP_INTERVAL = 3600
+
+class AudioUploadCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+async def get_editable_track(track_id: str, user: User) -> Dict[str, Any]:
+    track = await db.tracks.find_one({"track_id": track_id}, {"_id": 0})
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    if user.user_id not in track.get("contributors", []) and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only track contributors can upload audio")
+    return track
+
+def upload_status(upload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "upload_id": upload["upload_id"],
+        "track_id": upload["track_id"],
+        "size": upload["size"],
+        "received": upload["received"],
+        "chunk_size": AUDIO_CHUNK_SIZE,
+        "status": upload["status"]
+    }
+
+@api_router.post("/tracks/{track_id}/audio/uploads")
+async def start_audio_upload(
+    track_id: str,
+    data: AudioUploadCreate,
     user: User = Depends(get_current_user)
 ):
-    """Get game matches"""
-    query = {}
-    if status:
-        query["status"] = status
+    """Start a resumable audio upload for a track"""
+    await get_editable_track(track_id, user)
     
-    matches = await db.game_matches.find(
-        query,
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+    if data.content_type not in AUDIO_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported audio type")
+    if not 0 < data.size <= AUDIO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio must be at most {AUDIO_MAX_BYTES} bytes")
     
-    # Enrich with participant details
-    for match in matches:
-        participants = await db.users.find(
-            {"user_id": {"$in": match.get("participants", [])}},
-            {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
-        ).to_list(100)
-        match["participant_details"] = participants
-        
-        # Get scores
-        scores = await db.game_scores.find(
-            {"match_id": match["match_id"]},
-            {"_id": 0}
-        ).to_list(100)
-        match["scores"] = scores
+    upload = {
+        "upload_id": f"upload_{uuid.uuid4().hex[:12]}",
+        "file_id": ObjectId(),
+        "track_id": track_id,
+        "user_id": user.user_id,
+        "filename": data.filename,
+        "content_type": data.content_type,
+        "size": data.size,
+        "received": 0,
+        "status": "open",
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
+    }
+    await db.audio_uploads.insert_one(upload)
     
-    return matches
+    return upload_status(upload)
 
-@api_router.post("/matches")
-async def create_match(
-    data: MatchCreate,
+@api_router.get("/tracks/{track_id}/audio/uploads/{upload_id}")
+async def get_audio_upload(track_id: str, upload_id: str, user: User = Depends(get_current_user)):
+    """Get upload progress, used to resume an interrupted upload"""
+    upload = await db.audio_uploads.find_one(
+        {"upload_id": upload_id, "track_id": track_id, "user_id": user.user_id}
+    )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload_status(upload)
+
+@api_router.put("/tracks/{track_id}/audio/uploads/{upload_id}")
+async def upload_audio_chunk(
+    track_id: str,
+    upload_id: str,
+    request: Request,
+    offset: int,
     user: User = Depends(get_current_user)
 ):
-    """Create a new match"""
-    match = GameMatch(
-        **data.dict(),
-        created_by=user.user_id
+    """Append raw audio bytes to an upload, starting at `offset`
+    
+    The body is streamed into GridFS chunks as it arrives. `offset` must be the
+    upload's `received` value; bytes after the last full chunk that don't
+    finish the file are dropped and should be re-sent from `received`. Each
+    chunk advances `received` only if no concurrent PUT moved it first.
+    """
+    upload = await db.audio_uploads.find_one(
+        {"upload_id": upload_id, "track_id": track_id, "user_id": user.user_id}
     )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if offset != upload["received"]:
+        raise HTTPException(status_code=409, detail=f"Upload must resume at offset {upload['received']}")
     
-    # Add creator to participants if not included
-    if user.user_id not in match.participants:
-        match.participants.append(user.user_id)
+    size = upload["size"]
+    received = offset
+    buffer = bytearray()
     
-    await db.game_matches.insert_one(match.dict())
+    async def write_chunk(data: bytes):
+        nonlocal received
+        await db["track_audio.chunks"].replace_one(
+            {"files_id": upload["file_id"], "n": received // AUDIO_CHUNK_SIZE},
+            {"files_id": upload["file_id"], "n": received // AUDIO_CHUNK_SIZE, "data": Binary(data)},
+            upsert=True
+        )
+        advanced = await db.audio_uploads.update_one(
+            {"upload_id": upload_id, "received": received, "status": "open"},
+            {"$inc": {"received": len(data)}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+        )
+        if not advanced.matched_count:
+            raise HTTPException(status_code=409, detail="Upload is being written by another request")
+        received += len(data)
     
-    # Log activity
-    await log_activity(
-        user.user_id, user.name, "match_created",
-        f"{user.name} created a {data.game_type.value} match: {data.title}"
+    async for data in request.stream():
+        if received + len(buffer) + len(data) > size:
+            raise HTTPException(status_code=413, detail="Upload exceeds declared size")
+        buffer.extend(data)
+        while len(buffer) >= AUDIO_CHUNK_SIZE:
+            await write_chunk(bytes(buffer[:AUDIO_CHUNK_SIZE]))
+            del buffer[:AUDIO_CHUNK_SIZE]
+    
+    if buffer and received + len(buffer) == size:
+        await write_chunk(bytes(buffer))
+    
+    if received < size:
+        return upload_status({**upload, "received": received})
+    
+    # All bytes are stored: publish the GridFS file and point the track at it
+    await db["track_audio.files"].insert_one({
+        "_id": upload["file_id"],
+        "length": size,
+        "chunkSize": AUDIO_CHUNK_SIZE,
+        "uploadDate": datetime.now(timezone.utc),
+        "filename": upload["filename"],
+        "metadata": {
+            "track_id": track_id,
+            "content_type": upload["content_type"],
+            "uploaded_by": user.user_id
+        }
+    })
+    previous = await db.tracks.find_one_and_update(
+        {"track_id": track_id},
+        {"$set": {"audio_file_id": str(upload["file_id"]), "audio_url": f"/api/tracks/{track_id}/audio"}}
+    )
+    await db.audio_uploads.update_one(
+        {"upload_id": upload_id},
+        {"$set": {"status": "complete", "updated_at": datetime.now(timezone.utc)}}
     )
     
-    return match.dict()
+    if previous and previous.get("audio_file_id"):
+        try:
+            await audio_bucket.delete(ObjectId(previous["audio_file_id"]))
+        except NoFile:
+            pass
+    
+    return upload_status({**upload, "received": received, "status": "complete"})
 
-@api_router.get("/matches/{match_id}")
-async def get_match(match_id: str, user: User = Depends(get_current_user)):
-    """Get match details"""
-    match = await db.game_matches.find_one({"match_id": match_id}, {"_id": 0})
+async def expire_audio_uploads() -> int:
+    """Delete uploads left idle past AUDIO_UPLOAD_TTL, with the chunks of unfinished ones"""
+    cutoff = datetime.now(timezone.utc) - AUDIO_UPLOAD_TTL
+    expired = 0
+    async for upload in db.audio_uploads.find(
+        # Uploads started before updated_at was recorded fall back to created_at
+        {"$or": [
+            {"updated_at": {"$lt": cutoff}},
+            {"updated_at": {"$exists": False}, "created_at": {"$lt": cutoff}}
+        ]},
+        {"_id": 0, "upload_id": 1, "file_id": 1, "status": 1}
+    ):
+        if upload["status"] == "open":
+            await db["track_audio.chunks"].delete_many({"files_id": upload["file_id"]})
+        await db.audio_uploads.delete_one({"upload_id": upload["upload_id"], "status": upload["status"]})
+        expired += 1
+    return expired
+
+async def audio_upload_cleanup_loop():
+    """Background job removing abandoned audio uploads"""
+    while True:
+        await asyncio.sleep(AUDIO_UPLOAD_CLEANUP_INTERVAL)
+        try:
+            await expire_audio_uploads()
+        except Exception:
+            logger.exception("Audio upload cleanup failed")
+
+def parse_range(header: Optional[str], length: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single `bytes=` range, None for the whole file"""
+    if not header:
+        return None
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{length}"})
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    else:
+        start = max(length - int(last), 0)
+        end = length - 1
+    if start > end or start >= length:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{length}"})
+    return start, end
+
+@api_router.get("/tracks/{track_id}/audio")
+async def stream_track_audio(track_id: str, request: Request, user: User = Depends(get_current_user)):
+    """Stream a track's audio, honoring single byte ranges
     
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+    Requests starting at byte 0 count as a listen, within the listen rate
+    limit; the follow-up range requests players make while seeking do not.
+    """
+    track = await db.tracks.find_one({"track_id": track_id}, {"_id": 0, "audio_file_id": 1})
+    if not track or not track.get("audio_file_id"):
+        raise HTTPException(status_code=404, detail="Audio not found")
     
-    # Get participant details
-    participants = await db.users.find(
-        {"user_id": {"$in": match.get("participants", [])}},
-        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "level": 1}
-    ).to_list(100)
+    try:
+        grid_out = await audio_bucket.open_download_stream(ObjectId(track["audio_file_id"]))
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Audio not found")
     
-    # Get scores
-    scores = await db.game_scores.find(
-        {"match_id": match_id},
-        {"_id": 0}
-    ).sort("score", -1).to_list(100)
+    length = grid_out.length
+    content_type = (grid_out.metadata or {}).get("content_type", "application/octet-stream")
+    byte_range = parse_range(request.headers.get("Range"), length)
+    start, end = byte_range or (0, length - 1)
     
-    return {
-        **match,
-        "participant_details": participants,
-        "scores": scores
+    # Throttled replays still play, they just don't count
+    if start == 0 and not await rate_limiter.take("listen", user.user_id):
+        await record_listen(track_id, user)
+    
+    async def body():
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = await grid_out.read(min(AUDIO_READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Cache-Control": "private, max-age=3600"
     }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    
+    return StreamingResponse(
+        body(),
+        status_code=206 if byte_range else 200,
+        media_type=content_type,
+        headers=headers
+    )
 
-@api_router.post("/matches/{match_id}/start")
-async def start_match(match_id: str, user: User = Depends(get_current_user)):
-    """Start a match"""
-    match = await db.game_matches.find_one({"match_id": match_id})
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+# ============== IMAGES ==============
+
+# Originals live in the images GridFS bucket under their sha256; resized
+# variants are derived on a process pool and kept in a size-capped disk cache.
+# Every URL is content-addressed, so responses can be cached forever.
+image_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="images")
+
+IMAGE_VARIANTS = {"thumb": 64, "small": 256, "large": 1024}
+IMAGE_FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_CACHE_DIR = Path(os.environ.get("IMAGE_CACHE_DIR", ROOT_DIR / "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+IMAGE_ID = re.compile(r"[0-9a-f]{64}")
+
+def render_image_variants(data: bytes) -> Dict[str, bytes]:
+    """Decode an image once and encode every size/format variant
     
-    if match["created_by"] != user.user_id and not user.is_admin:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    Runs in a worker process; returns {"thumb.webp": bytes, ...}.
+    """
+    from io import BytesIO
+    from PIL import Image, ImageOps
     
-    await db.game_matches.update_one(
-        {"match_id": match_id},
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+    
+    variants = {}
+    for name, size in IMAGE_VARIANTS.items():
+        # Square crop, never upscaled past the original
+        side = min(size, image.width, image.height)
+        resized = ImageOps.fit(image, (side, side), Image.LANCZOS)
+        for fmt in IMAGE_FORMATS:
+            out = BytesIO()
+            if fmt == "webp":
+                resized.save(out, "WEBP", quality=80, method=4)
+            else:
+                resized.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+            variants[f"{name}.{fmt}"] = out.getvalue()
+    return variants
+
+class ImageCache:
+    """Least-recently-used cache of rendered variants on local disk
+    
+    Workers sharing the directory each track their own recency order; a file
+    another worker evicted is treated as a miss.
+    """
+    
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (p for p in self.directory.glob("*/*") if p.is_file()),
+            key=lambda p: p.stat().st_atime
+        )
+        for path in files:
+            key = f"{path.parent.name}/{path.name}"
+            self.entries[key] = path.stat().st_size
+            self.total += self.entries[key]
+        self.evict()
+    
+    def path(self, key: str) -> Path:
+        return self.directory / key
+    
+    def get(self, key: str) -> Optional[Path]:
+        if key in self.entries:
+            path = self.path(key)
+            if path.exists():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return path
+            self.total -= self.entries.pop(key)
+        self.misses += 1
+        return None
+    
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Write then rename so readers never see a partial file
+        temp = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        temp.write_bytes(data)
+        temp.replace(path)
+        self.total += len(data) - self.entries.pop(key, 0)
+        self.entries[key] = len(data)
+        self.evict()
+    
+    def evict(self):
+        while self.total > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total -= size
+            self.path(key).unlink(missing_ok=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+image_renders = SingleFlight("image_renders")
+image_pool: Optional[ProcessPoolExecutor] = None
+
+def start_image_pool():
+    global image_pool
+    image_cache.load()
+    # Spawned, not forked: a fork would copy the event loop and Mongo client state
+    image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def stop_image_pool():
+    if image_pool:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+
+def image_variants(image_id: Optional[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """Variant URLs for an uploaded image, by size name then format"""
+    if not image_id:
+        return None
+    return {
+        name: {fmt: f"/api/images/{image_id}/{name}.{fmt}" for fmt in IMAGE_FORMATS}
+        for name in IMAGE_VARIANTS
+    }
+
+async def render_and_cache(image_id: str, data: Optional[bytes] = None) -> Dict[str, bytes]:
+    """Render every variant of an image on the process pool and cache them"""
+    async def render():
+        source = data
+        if source is None:
+            try:
+                grid_out = await image_bucket.open_download_stream_by_name(image_id)
+            except NoFile:
+                raise HTTPException(status_code=404, detail="Image not found")
+            source = await grid_out.read()
+        
+        loop = asyncio.get_running_loop()
+        try:
+            variants = await loop.run_in_executor(image_pool, render_image_variants, source)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+        for key, encoded in variants.items():
+            image_cache.put(f"{image_id[:2]}/{image_id}-{key}", encoded)
+        return variants
+    
+    return await image_renders.do(image_id, render)
+
+async def store_image(upload: UploadFile) -> str:
+    """Save an uploaded image's original and warm its variants, returning its id"""
+    data = await upload.read(IMAGE_MAX_BYTES + 1)
+    if len(data) > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image must be at most {IMAGE_MAX_BYTES} bytes")
+    
+    image_id = hashlib.sha256(data).hexdigest()
+    # Rendering first doubles as validation before anything is stored
+    await render_and_cache(image_id, data)
+    
+    if not await db["images.files"].find_one({"filename": image_id}, {"_id": 1}):
+        await image_bucket.upload_from_stream(
+            image_id, data, metadata={"content_type": upload.content_type}
+        )
+    return image_id
+
+@api_router.post("/images")
+async def upload_image(file: UploadFile = File(...), user: User = Depends(get_current_user)):
+    """Upload an image and get its variant URLs"""
+    image_id = await store_image(file)
+    return {"image_id": image_id, "variants": image_variants(image_id)}
+
+@api_router.put("/users/profile/picture")
+async def update_profile_picture(file: UploadFile = File(...), user: User = Depends(get_current_user)):
+    """Upload a new profile picture"""
+    image_id = await store_image(file)
+    await db.users.update_one(
+        {"user_id": user.user_id},
+        {"$set": {"picture_image_id": image_id}}
+    )
+    return {"image_id": image_id, "variants": image_variants(image_id)}
+
+@api_router.put("/tracks/{track_id}/cover")
+async def update_track_cover(track_id: str, file: UploadFile = File(...), user: User = Depends(get_current_user)):
+    """Upload a track's cover image"""
+    await get_editable_track(track_id, user)
+    image_id = await store_image(file)
+    await db.tracks.update_one(
+        {"track_id": track_id},
+        {"$set": {"cover_image_id": image_id}}
+    )
+    return {"image_id": image_id, "variants": image_variants(image_id)}
+
+@api_router.get("/images/{image_id}/{variant}")
+async def get_image_variant(image_id: str, variant: str, request: Request):
+    """Serve a resized image variant with immutable cache headers"""
+    name, _, fmt = variant.partition(".")
+    if not IMAGE_ID.fullmatch(image_id) or name not in IMAGE_VARIANTS or fmt not in IMAGE_FORMATS:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{image_id[:16]}-{variant}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    key = f"{image_id[:2]}/{image_id}-{variant}"
+    path = image_cache.get(key)
+    if path:
+        return FileResponse(path, media_type=IMAGE_FORMATS[fmt], headers=headers)
+    
+    variants = await render_and_cache(image_id)
+    return Response(content=variants[variant], media_type=IMAGE_FORMATS[fmt], headers=headers)
+
+# Hosts external images may be imported from, matching subdomains too
+IMAGE_IMPORT_HOSTS = [
+    host.strip().lower()
+    for host in os.environ.get(
+        "IMAGE_IMPORT_HOSTS", "googleusercontent.com,githubusercontent.com,gravatar.com"
+    ).split(",")
+    if host.strip()
+]
+IMAGE_IMPORT_MAX_REDIRECTS = 3
+
+async def check_import_url(url: str):
+    """Reject URLs off the import allow-list or resolving to non-public addresses"""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError(f"unsupported URL {url}")
+    if not any(host == allowed or host.endswith(f".{allowed}") for allowed in IMAGE_IMPORT_HOSTS):
+        raise ValueError(f"host {host} is not allowed")
+    
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    for *_, sockaddr in await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        address = ipaddress.ip_address(sockaddr[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        # Private, loopback, link-local and reserved ranges are never global
+        if not address.is_global:
+            raise ValueError(f"host {host} resolves to {address}")
+
+async def fetch_import_image(http: httpx.AsyncClient, url: str) -> bytes:
+    """Download an external image, checking every redirect hop and capping the size"""
+    for _ in range(IMAGE_IMPORT_MAX_REDIRECTS + 1):
+        await check_import_url(url)
+        async with http.stream("GET", url) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["location"])
+                continue
+            response.raise_for_status()
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data.extend(chunk)
+                if len(data) > IMAGE_MAX_BYTES:
+                    raise ValueError("image too large")
+            return bytes(data)
+    raise ValueError("too many redirects")
+
+async def backfill_image_variants() -> Dict[str, Any]:
+    """Import external cover images and profile pictures into the image pipeline"""
+    imported = failed = 0
+    
+    async def import_url(http: httpx.AsyncClient, url: str) -> Optional[str]:
+        nonlocal imported, failed
+        try:
+            data = await fetch_import_image(http, url)
+            image_id = hashlib.sha256(data).hexdigest()
+            await render_and_cache(image_id, data)
+            if not await db["images.files"].find_one({"filename": image_id}, {"_id": 1}):
+                await image_bucket.upload_from_stream(image_id, data)
+            imported += 1
+            return image_id
+        except Exception as e:
+            logger.warning(f"Could not import image {url}: {e}")
+            failed += 1
+            return None
+    
+    external = {"$regex": "^https?://"}
+    async with httpx.AsyncClient(timeout=10, follow_redirects=False) as http:
+        async for track in db.tracks.find(
+            {"cover_image": external, "cover_image_id": None}, {"_id": 0, "track_id": 1, "cover_image": 1}
+        ):
+            image_id = await import_url(http, track["cover_image"])
+            if image_id:
+                await db.tracks.update_one({"track_id": track["track_id"]}, {"$set": {"cover_image_id": image_id}})
+        
+        async for user_doc in db.users.find(
+            {"picture": external, "picture_image_id": None}, {"_id": 0, "user_id": 1, "picture": 1}
+        ):
+            image_id = await import_url(http, user_doc["picture"])
+            if image_id:
+                await db.users.update_one({"user_id": user_doc["user_id"]}, {"$set": {"picture_image_id": image_id}})
+    
+    return {"imported": imported, "failed": failed}
+
+# ============== TRENDING ==============
+
+# Listen/like weights and decay half-life
+TRENDING_LIKE_WEIGHT = 5
+TRENDING_HALF_LIFE_HOURS = 24
+# How far back the first pass after startup looks for recently active tracks
+TRENDING_STARTUP_LOOKBACK = timedelta(days=7)
+# Seconds between trending recomputations
+TRENDING_INTERVAL = 300
+# Fixed reference point for decayed scores
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def start_of_hour(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def trending_score(buckets: List[Dict[str, Any]]) -> Optional[float]:
+    """Time-decayed activity score, expressed relative to TRENDING_EPOCH
+    
+    The decayed sum is sum(w * 2^-(age / half_life)). Measuring age from a
+    fixed epoch instead of "now" multiplies every track's score by the same
+    factor, so scores computed at different times stay comparable and tracks
+    without new activity never need rewriting. It is stored as a log2 to
+    avoid overflow: current value = 2^(score - hours_since_epoch / half_life).
+    """
+    terms = []
+    for b in buckets:
+        weight = b.get("listens", 0) + TRENDING_LIKE_WEIGHT * b.get("likes", 0)
+        if weight > 0:
+            hours = (as_utc(b["hour"]) - TRENDING_EPOCH).total_seconds() / 3600
+            terms.append((hours / TRENDING_HALF_LIFE_HOURS, weight))
+    if not terms:
+        return None
+    
+    peak = max(exponent for exponent, _ in terms)
+    return peak + math.log2(sum(w * 2 ** (exponent - peak) for exponent, w in terms))
+
+async def record_track_activity(track_id: str, increments: Dict[str, int]):
+    """Add to a track's hourly listen/like bucket"""
+    await db.track_activity.update_one(
+        {"track_id": track_id, "hour": start_of_hour(datetime.now(timezone.utc))},
+        {"$inc": increments},
+        upsert=True
+    )
+
+async def recompute_trending(since: datetime) -> int:
+    """Refresh trending_score for tracks with activity since `since`"""
+    now = datetime.now(timezone.utc)
+    active = await db.track_activity.distinct("track_id", {"hour": {"$gte": start_of_hour(since)}})
+    if not active:
+        return 0
+    
+    # Every bucket counts: old activity is discounted by the decay, and
+    # leaving it out would drop a track's score below its idle value
+    buckets_by_track: Dict[str, List[Dict[str, Any]]] = {}
+    cursor = db.track_activity.find(
+        {"track_id": {"$in": active}},
+        {"_id": 0, "track_id": 1, "hour": 1, "listens": 1, "likes": 1}
+    )
+    async for bucket in cursor:
+        buckets_by_track.setdefault(bucket["track_id"], []).append(bucket)
+    
+    await db.tracks.bulk_write([
+        UpdateOne(
+            {"track_id": track_id},
+            {"$set": {"trending_score": trending_score(buckets_by_track.get(track_id, [])), "trending_updated_at": now}}
+        )
+        for track_id in active
+    ], ordered=False)
+    return len(active)
+
+async def trending_loop():
+    """Background job refreshing trending scores of recently active tracks"""
+    since = datetime.now(timezone.utc) - TRENDING_STARTUP_LOOKBACK
+    while True:
+        started = datetime.now(timezone.utc)
+        try:
+            await recompute_trending(since)
+            since = started
+        except Exception:
+            logger.exception("Trending recomputation failed")
+        await asyncio.sleep(TRENDING_INTERVAL)
+
+# ============== COLLABORATOR GRAPH ==============
+
+CONTRIBUTION_TYPES = [t.value for t in ContributionType]
+
+# Edge weight added when two contribution types meet on the same track;
+# complementary roles (vocals with beat/mix/production) count the most.
+COMPLEMENT_PAIRS = {
+    ("vocals", "beat"): 3.0,
+    ("vocals", "production"): 3.0,
+    ("vocals", "mix"): 2.5,
+    ("vocals", "writing"): 2.0,
+    ("vocals", "instrument"): 2.0,
+    ("beat", "writing"): 2.0,
+    ("beat", "mix"): 2.0,
+    ("beat", "instrument"): 1.5,
+    ("mix", "master"): 2.5,
+    ("production", "mix"): 2.0,
+    ("production", "writing"): 2.0,
+    ("production", "instrument"): 2.0,
+    ("instrument", "writing"): 1.5,
+    ("master", "production"): 1.5,
+}
+
+def build_complement_matrix() -> np.ndarray:
+    size = len(CONTRIBUTION_TYPES)
+    matrix = np.ones((size, size))
+    for (a, b), weight in COMPLEMENT_PAIRS.items():
+        i, j = CONTRIBUTION_TYPES.index(a), CONTRIBUTION_TYPES.index(b)
+        matrix[i, j] = matrix[j, i] = weight
+    # Two people doing the same job on a track overlap more than they complement
+    np.fill_diagonal(matrix, 0.5)
+    return matrix
+
+COMPLEMENT_MATRIX = build_complement_matrix()
+
+# Pending edge updates kept outside the CSR arrays before they are compacted
+COLLABORATOR_COMPACT_THRESHOLD = 5000
+# Seconds between catch-ups on contributions recorded by other workers
+COLLABORATOR_SYNC_INTERVAL = 60
+# Re-read contributions this far before the last sync, for inserts that commit late
+COLLABORATOR_SYNC_OVERLAP = timedelta(minutes=2)
+
+class CollaboratorGraph:
+    """Weighted user x user co-contribution graph
+    
+    Edges live in CSR arrays (indptr/indices/data, as in scipy.sparse) plus a
+    small dict of pending increments from add_contribution that is folded in
+    once it grows past COLLABORATOR_COMPACT_THRESHOLD. Each user also has a
+    contribution-type profile used to score role complementarity.
+    """
+    
+    def __init__(self):
+        self.user_index: Dict[str, int] = {}
+        self.user_ids: List[str] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.data = np.zeros(0)
+        self.pending: Dict[int, Dict[int, float]] = {}
+        self.pending_count = 0
+        self.profiles = np.zeros((0, len(CONTRIBUTION_TYPES)))
+        self.track_members: Dict[str, List[tuple]] = {}
+        self.watermark: Optional[datetime] = None
+        # contribution_id -> created_at of contributions already in the graph
+        # that a sync could still read again
+        self.applied_locally: Dict[str, datetime] = {}
+    
+    def _user(self, user_id: str) -> int:
+        index = self.user_index.get(user_id)
+        if index is None:
+            index = len(self.user_ids)
+            self.user_index[user_id] = index
+            self.user_ids.append(user_id)
+            if index >= len(self.profiles):
+                grown = np.zeros((max(64, 2 * len(self.profiles)), len(CONTRIBUTION_TYPES)))
+                grown[:len(self.profiles)] = self.profiles
+                self.profiles = grown
+        return index
+    
+    def add(self, track_id: str, user_id: str, contribution_type: str):
+        """Connect a new contribution to everyone already on the track"""
+        u = self._user(user_id)
+        a = CONTRIBUTION_TYPES.index(contribution_type)
+        self.profiles[u, a] += 1
+        
+        members = self.track_members.setdefault(track_id, [])
+        for v, b in members:
+            if v != u:
+                weight = COMPLEMENT_MATRIX[a, b]
+                for x, y in ((u, v), (v, u)):
+                    row = self.pending.setdefault(x, {})
+                    row[y] = row.get(y, 0.0) + weight
+                self.pending_count += 2
+        members.append((u, a))
+        
+        if self.pending_count >= COLLABORATOR_COMPACT_THRESHOLD:
+            self.compact()
+    
+    def compact(self):
+        """Fold pending increments into the CSR arrays"""
+        n = len(self.user_ids)
+        rows = [np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))]
+        cols = [self.indices]
+        vals = [self.data]
+        for x, row in self.pending.items():
+            rows.append(np.full(len(row), x, dtype=np.int64))
+            cols.append(np.fromiter(row.keys(), dtype=np.int64, count=len(row)))
+            vals.append(np.fromiter(row.values(), dtype=float, count=len(row)))
+        
+        keys, inverse = np.unique(np.concatenate(rows) * n + np.concatenate(cols), return_inverse=True)
+        self.data = np.bincount(inverse, weights=np.concatenate(vals))
+        self.indices = keys % n
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=self.indptr[1:])
+        self.pending = {}
+        self.pending_count = 0
+    
+    def row(self, u: int) -> tuple:
+        """(neighbor indices, weights) for a user, duplicates not yet merged"""
+        if u + 1 < len(self.indptr):
+            start, end = self.indptr[u], self.indptr[u + 1]
+            indices, data = self.indices[start:end], self.data[start:end]
+        else:
+            indices, data = self.indices[:0], self.data[:0]
+        extra = self.pending.get(u)
+        if extra:
+            indices = np.concatenate([indices, np.fromiter(extra.keys(), dtype=np.int64, count=len(extra))])
+            data = np.concatenate([data, np.fromiter(extra.values(), dtype=float, count=len(extra))])
+        return indices, data
+    
+    def recommend(self, user_id: str, k: int) -> List[Dict[str, Any]]:
+        """Top-k new collaborators for a user
+        
+        Scores people two hops away (collaborators of collaborators, weighted
+        by both edges) boosted by how well their role profile complements the
+        user's, plus a smaller pure role-complement term so members outside
+        the user's circle can surface too.
+        """
+        u = self.user_index.get(user_id)
+        if u is None:
+            return []
+        n = len(self.user_ids)
+        
+        neighbors, weights = self.row(u)
+        direct = np.bincount(neighbors, weights=weights, minlength=n)
+        # Neighbors' rows gathered into one bincount instead of one per neighbor
+        hop_indices, hop_weights = [self.indices[:0]], [self.data[:0]]
+        for v in np.flatnonzero(direct):
+            indices, data = self.row(v)
+            hop_indices.append(indices)
+            hop_weights.append(data * direct[v])
+        two_hop = np.bincount(np.concatenate(hop_indices), weights=np.concatenate(hop_weights), minlength=n)
+        
+        profiles = self.profiles[:n]
+        totals = profiles.sum(axis=1, keepdims=True)
+        shares = np.divide(profiles, totals, out=np.zeros_like(profiles), where=totals > 0)
+        complement = shares @ (COMPLEMENT_MATRIX @ shares[u])
+        
+        if two_hop.max(initial=0) > 0:
+            two_hop = two_hop / two_hop.max()
+        scores = two_hop * (1 + complement) + 0.1 * complement
+        scores[u] = 0
+        scores[direct > 0] = 0
+        
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [
+            {
+                "user_id": self.user_ids[v],
+                "score": round(float(scores[v]), 4),
+                "main_contributions": [
+                    CONTRIBUTION_TYPES[t] for t in np.argsort(-profiles[v])[:2] if profiles[v, t] > 0
+                ]
+            }
+            for v in top
+        ]
+
+collaborator_graph = CollaboratorGraph()
+
+async def build_collaborator_graph():
+    """Load every contribution into the collaborator graph"""
+    started = datetime.now(timezone.utc)
+    cursor = db.track_contributions.find(
+        {},
+        {"_id": 0, "contribution_id": 1, "track_id": 1, "user_id": 1, "contribution_type": 1, "created_at": 1}
+    ).sort("created_at", 1).batch_size(10000)
+    async for c in cursor:
+        collaborator_graph.add(c["track_id"], c["user_id"], c["contribution_type"])
+        created_at = as_utc(c["created_at"])
+        if created_at >= started - COLLABORATOR_SYNC_OVERLAP:
+            collaborator_graph.applied_locally[c["contribution_id"]] = created_at
+    collaborator_graph.watermark = started
+    collaborator_graph.compact()
+    logger.info(f"Built collaborator graph for {len(collaborator_graph.user_ids)} users")
+
+def record_collaboration(contribution: TrackContribution):
+    """Apply a contribution made on this worker to the graph"""
+    collaborator_graph.add(
+        contribution.track_id, contribution.user_id, contribution.contribution_type.value
+    )
+    collaborator_graph.applied_locally[contribution.contribution_id] = contribution.created_at
+
+async def sync_collaborator_graph():
+    """Apply contributions recorded by other workers since the last sync
+    
+    Each pass re-reads an overlap before the last one, so contributions whose
+    insert committed after a sync had already passed their created_at are
+    still picked up; applied_locally keeps them from being counted twice.
+    """
+    graph = collaborator_graph
+    started = datetime.now(timezone.utc)
+    since = (graph.watermark or started) - COLLABORATOR_SYNC_OVERLAP
+    cursor = db.track_contributions.find(
+        {"created_at": {"$gte": since}},
+        {"_id": 0, "contribution_id": 1, "track_id": 1, "user_id": 1, "contribution_type": 1, "created_at": 1}
+    ).sort("created_at", 1)
+    async for c in cursor:
+        if c["contribution_id"] not in graph.applied_locally:
+            graph.add(c["track_id"], c["user_id"], c["contribution_type"])
+            graph.applied_locally[c["contribution_id"]] = as_utc(c["created_at"])
+    graph.watermark = started
+    
+    # Forget contributions the next pass can no longer read
+    horizon = started - COLLABORATOR_SYNC_OVERLAP
+    graph.applied_locally = {
+        contribution_id: created_at
+        for contribution_id, created_at in graph.applied_locally.items()
+        if created_at >= horizon
+    }
+
+async def collaborator_sync_loop():
+    """Background job keeping this worker's graph in line with other workers"""
+    while True:
+        await asyncio.sleep(COLLABORATOR_SYNC_INTERVAL)
+        try:
+            await sync_collaborator_graph()
+        except Exception:
+            logger.exception("Collaborator graph sync failed")
+
+@api_router.get("/users/recommendations/collaborators")
+async def get_collaborator_recommendations(limit: int = 10, user: User = Depends(get_current_user)):
+    """Suggest members to work with, based on who collaborates with whom"""
+    recommendations = collaborator_graph.recommend(user.user_id, max(1, min(limit, 50)))
+    
+    user_docs = await db.users.find(
+        {"user_id": {"$in": [r["user_id"] for r in recommendations]}},
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1, "level": 1, "roles": 1}
+    ).to_list(None)
+    users_by_id = {u["user_id"]: u for u in user_docs}
+    
+    return [
+        {
+            **users_by_id[r["user_id"]],
+            **r,
+            "picture_variants": image_variants(users_by_id[r["user_id"]].get("picture_image_id"))
+        }
+        for r in recommendations
+        if r["user_id"] in users_by_id
+    ]
+
+# ============== GAMING ==============
+
+def participant_totals(user_id: str) -> Dict[str, Any]:
+    """Empty per-participant totals for a match summary"""
+    return {"user_id": user_id, "score": 0, "kills": 0, "deaths": 0, "assists": 0, "submissions": 0}
+
+async def update_match_summary(match_id: str, score: GameScore):
+    """Fold a submitted score into the match's denormalized summary"""
+    increments = {
+        "summary.score_count": 1,
+        "summary.totals.$[p].score": score.score,
+        "summary.totals.$[p].kills": score.kills,
+        "summary.totals.$[p].deaths": score.deaths,
+        "summary.totals.$[p].assists": score.assists,
+        "summary.totals.$[p].submissions": 1
+    }
+    
+    for _ in range(2):
+        result = await db.game_matches.update_one(
+            {"match_id": match_id, "summary.totals.user_id": score.user_id},
+            {"$inc": increments},
+            array_filters=[{"p.user_id": score.user_id}]
+        )
+        if result.matched_count:
+            break
+        
+        # First score from someone outside the participant list
+        totals = {
+            **participant_totals(score.user_id),
+            "score": score.score,
+            "kills": score.kills,
+            "deaths": score.deaths,
+            "assists": score.assists,
+            "submissions": 1
+        }
+        result = await db.game_matches.update_one(
+            {"match_id": match_id, "summary.totals.user_id": {"$ne": score.user_id}},
+            {"$inc": {"summary.score_count": 1}, "$push": {"summary.totals": totals}}
+        )
+        if result.matched_count:
+            break
+    
+    # Track the single highest submission, like the old sorted winner lookup
+    await db.game_matches.update_one(
+        {"match_id": match_id, "$or": [
+            {"summary.top_score": None},
+            {"summary.top_score": {"$lt": score.score}}
+        ]},
+        {"$set": {"summary.top_score": score.score, "summary.top_user_id": score.user_id}}
+    )
+
+async def backfill_score_game_types() -> Dict[str, Any]:
+    """Copy game_type/game_name from matches onto scores that predate them"""
+    await db.game_scores.aggregate([
+        {"$match": {"game_type": None}},
+        {"$lookup": {
+            "from": "game_matches",
+            "localField": "match_id",
+            "foreignField": "match_id",
+            "as": "match"
+        }},
+        {"$unwind": "$match"},
+        {"$project": {"_id": 1, "game_type": "$match.game_type", "game_name": "$match.game_name"}},
+        {"$merge": {"into": "game_scores", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]).to_list(None)
+    
+    return {"remaining": await db.game_scores.count_documents({"game_type": None})}
+
+def summary_scores(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-player score totals from a match summary, highest first"""
+    totals = match.get("summary", {}).get("totals", [])
+    return sorted(
+        (t for t in totals if t.get("submissions")),
+        key=lambda t: t["score"],
+        reverse=True
+    )
+
+async def backfill_match_summaries() -> Dict[str, Any]:
+    """Rebuild every match summary from game_scores with server-side $merge"""
+    await db.game_scores.aggregate([
+        {"$sort": {"score": -1}},
+        {"$group": {
+            "_id": {"match_id": "$match_id", "user_id": "$user_id"},
+            "score": {"$sum": "$score"},
+            "kills": {"$sum": "$kills"},
+            "deaths": {"$sum": "$deaths"},
+            "assists": {"$sum": "$assists"},
+            "submissions": {"$sum": 1},
+            "top_score": {"$first": "$score"}
+        }},
+        {"$sort": {"top_score": -1}},
+        {"$group": {
+            "_id": "$_id.match_id",
+            "score_count": {"$sum": "$submissions"},
+            "top_score": {"$first": "$top_score"},
+            "top_user_id": {"$first": "$_id.user_id"},
+            "totals": {"$push": {
+                "user_id": "$_id.user_id",
+                "score": "$score",
+                "kills": "$kills",
+                "deaths": "$deaths",
+                "assists": "$assists",
+                "submissions": "$submissions"
+            }}
+        }},
+        {"$project": {
+            "_id": 0,
+            "match_id": "$_id",
+            "summary": {
+                "score_count": "$score_count",
+                "top_score": "$top_score",
+                "top_user_id": "$top_user_id",
+                "totals": "$totals"
+            }
+        }},
+        {"$merge": {
+            "into": "game_matches",
+            "on": "match_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]).to_list(None)
+    
+    return {"matches": await db.game_matches.count_documents({"summary.score_count": {"$gt": 0}})}
+
+@api_router.get("/matches")
+async def get_matches(
+    status: Optional[str] = None,
+    limit: int = 20,
+    user: User = Depends(get_current_user)
+):
+    """Get game matches"""
+    query = {}
+    if status:
+        query["status"] = status
+    
+    matches = await db.game_matches.find(
+        query,
+        {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    
+    # Enrich with participant details
+    for match in matches:
+        participants = await db.users.find(
+            {"user_id": {"$in": match.get("participants", [])}},
+            {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1}
+        ).to_list(100)
+        for p in participants:
+            p["picture_variants"] = image_variants(p.get("picture_image_id"))
+        match["participant_details"] = participants
+        
+        # Scores come from the denormalized summary
+        match["scores"] = summary_scores(match)
+    
+    return matches
+
+@api_router.post("/matches")
+async def create_match(
+    data: MatchCreate,
+    user: User = Depends(get_current_user)
+):
+    """Create a new match"""
+    match = GameMatch(
+        **data.dict(),
+        created_by=user.user_id
+    )
+    
+    # Add creator to participants if not included
+    if user.user_id not in match.participants:
+        match.participants.append(user.user_id)
+    match.summary.totals = [participant_totals(p) for p in dict.fromkeys(match.participants)]
+    
+    await db.game_matches.insert_one(match.dict())
+    
+    # Log activity
+    await log_activity(
+        user.user_id, user.name, "match_created",
+        f"{user.name} created a {data.game_type.value} match: {data.title}"
+    )
+    
+    return match.dict()
+
+@api_router.get("/matches/{match_id}")
+async def get_match(match_id: str, user: User = Depends(get_current_user)):
+    """Get match details"""
+    match = await db.game_matches.find_one({"match_id": match_id}, {"_id": 0})
+    
+    if not match:
+        raise HTTPException(status_code=404, detail="Match not found")
+    
+    # Get participant details
+    participants = await db.users.find(
+        {"user_id": {"$in": match.get("participants", [])}},
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1, "level": 1}
+    ).to_list(100)
+    for p in participants:
+        p["picture_variants"] = image_variants(p.get("picture_image_id"))
+    
+    # Get scores
+    scores = await db.game_scores.find(
+        {"match_id": match_id},
+        {"_id": 0}
+    ).sort("score", -1).to_list(100)
+    
+    return {
+        **match,
+        "participant_details": participants,
+        "scores": scores
+    }
+
+@api_router.post("/matches/{match_id}/start")
+async def start_match(match_id: str, user: User = Depends(get_current_user)):
+    """Start a match"""
+    match = await db.game_matches.find_one({"match_id": match_id})
+    if not match:
+        raise HTTPException(status_code=404, detail="Match not found")
+    
+    if match["created_by"] != user.user_id and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    await db.game_matches.update_one(
+        {"match_id": match_id},
         {"$set": {
             "status": "in_progress",
             "started_at": datetime.now(timezone.utc)
         }}
     )
+    await get_live_scoreboard(match_id)
     
     return {"success": True}
 
@@ -880,7 +2615,7 @@ async def start_match(match_id: str, user: User = Depends(get_current_user)):
 async def submit_score(
     match_id: str,
     data: ScoreSubmit,
-    user: User = Depends(get_current_user)
+    user: User = Depends(rate_limited("score"))
 ):
     """Submit a score for a match"""
     match = await db.game_matches.find_one({"match_id": match_id})
@@ -892,11 +2627,7 @@ async def submit_score(
         raise HTTPException(status_code=400, detail="Invalid score")
     
     # Calculate XP based on performance
-    xp_earned = min(data.score // 100, 50) + (data.kills * 5)
-    if data.rank_position == 1:
-        xp_earned += 100
-    elif data.rank_position <= 3:
-        xp_earned += 50
+    xp_earned = score_xp(data.score, data.kills, data.rank_position)
     
     score = GameScore(
         match_id=match_id,
@@ -906,10 +2637,31 @@ async def submit_score(
         deaths=data.deaths,
         assists=data.assists,
         rank_position=data.rank_position,
-        xp_earned=xp_earned
+        xp_earned=xp_earned,
+        game_type=match.get("game_type"),
+        game_name=match.get("game_name")
     )
     
     await db.game_scores.insert_one(score.dict())
+    await update_match_summary(match_id, score)
+    gaming_increments = {
+        "score": data.score,
+        "kills": data.kills,
+        "deaths": data.deaths,
+        "wins": 1 if data.rank_position == 1 else 0,
+        "matches": 1
+    }
+    await record_bucket(data.user_id, "gaming", score.created_at, gaming_increments)
+    skill_cache.record(data.user_id, gaming_increments)
+    if score.game_type:
+        await record_bucket(
+            data.user_id, gaming_bucket_category(score.game_type), score.created_at, gaming_increments
+        )
+    
+    # Push the delta to live subscribers
+    scoreboard = live_matches.get(match_id)
+    if scoreboard:
+        scoreboard.apply(score.dict())
     
     # Award XP to the player
     await add_xp(data.user_id, xp_earned, "gaming", f"Match score: {data.score}")
@@ -923,27 +2675,39 @@ async def complete_match(match_id: str, user: User = Depends(get_current_user)):
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    # Get highest scorer
-    top_score = await db.game_scores.find_one(
-        {"match_id": match_id},
-        {"_id": 0},
-        sort=[("score", -1)]
-    )
-    
-    winner_id = top_score["user_id"] if top_score else None
+    # Highest scorer, kept up to date by submit_score
+    summary = match.get("summary")
+    if summary is not None:
+        winner_id = summary.get("top_user_id")
+    else:
+        # Matches created before summaries existed
+        top_score = await db.game_scores.find_one(
+            {"match_id": match_id},
+            {"_id": 0},
+            sort=[("score", -1)]
+        )
+        winner_id = top_score["user_id"] if top_score else None
     
-    await db.game_matches.update_one(
-        {"match_id": match_id},
+    # Only the request that flips the status rates the match and pays the winner
+    claimed = await db.game_matches.find_one_and_update(
+        {"match_id": match_id, "status": {"$ne": "completed"}},
         {"$set": {
             "status": "completed",
             "ended_at": datetime.now(timezone.utc),
-            "winner_id": winner_id
+            "winner_id": winner_id,
+            "ratings_pending": True
         }}
     )
+    if claimed is None:
+        completed = await db.game_matches.find_one({"match_id": match_id}, {"_id": 0, "winner_id": 1})
+        return {"success": True, "winner_id": completed.get("winner_id")}
+    
+    # Final event for live subscribers, then drop the scoreboard
+    close_live_scoreboard(match_id, winner_id)
     
     # Award winner bonus
     if winner_id:
-        await add_xp(winner_id, 50, "gaming", "Match victory!")
+        await add_xp(winner_id, MATCH_WIN_XP, "gaming", "Match victory!")
         
         # Get winner name
         winner = await db.users.find_one({"user_id": winner_id}, {"_id": 0})
@@ -953,24 +2717,321 @@ async def complete_match(match_id: str, user: User = Depends(get_current_user)):
                 f"{winner['name']} won the match!"
             )
     
+    # Rated last; a match left pending is picked up by the ratings sweep or a rebuild
+    try:
+        await apply_match_ratings(match_id)
+    except Exception:
+        logger.exception(f"Rating match {match_id} failed")
+    
     return {"success": True, "winner_id": winner_id}
 
-# ============== LEADERBOARDS ==============
+# ============== LIVE MATCHES ==============
 
-@api_router.get("/leaderboards")
-async def get_leaderboards(user: User = Depends(get_current_user)):
-    """Get all leaderboard categories"""
-    categories = [
-        {
-            "id": "attendance_monthly",
-            "name": "Attendance Champions",
-            "description": "Top members by monthly studio attendance",
-            "icon": "calendar",
-            "formula": "Total check-ins + (duration_hours * 2)"
-        },
-        {
-            "id": "music_impact",
-            "name": "Music Impact",
+# Seconds between polls for scores and completions written by other workers
+LIVE_SYNC_INTERVAL = 1
+# Re-read scores this far before the last poll to absorb clock skew between workers
+LIVE_SYNC_OVERLAP = timedelta(seconds=10)
+# Scoreboards nobody has watched for this long are dropped
+LIVE_IDLE_TTL = timedelta(minutes=10)
+
+class LiveScoreboard:
+    """In-memory scoreboard of a match in progress, highest score first"""
+    
+    def __init__(self, match_id: str):
+        self.match_id = match_id
+        self.channel = EventChannel(buffer_size=100, queue_size=50)
+        self.loaded = asyncio.Event()
+        self.synced_at = datetime.now(timezone.utc)
+        self.touched_at = self.synced_at
+        self._keys: List[tuple] = []
+        self._score_ids: set = set()
+        self.scores: List[Dict[str, Any]] = []
+    
+    def add(self, score: Dict[str, Any]) -> Optional[int]:
+        """Insert a score and return its 1-based position, or None if already on the board"""
+        if score["score_id"] in self._score_ids:
+            return None
+        self._score_ids.add(score["score_id"])
+        key = (-score["score"], score["score_id"])
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self.scores.insert(index, score)
+        return index + 1
+    
+    def apply(self, score: Dict[str, Any]):
+        """Add a score and tell subscribers, unless the board already has it"""
+        position = self.add(score)
+        if position is not None:
+            self.channel.publish("score", {"score": score, "position": position})
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {"match_id": self.match_id, "scores": self.scores}
+
+# Scoreboards of matches that are pending or in progress, by match_id
+live_matches: Dict[str, LiveScoreboard] = {}
+
+async def get_live_scoreboard(match_id: str) -> LiveScoreboard:
+    """Get a match's live scoreboard, loading it once if this worker lacks it
+    
+    The board is registered before the load so scores submitted meanwhile are
+    applied to it; the score_id check drops the ones the load also returns.
+    """
+    scoreboard = live_matches.get(match_id)
+    if scoreboard is None:
+        scoreboard = live_matches[match_id] = LiveScoreboard(match_id)
+        try:
+            async for score in db.game_scores.find({"match_id": match_id}, {"_id": 0}):
+                scoreboard.add(score)
+        except Exception:
+            live_matches.pop(match_id, None)
+            raise
+        scoreboard.loaded.set()
+    await scoreboard.loaded.wait()
+    scoreboard.touched_at = datetime.now(timezone.utc)
+    return scoreboard
+
+def close_live_scoreboard(match_id: str, winner_id: Optional[str]):
+    """Send the final event to a match's subscribers and drop its scoreboard"""
+    scoreboard = live_matches.pop(match_id, None)
+    if scoreboard:
+        scoreboard.channel.publish("complete", {**scoreboard.snapshot(), "winner_id": winner_id})
+        scoreboard.channel.close()
+
+async def sync_live_matches():
+    """Relay scores and completions from other workers to this worker's scoreboards"""
+    boards = {match_id: board for match_id, board in live_matches.items() if board.loaded.is_set()}
+    if not boards:
+        return
+    started = datetime.now(timezone.utc)
+    since = min(board.synced_at for board in boards.values()) - LIVE_SYNC_OVERLAP
+    cursor = db.game_scores.find(
+        {"match_id": {"$in": list(boards)}, "created_at": {"$gte": since}},
+        {"_id": 0}
+    ).sort("created_at", ASCENDING)
+    async for score in cursor:
+        boards[score["match_id"]].apply(score)
+    for board in boards.values():
+        board.synced_at = started
+    
+    ended = await db.game_matches.find(
+        {"match_id": {"$in": list(boards)}, "status": "completed"},
+        {"_id": 0, "match_id": 1, "winner_id": 1}
+    ).to_list(None)
+    for match in ended:
+        close_live_scoreboard(match["match_id"], match.get("winner_id"))
+    
+    # Matches abandoned without being completed
+    for match_id, board in boards.items():
+        if not board.channel.subscribers and started - board.touched_at > LIVE_IDLE_TTL:
+            live_matches.pop(match_id, None)
+        elif board.channel.subscribers:
+            board.touched_at = started
+
+async def live_match_sync_loop():
+    """Background job keeping live scoreboards in line with other workers"""
+    while True:
+        await asyncio.sleep(LIVE_SYNC_INTERVAL)
+        try:
+            await sync_live_matches()
+        except Exception:
+            logger.exception("Live match sync failed")
+
+@api_router.get("/matches/{match_id}/live")
+async def stream_match(match_id: str, request: Request, user: User = Depends(get_current_user)):
+    """Stream a match's scoreboard as Server-Sent Events
+    
+    Sends the current standings first, then a `score` event per submission and
+    a final `complete` event when the match ends.
+    """
+    scoreboard = live_matches.get(match_id)
+    if scoreboard is None:
+        match = await db.game_matches.find_one({"match_id": match_id}, {"_id": 0, "status": 1})
+        if not match:
+            raise HTTPException(status_code=404, detail="Match not found")
+        if match.get("status") == "completed":
+            raise HTTPException(status_code=400, detail="Match already completed")
+    scoreboard = await get_live_scoreboard(match_id)
+    
+    queue = scoreboard.channel.subscribe()
+    initial = (scoreboard.channel.last_id, "scoreboard", jsonable_encoder(scoreboard.snapshot()))
+    return sse_response(request, scoreboard.channel, queue, initial)
+
+# ============== MATCHMAKING ==============
+
+class SkillCache:
+    """Per-player gaming totals kept in memory for matchmaking
+    
+    Loaded with one aggregation at startup and updated from submit_score, so
+    building teams never re-aggregates game_scores.
+    """
+    
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, int]] = {}
+        self.synced_at: Optional[datetime] = None
+    
+    def record(self, user_id: str, increments: Dict[str, int]):
+        totals = self.totals.setdefault(user_id, {"kills": 0, "deaths": 0, "wins": 0, "matches": 0})
+        for field in totals:
+            totals[field] += increments.get(field, 0)
+    
+    async def load(self, user_ids: Optional[List[str]] = None):
+        """Aggregate totals for the given users (everyone when None)"""
+        if user_ids is None:
+            self.synced_at = datetime.now(timezone.utc)
+        pipeline = []
+        if user_ids is not None:
+            pipeline.append({"$match": {"user_id": {"$in": user_ids}}})
+        pipeline.append({"$group": {
+            "_id": "$user_id",
+            "kills": {"$sum": "$kills"},
+            "deaths": {"$sum": "$deaths"},
+            "wins": {"$sum": {"$cond": [{"$eq": ["$rank_position", 1]}, 1, 0]}},
+            "matches": {"$sum": 1}
+        }})
+        async for row in db.game_scores.aggregate(pipeline):
+            user_id = row.pop("_id")
+            self.totals[user_id] = row
+        # Players without scores are cached as empty so they aren't re-queried
+        for user_id in user_ids or []:
+            self.totals.setdefault(user_id, {"kills": 0, "deaths": 0, "wins": 0, "matches": 0})
+    
+    async def sync(self):
+        """Recompute totals of players who scored on any worker since the last sync"""
+        started = datetime.now(timezone.utc)
+        since = (self.synced_at or started) - RANKING_SYNC_OVERLAP
+        user_ids = await db.game_scores.distinct("user_id", {"created_at": {"$gte": since}})
+        if user_ids:
+            await self.load(user_ids)
+        self.synced_at = started
+    
+    def skill(self, user_id: str) -> float:
+        """Skill estimate from smoothed K/D and win rate"""
+        t = self.totals.get(user_id, {})
+        kd = (t.get("kills", 0) + 1) / (t.get("deaths", 0) + 1)
+        win_rate = (t.get("wins", 0) + 1) / (t.get("matches", 0) + 2)
+        return round(100 * win_rate + 25 * min(kd, 4.0), 2)
+
+skill_cache = SkillCache()
+
+def balance_teams(skills: np.ndarray, team_count: int, max_rounds: int = 100) -> List[List[int]]:
+    """Split players into equal-size teams with close total skill
+    
+    Greedy first (strongest remaining player to the weakest team with room),
+    then local search swapping the best pair between the strongest and
+    weakest teams until the spread stops shrinking.
+    """
+    n = len(skills)
+    capacity = [n // team_count + (1 if t < n % team_count else 0) for t in range(team_count)]
+    teams: List[List[int]] = [[] for _ in range(team_count)]
+    sums = np.zeros(team_count)
+    
+    for i in np.argsort(-skills, kind="stable"):
+        open_teams = [t for t in range(team_count) if len(teams[t]) < capacity[t]]
+        t = min(open_teams, key=lambda t: sums[t])
+        teams[t].append(int(i))
+        sums[t] += skills[i]
+    
+    for _ in range(max_rounds):
+        hi, lo = int(np.argmax(sums)), int(np.argmin(sums))
+        gap = sums[hi] - sums[lo]
+        if gap <= 0:
+            break
+        a = skills[teams[hi]]
+        b = skills[teams[lo]]
+        # Swapping a[i] and b[j] moves 2 * (a[i] - b[j]) of skill across the gap
+        new_gap = np.abs(gap - 2 * (a[:, None] - b[None, :]))
+        i, j = np.unravel_index(np.argmin(new_gap), new_gap.shape)
+        if new_gap[i, j] >= gap:
+            break
+        teams[hi][i], teams[lo][j] = teams[lo][j], teams[hi][i]
+        sums[hi] += b[j] - a[i]
+        sums[lo] += a[i] - b[j]
+    
+    return teams
+
+def seed_bracket(skills: np.ndarray) -> List[tuple]:
+    """First-round pairings for a seeded single-elimination bracket
+    
+    Returns (player, opponent) index pairs with None for byes, using the
+    standard order so top seeds can only meet in later rounds.
+    """
+    seeds = list(np.argsort(-skills, kind="stable"))
+    size = 1
+    while size < len(seeds):
+        size *= 2
+    
+    order = [0]
+    while len(order) < size:
+        length = len(order) * 2
+        order = [x for seed in order for x in (seed, length - 1 - seed)]
+    
+    slots = [int(seeds[s]) if s < len(seeds) else None for s in order]
+    return [(slots[i], slots[i + 1]) for i in range(0, size, 2)]
+
+async def get_checked_in_gamers() -> List[Dict[str, Any]]:
+    """Players with the gaming role who are currently checked in"""
+    return [
+        {k: m[k] for k in ("user_id", "name", "picture", "level")}
+        for m in presence.members.values()
+        if UserRole.GAMING.value in m.get("roles", [])
+    ]
+
+@api_router.post("/matches/matchmaking")
+async def matchmake(data: MatchmakingRequest, user: User = Depends(get_current_user)):
+    """Build balanced teams or a seeded bracket from checked-in gamers"""
+    if data.mode not in ("teams", "bracket"):
+        raise HTTPException(status_code=400, detail="Mode must be teams or bracket")
+    
+    players = await get_checked_in_gamers()
+    missing = [p["user_id"] for p in players if p["user_id"] not in skill_cache.totals]
+    if missing:
+        await skill_cache.load(missing)
+    
+    started = time.perf_counter()
+    for p in players:
+        p["skill"] = skill_cache.skill(p["user_id"])
+    skills = np.array([p["skill"] for p in players], dtype=float)
+    
+    if data.mode == "teams":
+        if data.team_count < 2 or len(players) < data.team_count:
+            raise HTTPException(status_code=400, detail="Not enough checked-in players for the requested teams")
+        teams = [
+            {"players": [players[i] for i in team], "total_skill": round(float(skills[team].sum()), 2)}
+            for team in balance_teams(skills, data.team_count)
+        ]
+        totals = [t["total_skill"] for t in teams]
+        result = {"teams": teams, "spread": round(max(totals) - min(totals), 2)}
+    else:
+        if len(players) < 2:
+            raise HTTPException(status_code=400, detail="Not enough checked-in players for a bracket")
+        result = {"pairings": [
+            [players[i] if i is not None else None for i in pair]
+            for pair in seed_bracket(skills)
+        ]}
+    
+    return {
+        "mode": data.mode,
+        "player_count": len(players),
+        **result,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+# ============== LEADERBOARDS ==============
+
+@api_router.get("/leaderboards")
+async def get_leaderboards(user: User = Depends(get_current_user)):
+    """Get all leaderboard categories"""
+    categories = [
+        {
+            "id": "attendance_monthly",
+            "name": "Attendance Champions",
+            "description": "Top members by monthly studio attendance",
+            "icon": "calendar",
+            "formula": "Total check-ins + (duration_hours * 2)"
+        },
+        {
+            "id": "music_impact",
+            "name": "Music Impact",
             "description": "Members with highest music contributions",
             "icon": "music",
             "formula": "(tracks * 50) + (contributions * 30) + (listens/100)"
@@ -988,87 +3049,163 @@ async def get_leaderboards(user: User = Depends(get_current_user)):
             "description": "Members excelling across all activities",
             "icon": "star",
             "formula": "(attendance_score * 0.3) + (music_score * 0.35) + (gaming_score * 0.35)"
+        },
+        {
+            "id": "xp",
+            "name": "XP Ranking",
+            "description": "Members ranked live by lifetime XP",
+            "icon": "trending-up",
+            "formula": "Total XP earned across all levels"
+        },
+        {
+            "id": "gaming_rating",
+            "name": "Gaming MMR",
+            "description": "Skill rating that accounts for opponent strength",
+            "icon": "pulse",
+            "formula": "Multiplayer Elo over finishing positions (K=32)"
         }
     ]
     
     return categories
 
-@api_router.get("/leaderboards/{category}")
-async def get_leaderboard(
-    category: str,
-    period: LeaderboardPeriod = LeaderboardPeriod.MONTHLY,
-    limit: int = 50,
-    user: User = Depends(get_current_user)
-):
-    """Get leaderboard entries for a category"""
-    # Calculate date range
-    now = datetime.now(timezone.utc)
+def leaderboard_start_date(period: LeaderboardPeriod, now: datetime) -> datetime:
+    """Start of the sliding window for a leaderboard period"""
     if period == LeaderboardPeriod.WEEKLY:
-        start_date = now - timedelta(days=7)
+        return now - timedelta(days=7)
     elif period == LeaderboardPeriod.MONTHLY:
-        start_date = now - timedelta(days=30)
+        return now - timedelta(days=30)
     elif period == LeaderboardPeriod.SEASONAL:
-        start_date = now - timedelta(days=90)
-    else:
-        start_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        return now - timedelta(days=90)
+    return datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+# Score formulas shared by the raw and rollup leaderboard pipelines
+ATTENDANCE_SCORE_FIELDS = {
+    "score": {"$add": ["$total_sessions", {"$multiply": [{"$divide": ["$total_duration", 60]}, 2]}]}
+}
+
+GAMING_SCORE_FIELDS = {
+    "kd_ratio": {"$cond": [
+        {"$gt": ["$total_deaths", 0]},
+        {"$divide": ["$total_kills", "$total_deaths"]},
+        "$total_kills"
+    ]},
+    "score": {"$add": [
+        {"$multiply": ["$wins", 100]},
+        {"$divide": ["$total_score", 1000]},
+        {"$multiply": ["$total_kills", 2]}
+    ]}
+}
+
+def score_hybrid(
+    att_counts: Dict[str, int],
+    track_counts: Dict[str, int],
+    contrib_counts: Dict[str, int],
+    game_totals: Dict[str, int],
+    limit: int
+) -> List[Dict[str, Any]]:
+    """Combine per-user activity totals into hybrid leaderboard results"""
+    results = []
+    user_ids = set(att_counts) | set(track_counts) | set(contrib_counts) | set(game_totals)
+    for user_id in user_ids:
+        # Attendance score
+        att_score = att_counts.get(user_id, 0) * 10
+        
+        # Music score
+        music_score = track_counts.get(user_id, 0) * 50 + contrib_counts.get(user_id, 0) * 30
+        
+        # Gaming score
+        gaming_score = game_totals.get(user_id, 0) / 100
+        
+        total_score = (att_score * 0.3) + (music_score * 0.35) + (gaming_score * 0.35)
+        
+        if total_score > 0:
+            results.append({
+                "_id": user_id,
+                "score": total_score,
+                "att_score": att_score,
+                "music_score": music_score,
+                "gaming_score": gaming_score
+            })
     
-    entries = []
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results[:limit]
+
+async def compute_leaderboard(
+    category: str,
+    start_date: datetime,
+    end_date: datetime,
+    limit: int,
+    game_type: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Aggregate raw leaderboard results for a category over [start_date, end_date)
+    
+    `game_type` narrows gaming_ranked to one genre.
+    """
+    date_range = {"$gte": start_date, "$lt": end_date}
     
     if category == "attendance_monthly":
         # Aggregate attendance
         pipeline = [
-            {"$match": {"check_in": {"$gte": start_date}}},
+            {"$match": {"check_in": date_range}},
             {"$group": {
                 "_id": "$user_id",
                 "total_sessions": {"$sum": 1},
                 "total_duration": {"$sum": "$duration_minutes"}
             }},
-            {"$addFields": {
-                "score": {"$add": ["$total_sessions", {"$multiply": [{"$divide": ["$total_duration", 60]}, 2]}]}
-            }},
+            {"$addFields": ATTENDANCE_SCORE_FIELDS},
             {"$sort": {"score": -1}},
             {"$limit": limit}
         ]
         results = await db.attendance.aggregate(pipeline).to_list(limit)
         
     elif category == "music_impact":
-        # Aggregate music activity
+        # Tracks and contributions in the period, merged into one pipeline
         pipeline = [
+            {"$match": {"created_at": date_range}},
             {"$group": {
                 "_id": "$created_by",
                 "tracks_created": {"$sum": 1},
                 "total_listens": {"$sum": "$listens"},
                 "total_likes": {"$sum": "$likes"}
             }},
+            {"$unionWith": {
+                "coll": "track_contributions",
+                "pipeline": [
+                    {"$match": {"created_at": date_range}},
+                    {"$group": {"_id": "$user_id", "contributions": {"$sum": 1}}}
+                ]
+            }},
+            {"$group": {
+                "_id": "$_id",
+                "tracks_created": {"$sum": "$tracks_created"},
+                "total_listens": {"$sum": "$total_listens"},
+                "total_likes": {"$sum": "$total_likes"},
+                "contributions": {"$sum": "$contributions"}
+            }},
             {"$addFields": {
                 "score": {"$add": [
                     {"$multiply": ["$tracks_created", 50]},
                     {"$divide": ["$total_listens", 10]},
-                    {"$multiply": ["$total_likes", 5]}
+                    {"$multiply": ["$total_likes", 5]},
+                    {"$multiply": ["$contributions", 30]}
                 ]}
             }},
             {"$sort": {"score": -1}},
             {"$limit": limit}
         ]
         results = await db.tracks.aggregate(pipeline).to_list(limit)
-        
-        # Also count contributions
-        contrib_pipeline = [
-            {"$group": {
-                "_id": "$user_id",
-                "contributions": {"$sum": 1}
-            }}
-        ]
-        contribs = await db.track_contributions.aggregate(contrib_pipeline).to_list(1000)
-        contrib_map = {c["_id"]: c["contributions"] for c in contribs}
-        
-        for r in results:
-            r["contributions"] = contrib_map.get(r["_id"], 0)
-            r["score"] += r["contributions"] * 30
             
     elif category == "gaming_ranked":
         # Aggregate gaming stats
+        score_filter = {"created_at": date_range}
+        if game_type:
+            score_filter["game_type"] = game_type
         pipeline = [
+            {"$match": score_filter},
+            # Only indexed fields, so the scan is covered by the period index
+            {"$project": {
+                "_id": 0, "user_id": 1, "score": 1, "kills": 1, "deaths": 1, "rank_position": 1
+            }},
             {"$group": {
                 "_id": "$user_id",
                 "total_score": {"$sum": "$score"},
@@ -1077,80 +3214,1171 @@ async def get_leaderboard(
                 "wins": {"$sum": {"$cond": [{"$eq": ["$rank_position", 1]}, 1, 0]}},
                 "matches": {"$sum": 1}
             }},
-            {"$addFields": {
-                "kd_ratio": {"$cond": [
-                    {"$gt": ["$total_deaths", 0]},
-                    {"$divide": ["$total_kills", "$total_deaths"]},
-                    "$total_kills"
-                ]},
-                "score": {"$add": [
-                    {"$multiply": ["$wins", 100]},
-                    {"$divide": ["$total_score", 1000]},
-                    {"$multiply": ["$total_kills", 2]}
-                ]}
-            }},
+            {"$addFields": GAMING_SCORE_FIELDS},
             {"$sort": {"score": -1}},
             {"$limit": limit}
         ]
         results = await db.game_scores.aggregate(pipeline).to_list(limit)
         
     elif category == "hybrid_master":
-        # Get all users and calculate hybrid scores
-        users = await db.users.find({}, {"_id": 0}).to_list(1000)
-        results = []
+        # One indexed range aggregation per source instead of per-user counts
+        async def count_by(collection, user_field: str, date_field: str, value=1):
+            pipeline = [
+                {"$match": {date_field: date_range}},
+                {"$group": {"_id": f"${user_field}", "value": {"$sum": value}}}
+            ]
+            rows = await collection.aggregate(pipeline).to_list(None)
+            return {r["_id"]: r["value"] for r in rows}
         
-        for u in users:
-            user_id = u["user_id"]
-            
-            # Attendance score
-            att_count = await db.attendance.count_documents({"user_id": user_id})
-            att_score = att_count * 10
-            
-            # Music score
-            track_count = await db.tracks.count_documents({"created_by": user_id})
-            contrib_count = await db.track_contributions.count_documents({"user_id": user_id})
-            music_score = track_count * 50 + contrib_count * 30
-            
-            # Gaming score
-            gaming_stats = await db.game_scores.find({"user_id": user_id}).to_list(1000)
-            gaming_score = sum(s.get("score", 0) for s in gaming_stats) / 100
-            
-            total_score = (att_score * 0.3) + (music_score * 0.35) + (gaming_score * 0.35)
-            
-            if total_score > 0:
-                results.append({
-                    "_id": user_id,
-                    "score": total_score,
-                    "att_score": att_score,
-                    "music_score": music_score,
-                    "gaming_score": gaming_score
-                })
+        att_counts = await count_by(db.attendance, "user_id", "check_in")
+        track_counts = await count_by(db.tracks, "created_by", "created_at")
+        contrib_counts = await count_by(db.track_contributions, "user_id", "created_at")
+        game_totals = await count_by(db.game_scores, "user_id", "created_at", "$score")
         
-        results.sort(key=lambda x: x["score"], reverse=True)
-        results = results[:limit]
+        results = score_hybrid(att_counts, track_counts, contrib_counts, game_totals, limit)
     else:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    # Enrich with user details and assign ranks
-    entries = []
-    for i, r in enumerate(results):
-        user_doc = await db.users.find_one({"user_id": r["_id"]}, {"_id": 0})
-        if user_doc:
-            entries.append({
-                "rank": i + 1,
-                "user_id": r["_id"],
-                "name": user_doc.get("name", "Unknown"),
-                "picture": user_doc.get("picture"),
-                "level": user_doc.get("level", 1),
-                "score": round(r.get("score", 0), 2),
-                "details": {k: v for k, v in r.items() if k not in ["_id", "score"]}
-            })
+    return results
+
+async def build_leaderboard_entries(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Enrich aggregated results with user details and assign ranks"""
+    user_docs = await db.users.find(
+        {"user_id": {"$in": [r["_id"] for r in results]}},
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1, "level": 1}
+    ).to_list(None)
+    users_by_id = {u["user_id"]: u for u in user_docs}
+    
+    entries = []
+    for r in results:
+        user_doc = users_by_id.get(r["_id"])
+        if user_doc:
+            entries.append({
+                "rank": len(entries) + 1,
+                "user_id": r["_id"],
+                "name": user_doc.get("name", "Unknown"),
+                "picture": user_doc.get("picture"),
+                "picture_variants": image_variants(user_doc.get("picture_image_id")),
+                "level": user_doc.get("level", 1),
+                "score": round(r.get("score", 0), 2),
+                "details": {k: v for k, v in r.items() if k not in ["_id", "score"]}
+            })
+    
+    return entries
+
+# Leaderboards refresh on every phone at once; share the aggregation
+leaderboard_flight = SingleFlight("leaderboards", ttl=5)
+
+@api_router.get("/leaderboards/{category}")
+async def get_leaderboard(
+    category: str,
+    period: LeaderboardPeriod = LeaderboardPeriod.MONTHLY,
+    limit: int = 50,
+    game_type: Optional[GameType] = None,
+    user: User = Depends(get_current_user)
+):
+    """Get leaderboard entries for a category"""
+    if category == "gaming_rating":
+        return await get_rated_leaderboard(game_type.value if game_type else OVERALL_RATING, limit)
+    
+    if category in RANKED_INDEXES:
+        # Live rankings are lifetime totals served straight from memory
+        items = RANKED_INDEXES[category].slice(0, limit)
+        return {
+            "category": category,
+            "period": LeaderboardPeriod.ALL_TIME.value,
+            "entries": await build_ranked_entries(items, 1),
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+    
+    # Only the gaming board is split by genre
+    genre = game_type.value if game_type and category == "gaming_ranked" else None
+    
+    return await leaderboard_flight.do(
+        (category, period.value, limit, genre),
+        lambda: load_leaderboard(category, period, limit, genre)
+    )
+
+async def load_leaderboard(
+    category: str,
+    period: LeaderboardPeriod,
+    limit: int,
+    game_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """Compute a leaderboard response for a category and period"""
+    now = datetime.now(timezone.utc)
+    
+    if period == LeaderboardPeriod.SEASONAL:
+        # Seasonal boards follow the active season's exact dates when one exists
+        season = await get_active_season(now)
+        if season and not game_type:
+            snapshot = await get_season_standings(season, category, limit)
+            return {
+                "category": category,
+                "period": period.value,
+                "season_id": season["season_id"],
+                "entries": snapshot["entries"][:limit],
+                "updated_at": as_utc(snapshot["calculated_at"]).isoformat()
+            }
+        if season:
+            # Per-genre boards are not snapshotted; rank the season's raw history
+            end_date = min(as_utc(season["end_date"]), now)
+            results = await compute_leaderboard(
+                category, as_utc(season["start_date"]), end_date, limit, game_type
+            )
+            return {
+                "category": category,
+                "period": period.value,
+                "season_id": season["season_id"],
+                "game_type": game_type,
+                "entries": await build_leaderboard_entries(results),
+                "updated_at": now.isoformat()
+            }
+    
+    if period != LeaderboardPeriod.ALL_TIME and category in BUCKETED_CATEGORIES:
+        # Sliding windows are summed from daily rollups, aligned to UTC days
+        start_date = start_of_day(leaderboard_start_date(period, now))
+        results = await compute_leaderboard_from_buckets(category, start_date, now, limit, game_type)
+    else:
+        start_date = leaderboard_start_date(period, now)
+        results = await compute_leaderboard(category, start_date, now, limit, game_type)
+    entries = await build_leaderboard_entries(results)
+    
+    return {
+        "category": category,
+        "period": period.value,
+        "game_type": game_type,
+        "entries": entries,
+        "updated_at": now.isoformat()
+    }
+
+# ============== SCORE ROLLUPS ==============
+
+# Leaderboard categories that can be served from daily score buckets
+BUCKETED_CATEGORIES = {"attendance_monthly", "gaming_ranked", "hybrid_master"}
+
+def gaming_bucket_category(game_type: str) -> str:
+    """Bucket category holding gaming totals for one GameType"""
+    return f"gaming:{GameType(game_type).value}"
+
+def start_of_day(value: datetime) -> datetime:
+    """Truncate a datetime to midnight UTC"""
+    return value.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def record_bucket(user_id: str, category: str, when: datetime, increments: Dict[str, int]):
+    """Add to a user's daily score bucket for a category"""
+    await db.score_buckets.update_one(
+        {"user_id": user_id, "category": category, "day": start_of_day(as_utc(when))},
+        {"$inc": increments},
+        upsert=True
+    )
+
+async def compute_leaderboard_from_buckets(
+    category: str,
+    start_date: datetime,
+    end_date: datetime,
+    limit: int,
+    game_type: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Leaderboard results summed from daily buckets over [start_date, end_date)
+    
+    Produces the same numbers as compute_leaderboard for day-aligned ranges,
+    reading at most one bucket per user per day through the (category, day) index.
+    """
+    day_range = {"$gte": start_of_day(start_date), "$lt": end_date}
+    
+    if category == "attendance_monthly":
+        pipeline = [
+            {"$match": {"category": "attendance", "day": day_range}},
+            {"$group": {
+                "_id": "$user_id",
+                "total_sessions": {"$sum": "$sessions"},
+                "total_duration": {"$sum": "$duration"}
+            }},
+            {"$addFields": ATTENDANCE_SCORE_FIELDS},
+            {"$sort": {"score": -1}},
+            {"$limit": limit}
+        ]
+        return await db.score_buckets.aggregate(pipeline).to_list(limit)
+    
+    elif category == "gaming_ranked":
+        bucket_category = gaming_bucket_category(game_type) if game_type else "gaming"
+        pipeline = [
+            {"$match": {"category": bucket_category, "day": day_range}},
+            {"$group": {
+                "_id": "$user_id",
+                "total_score": {"$sum": "$score"},
+                "total_kills": {"$sum": "$kills"},
+                "total_deaths": {"$sum": "$deaths"},
+                "wins": {"$sum": "$wins"},
+                "matches": {"$sum": "$matches"}
+            }},
+            {"$addFields": GAMING_SCORE_FIELDS},
+            {"$sort": {"score": -1}},
+            {"$limit": limit}
+        ]
+        return await db.score_buckets.aggregate(pipeline).to_list(limit)
+    
+    elif category == "hybrid_master":
+        pipeline = [
+            {"$match": {"category": {"$in": ["attendance", "music", "gaming"]}, "day": day_range}},
+            {"$group": {
+                "_id": "$user_id",
+                "sessions": {"$sum": "$sessions"},
+                "tracks": {"$sum": "$tracks"},
+                "contributions": {"$sum": "$contributions"},
+                "score": {"$sum": "$score"}
+            }}
+        ]
+        rows = await db.score_buckets.aggregate(pipeline).to_list(None)
+        return score_hybrid(
+            {r["_id"]: r["sessions"] for r in rows if r["sessions"]},
+            {r["_id"]: r["tracks"] for r in rows if r["tracks"]},
+            {r["_id"]: r["contributions"] for r in rows if r["contributions"]},
+            {r["_id"]: r["score"] for r in rows if r["score"]},
+            limit
+        )
+    
+    raise HTTPException(status_code=404, detail="Category not found")
+
+async def backfill_score_buckets() -> Dict[str, Any]:
+    """Rebuild daily score buckets from raw history with server-side $merge"""
+    def day_of(field: str) -> Dict[str, Any]:
+        return {"$dateTrunc": {"date": f"${field}", "unit": "day", "timezone": "UTC"}}
+    
+    def merge_into_buckets(category: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"$project": {"_id": 0, "user_id": "$_id.user_id", "day": "$_id.day", "category": category, **fields}},
+            {"$merge": {
+                "into": "score_buckets",
+                "on": ["user_id", "category", "day"],
+                "whenMatched": "merge",
+                "whenNotMatched": "insert"
+            }}
+        ]
+    
+    await db.attendance.aggregate([
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": day_of("check_in")},
+            "sessions": {"$sum": 1},
+            "duration": {"$sum": "$duration_minutes"}
+        }},
+        *merge_into_buckets("attendance", {"sessions": 1, "duration": 1})
+    ]).to_list(None)
+    
+    await db.tracks.aggregate([
+        {"$group": {"_id": {"user_id": "$created_by", "day": day_of("created_at")}, "tracks": {"$sum": 1}}},
+        *merge_into_buckets("music", {"tracks": 1})
+    ]).to_list(None)
+    
+    await db.track_contributions.aggregate([
+        {"$group": {"_id": {"user_id": "$user_id", "day": day_of("created_at")}, "contributions": {"$sum": 1}}},
+        *merge_into_buckets("music", {"contributions": 1})
+    ]).to_list(None)
+    
+    await db.game_scores.aggregate([
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": day_of("created_at")},
+            "score": {"$sum": "$score"},
+            "kills": {"$sum": "$kills"},
+            "deaths": {"$sum": "$deaths"},
+            "wins": {"$sum": {"$cond": [{"$eq": ["$rank_position", 1]}, 1, 0]}},
+            "matches": {"$sum": 1}
+        }},
+        *merge_into_buckets("gaming", {"score": 1, "kills": 1, "deaths": 1, "wins": 1, "matches": 1})
+    ]).to_list(None)
+    
+    await db.game_scores.aggregate([
+        {"$match": {"game_type": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": day_of("created_at"), "game_type": "$game_type"},
+            "score": {"$sum": "$score"},
+            "kills": {"$sum": "$kills"},
+            "deaths": {"$sum": "$deaths"},
+            "wins": {"$sum": {"$cond": [{"$eq": ["$rank_position", 1]}, 1, 0]}},
+            "matches": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "day": "$_id.day",
+            "category": {"$concat": ["gaming:", "$_id.game_type"]},
+            "score": 1, "kills": 1, "deaths": 1, "wins": 1, "matches": 1
+        }},
+        {"$merge": {
+            "into": "score_buckets",
+            "on": ["user_id", "category", "day"],
+            "whenMatched": "merge",
+            "whenNotMatched": "insert"
+        }}
+    ]).to_list(None)
+    
+    return {"buckets": await db.score_buckets.estimated_document_count()}
+
+async def verify_score_buckets(category: str, period: LeaderboardPeriod, limit: int) -> Dict[str, Any]:
+    """Compare rollup leaderboard results with the raw formulas for the same window"""
+    now = datetime.now(timezone.utc)
+    start_date = start_of_day(leaderboard_start_date(period, now))
+    
+    raw = await compute_leaderboard(category, start_date, now, limit)
+    rolled = await compute_leaderboard_from_buckets(category, start_date, now, limit)
+    
+    raw_scores = {r["_id"]: round(r["score"], 6) for r in raw}
+    rolled_scores = {r["_id"]: round(r["score"], 6) for r in rolled}
+    mismatches = [
+        {"user_id": user_id, "raw": raw_scores.get(user_id), "rollup": rolled_scores.get(user_id)}
+        for user_id in set(raw_scores) | set(rolled_scores)
+        if raw_scores.get(user_id) != rolled_scores.get(user_id)
+    ]
+    
+    return {
+        "category": category,
+        "period": period.value,
+        "compared": len(raw_scores),
+        "equivalent": not mismatches,
+        "mismatches": mismatches[:50]
+    }
+
+# ============== LIVE RANKING ==============
+
+class _SkipNode:
+    __slots__ = ("key", "next", "width")
+    
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+class RankedIndex:
+    """In-process order-statistic index of user scores, highest score first
+    
+    An indexable skip list: every link records how many entries it skips, so
+    inserts, removals, rank lookups and positional reads are all O(log n).
+    Entries are keyed by (-score, user_id) so ties rank deterministically.
+    """
+    MAX_LEVELS = 24
+    
+    def __init__(self):
+        self._tail = _SkipNode((float("inf"), ""), 0)
+        self._head = _SkipNode(None, self.MAX_LEVELS)
+        self._head.next = [self._tail] * self.MAX_LEVELS
+        self.scores: Dict[str, float] = {}
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+    
+    def _random_levels(self) -> int:
+        levels = 1
+        while levels < self.MAX_LEVELS and random.random() < 0.5:
+            levels += 1
+        return levels
+    
+    def _insert(self, key):
+        chain = [None] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        
+        levels = self._random_levels()
+        new_node = _SkipNode(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+    
+    def _remove(self, key):
+        chain = [None] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        
+        target = chain[0].next[0]
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+    
+    def update(self, user_id: str, score: float):
+        """Insert a user or move them to a new score"""
+        current = self.scores.get(user_id)
+        if current == score:
+            return
+        if current is not None:
+            self._remove((-current, user_id))
+        self._insert((-score, user_id))
+        self.scores[user_id] = score
+    
+    def discard(self, user_id: str):
+        """Remove a user from the index if present"""
+        current = self.scores.pop(user_id, None)
+        if current is not None:
+            self._remove((-current, user_id))
+    
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based rank of a user, or None if they are not indexed"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        key = (-score, user_id)
+        position = 0
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position + 1
+    
+    def slice(self, start: int, stop: int) -> List[tuple]:
+        """(user_id, score) pairs for 0-based positions [start, stop)"""
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        
+        # Walk down to the node at position `start`
+        remaining = start + 1
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        
+        items = []
+        for _ in range(stop - start):
+            items.append((node.key[1], -node.key[0]))
+            node = node.next[0]
+        return items
+
+def total_xp(level: int, xp: int) -> int:
+    """Lifetime XP for a user at `level` with `xp` progress into that level"""
+    return 500 * level * (level - 1) + xp
+
+# Live rankings answered from memory, keyed by leaderboard category
+xp_ranking = RankedIndex()
+RANKED_INDEXES: Dict[str, RankedIndex] = {"xp": xp_ranking}
+
+# Seconds between catch-ups on XP and scores written by other workers
+RANKING_SYNC_INTERVAL = 15
+# Re-read changes this far before the last sync to absorb clock skew between workers
+RANKING_SYNC_OVERLAP = timedelta(seconds=30)
+xp_ranking_synced_at: Optional[datetime] = None
+
+async def build_xp_ranking():
+    """Load every user's lifetime XP into the live ranking"""
+    global xp_ranking_synced_at
+    xp_ranking_synced_at = datetime.now(timezone.utc)
+    cursor = db.users.find({}, {"_id": 0, "user_id": 1, "xp": 1, "level": 1}).batch_size(5000)
+    count = 0
+    async for u in cursor:
+        xp_ranking.update(u["user_id"], total_xp(u.get("level", 1), u.get("xp", 0)))
+        count += 1
+    logger.info(f"Built live XP ranking for {count} users")
+
+async def sync_xp_ranking():
+    """Apply XP changes made by other workers since the last sync
+    
+    Every XP write stamps xp_updated_at; re-applying a score is harmless, so
+    the overlap window only costs a few repeated updates.
+    """
+    global xp_ranking_synced_at
+    started = datetime.now(timezone.utc)
+    since = (xp_ranking_synced_at or started) - RANKING_SYNC_OVERLAP
+    cursor = db.users.find(
+        {"xp_updated_at": {"$gte": since}},
+        {"_id": 0, "user_id": 1, "xp": 1, "level": 1}
+    )
+    async for u in cursor:
+        xp_ranking.update(u["user_id"], total_xp(u.get("level", 1), u.get("xp", 0)))
+    xp_ranking_synced_at = started
+
+async def ranking_sync_loop():
+    """Background job keeping this worker's XP ranking and skill cache in line with other workers"""
+    while True:
+        await asyncio.sleep(RANKING_SYNC_INTERVAL)
+        try:
+            await sync_xp_ranking()
+            await skill_cache.sync()
+        except Exception:
+            logger.exception("Ranking sync failed")
+
+async def build_ranked_entries(items: List[tuple], first_rank: int) -> List[Dict[str, Any]]:
+    """Enrich (user_id, score) pairs from a ranked index with user details"""
+    user_docs = await db.users.find(
+        {"user_id": {"$in": [user_id for user_id, _ in items]}},
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "picture_image_id": 1, "level": 1}
+    ).to_list(None)
+    users_by_id = {u["user_id"]: u for u in user_docs}
+    
+    entries = []
+    for i, (user_id, score) in enumerate(items):
+        user_doc = users_by_id.get(user_id, {})
+        entries.append({
+            "rank": first_rank + i,
+            "user_id": user_id,
+            "name": user_doc.get("name", "Unknown"),
+            "picture": user_doc.get("picture"),
+            "picture_variants": image_variants(user_doc.get("picture_image_id")),
+            "level": user_doc.get("level", 1),
+            "score": score
+        })
+    
+    return entries
+
+@api_router.get("/leaderboards/{category}/me")
+async def get_my_rank(
+    category: str,
+    around: int = 5,
+    user: User = Depends(get_current_user)
+):
+    """Get the current user's live rank and their neighbors"""
+    index = RANKED_INDEXES.get(category)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Live ranking not available for this category")
+    
+    if category == "xp":
+        # The authenticated user document is fresh, so keep our own entry in sync
+        index.update(user.user_id, total_xp(user.level, user.xp))
+    
+    rank = index.rank(user.user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not ranked")
+    
+    around = max(0, min(around, 50))
+    start = max(rank - 1 - around, 0)
+    items = index.slice(start, rank + around)
+    
+    return {
+        "category": category,
+        "rank": rank,
+        "score": index.scores[user.user_id],
+        "total": len(index),
+        "entries": await build_ranked_entries(items, start + 1),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+# ============== RATINGS ==============
+
+# Starting MMR for unrated players and the Elo K-factor per match
+DEFAULT_RATING = 1500.0
+RATING_K_FACTOR = 32.0
+# Rating pool spanning every GameType
+OVERALL_RATING = "all"
+# A ratings rebuild holds this lease so live completions queue their ratings
+# instead of writing to the pool about to be replaced. Before reading history
+# it waits RATINGS_REBUILD_GRACE seconds for rating writes already under way.
+RATINGS_REBUILD_JOB = "ratings_rebuild"
+RATINGS_REBUILD_LEASE = timedelta(minutes=30)
+RATINGS_REBUILD_GRACE = 5
+# Seconds between sweeps for matches whose rating was deferred or failed
+RATINGS_SWEEP_INTERVAL = 60
+
+def elo_deltas_batch(
+    ratings: np.ndarray,
+    places: np.ndarray,
+    mask: np.ndarray,
+    k: float = RATING_K_FACTOR
+) -> np.ndarray:
+    """Multiplayer Elo rating changes for a batch of matches
+    
+    Arrays are (matches, players) with `mask` marking real players in padded
+    rows. Every pair of players in a match is scored as a head-to-head game
+    decided by their places (lower is better, equal places draw), and each
+    player's change is the average over their opponents, scaled by k.
+    """
+    expected = 1.0 / (1.0 + 10.0 ** ((ratings[:, None, :] - ratings[:, :, None]) / 400.0))
+    actual = (places[:, :, None] < places[:, None, :]) + 0.5 * (places[:, :, None] == places[:, None, :])
+    pairs = mask[:, :, None] & mask[:, None, :]
+    pairs &= ~np.eye(ratings.shape[1], dtype=bool)[None, :, :]
+    opponents = np.maximum(mask.sum(axis=1, keepdims=True) - 1, 1)
+    return k * np.where(pairs, actual - expected, 0.0).sum(axis=2) / opponents
+
+def elo_deltas(ratings: np.ndarray, places: np.ndarray, k: float = RATING_K_FACTOR) -> np.ndarray:
+    """Multiplayer Elo rating changes for one match"""
+    mask = np.ones((1, len(ratings)), dtype=bool)
+    return elo_deltas_batch(ratings[None, :], places[None, :], mask, k)[0]
+
+def match_places(rank_positions: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """Finishing places from reported rank positions
+    
+    Players with a rank_position keep it; unranked players (rank 0) finish
+    behind them, ordered by their total score.
+    """
+    places = rank_positions.astype(float)
+    unranked = places <= 0
+    if unranked.any():
+        offset = places[~unranked].max() if (~unranked).any() else 0
+        # Dense rank of descending totals among the unranked players
+        _, dense = np.unique(-totals[unranked], return_inverse=True)
+        places[unranked] = offset + 1 + dense
+    return places
+
+def player_standings(scores: List[Dict[str, Any]]) -> tuple:
+    """Collapse a match's score submissions to (user_ids, places)"""
+    best_rank: Dict[str, int] = {}
+    totals: Dict[str, int] = {}
+    for s in scores:
+        user_id = s["user_id"]
+        rank = s.get("rank_position", 0) or 0
+        if rank > 0 and (best_rank.get(user_id, 0) == 0 or rank < best_rank[user_id]):
+            best_rank[user_id] = rank
+        else:
+            best_rank.setdefault(user_id, 0)
+        totals[user_id] = totals.get(user_id, 0) + s.get("score", 0)
+    
+    user_ids = list(totals)
+    places = match_places(
+        np.array([best_rank[u] for u in user_ids]),
+        np.array([totals[u] for u in user_ids])
+    )
+    return user_ids, places
+
+async def write_match_ratings(match: Dict[str, Any]):
+    """Add a completed match's Elo changes to everyone who scored in it
+    
+    Changes are written as increments, so matches sharing a player that
+    complete at the same time both count.
+    """
+    scores = await db.game_scores.find(
+        {"match_id": match["match_id"]},
+        {"_id": 0, "user_id": 1, "rank_position": 1, "score": 1}
+    ).to_list(None)
+    user_ids, places = player_standings(scores)
+    if len(user_ids) < 2:
+        return
+    
+    now = datetime.now(timezone.utc)
+    for game_type in (match["game_type"], OVERALL_RATING):
+        # Seed unrated players first; a concurrent seed of the same player is harmless
+        try:
+            await db.player_ratings.bulk_write([
+                UpdateOne(
+                    {"user_id": user_id, "game_type": game_type},
+                    {"$setOnInsert": {"rating": DEFAULT_RATING, "matches": 0}},
+                    upsert=True
+                )
+                for user_id in user_ids
+            ], ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        
+        docs = await db.player_ratings.find(
+            {"game_type": game_type, "user_id": {"$in": user_ids}},
+            {"_id": 0, "user_id": 1, "rating": 1}
+        ).to_list(None)
+        current = {d["user_id"]: d["rating"] for d in docs}
+        ratings = np.array([current.get(u, DEFAULT_RATING) for u in user_ids])
+        deltas = elo_deltas(ratings, places)
+        
+        await db.player_ratings.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "game_type": game_type},
+                {"$inc": {"rating": float(delta), "matches": 1}, "$set": {"updated_at": now}}
+            )
+            for user_id, delta in zip(user_ids, deltas)
+        ], ordered=False)
+
+async def ratings_rebuild_running() -> bool:
+    return bool(await db.job_leases.count_documents(
+        {"name": RATINGS_REBUILD_JOB, "expires_at": {"$gt": datetime.now(timezone.utc)}}, limit=1
+    ))
+
+async def apply_match_ratings(match_id: str, during_rebuild: bool = False) -> bool:
+    """Rate a completed match still marked ratings_pending
+    
+    Returns False without rating while a rebuild holds the ratings lease; the
+    match stays pending and the rebuild rates it after swapping pools in.
+    """
+    if not during_rebuild and await ratings_rebuild_running():
+        return False
+    match = await db.game_matches.find_one_and_update(
+        {"match_id": match_id, "ratings_pending": True},
+        {"$unset": {"ratings_pending": ""}},
+        projection={"_id": 0, "match_id": 1, "game_type": 1}
+    )
+    if not match:
+        return False
+    await write_match_ratings(match)
+    return True
+
+async def apply_pending_ratings(during_rebuild: bool = False) -> int:
+    """Rate every match left pending, in completion order"""
+    pending = await db.game_matches.find(
+        {"ratings_pending": True}, {"_id": 0, "match_id": 1}
+    ).sort("ended_at", 1).to_list(None)
+    applied = 0
+    for m in pending:
+        applied += await apply_match_ratings(m["match_id"], during_rebuild)
+    return applied
+
+def replay_rating_pool(matches: List[tuple], user_count: int) -> tuple:
+    """Replay one rating pool's matches in completion order
+    
+    Consecutive matches with no players in common cannot affect each other,
+    so they are grouped into waves and each wave is rated as one vectorized
+    batch. Returns (ratings, match_counts) indexed by user; users who never
+    played in the pool keep a NaN rating.
+    """
+    ratings = np.full(user_count, np.nan)
+    counts = np.zeros(user_count, dtype=np.int64)
+    
+    def rate_wave(wave: List[tuple]):
+        width = max(len(users) for users, _ in wave)
+        users = np.zeros((len(wave), width), dtype=np.int64)
+        places = np.zeros((len(wave), width))
+        mask = np.zeros((len(wave), width), dtype=bool)
+        for row, (match_users, match_places_) in enumerate(wave):
+            users[row, :len(match_users)] = match_users
+            places[row, :len(match_users)] = match_places_
+            mask[row, :len(match_users)] = True
+        
+        current = np.where(np.isnan(ratings[users]), DEFAULT_RATING, ratings[users])
+        updated = current + elo_deltas_batch(current, places, mask)
+        ratings[users[mask]] = updated[mask]
+        counts[users[mask]] += 1
+    
+    wave: List[tuple] = []
+    seen: set = set()
+    for users, places in matches:
+        if len(users) < 2:
+            continue
+        players = users.tolist()
+        if seen.intersection(players):
+            rate_wave(wave)
+            wave, seen = [], set()
+        wave.append((users, places))
+        seen.update(players)
+    if wave:
+        rate_wave(wave)
+    
+    return ratings, counts
+
+def replay_ratings(matches: List[tuple], user_count: int) -> Dict[str, tuple]:
+    """Replay completed matches and return final ratings for every pool
+    
+    `matches` holds (game_type, user_index_array, places_array) tuples in
+    completion order. Returns {game_type: (ratings, match_counts)}, including
+    the overall pool.
+    """
+    by_pool: Dict[str, List[tuple]] = {OVERALL_RATING: []}
+    for game_type, users, places in matches:
+        by_pool.setdefault(game_type, []).append((users, places))
+        by_pool[OVERALL_RATING].append((users, places))
+    
+    return {
+        game_type: replay_rating_pool(pool_matches, user_count)
+        for game_type, pool_matches in by_pool.items()
+    }
+
+async def rebuild_ratings() -> Dict[str, Any]:
+    """Recompute every player rating from match history
+    
+    Matches completed while the rebuild runs stay ratings_pending and are
+    rated on top of the rebuilt pools once they are swapped in.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.update_one(
+            {"name": RATINGS_REBUILD_JOB, "expires_at": {"$lte": now}},
+            {"$set": {"expires_at": now + RATINGS_REBUILD_LEASE}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A ratings rebuild is already running")
+    
+    try:
+        await asyncio.sleep(RATINGS_REBUILD_GRACE)
+        result = await replace_ratings()
+        result["pending_applied"] = await apply_pending_ratings(during_rebuild=True)
+    finally:
+        await db.job_leases.delete_one({"name": RATINGS_REBUILD_JOB})
+    # Completions that saw the lease just before it was released
+    result["pending_applied"] += await apply_pending_ratings()
+    return result
+
+async def ratings_sweep_loop():
+    """Background job rating matches left pending"""
+    while True:
+        await asyncio.sleep(RATINGS_SWEEP_INTERVAL)
+        try:
+            await apply_pending_ratings()
+        except Exception:
+            logger.exception("Pending ratings sweep failed")
+
+async def replace_ratings() -> Dict[str, Any]:
+    """Replay rated match history into fresh pools and swap them in"""
+    matches = await db.game_matches.find(
+        {"status": "completed", "ratings_pending": {"$ne": True}},
+        {"_id": 0, "match_id": 1, "game_type": 1, "ended_at": 1}
+    ).sort("ended_at", 1).to_list(None)
+    order = {m["match_id"]: i for i, m in enumerate(matches)}
+    
+    # Stream only the columns the replay needs
+    scores_by_match: Dict[str, List[Dict[str, Any]]] = {}
+    cursor = db.game_scores.find(
+        {"match_id": {"$in": list(order)}},
+        {"_id": 0, "match_id": 1, "user_id": 1, "rank_position": 1, "score": 1}
+    ).batch_size(10000)
+    async for s in cursor:
+        scores_by_match.setdefault(s["match_id"], []).append(s)
+    
+    user_index: Dict[str, int] = {}
+    replay = []
+    for m in matches:
+        scores = scores_by_match.get(m["match_id"])
+        if not scores:
+            continue
+        user_ids, places = player_standings(scores)
+        users = np.array([user_index.setdefault(u, len(user_index)) for u in user_ids])
+        replay.append((m["game_type"], users, places))
+    
+    pools = await asyncio.to_thread(replay_ratings, replay, len(user_index))
+    
+    now = datetime.now(timezone.utc)
+    user_ids = list(user_index)
+    docs = [
+        {
+            "user_id": user_ids[i],
+            "game_type": game_type,
+            "rating": float(ratings[i]),
+            "matches": int(counts[i]),
+            "updated_at": now
+        }
+        for game_type, (ratings, counts) in pools.items()
+        for i in np.flatnonzero(~np.isnan(ratings))
+    ]
+    
+    # Build the new ratings aside and swap them in, so readers never see a partial pool
+    staging = db[f"player_ratings_rebuild_{uuid.uuid4().hex[:8]}"]
+    try:
+        await staging.create_index([("user_id", ASCENDING), ("game_type", ASCENDING)], unique=True)
+        await staging.create_index([("game_type", ASCENDING), ("rating", DESCENDING)])
+        for start in range(0, len(docs), 10000):
+            await staging.insert_many(docs[start:start + 10000], ordered=False)
+        await staging.rename("player_ratings", dropTarget=True)
+    except Exception:
+        await staging.drop()
+        raise
+    
+    return {"matches": len(replay), "ratings": len(docs)}
+
+async def get_rated_leaderboard(game_type: str, limit: int) -> Dict[str, Any]:
+    """Top players by MMR for a rating pool, read in index order"""
+    docs = await db.player_ratings.find(
+        {"game_type": game_type},
+        {"_id": 0, "user_id": 1, "rating": 1}
+    ).sort("rating", -1).limit(limit).to_list(limit)
+    items = [(d["user_id"], round(d["rating"], 1)) for d in docs]
+    
+    return {
+        "category": "gaming_rating",
+        "period": LeaderboardPeriod.ALL_TIME.value,
+        "game_type": game_type,
+        "entries": await build_ranked_entries(items, 1),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+# ============== SEASONS ==============
+
+# How long live seasonal standings are served before being recomputed
+SEASON_STANDINGS_TTL = timedelta(minutes=5)
+# Number of entries kept in seasonal standings snapshots
+SEASON_STANDINGS_SIZE = 100
+# Seconds between checks for seasons that reached their end_date
+SEASON_ROLLOVER_INTERVAL = 600
+# A finalization that hasn't finished in this long is assumed dead and can be retried
+SEASON_FINALIZE_LEASE = timedelta(minutes=10)
+
+def as_utc(value) -> datetime:
+    """Normalize a stored datetime (or ISO string) to an aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def parse_season_rewards(rewards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn season reward definitions into rank brackets with XP amounts
+    
+    A reward with rank N covers every position after the previous reward's rank
+    up to N, so {"rank": 10} after {"rank": 3} covers ranks 4-10.
+    """
+    brackets = []
+    for reward in sorted(rewards, key=lambda r: r.get("rank", 0)):
+        xp = reward.get("xp")
+        if xp is None:
+            match = re.search(r"(\d+)\s*XP", str(reward.get("reward", "")))
+            xp = int(match.group(1)) if match else 0
+        brackets.append({"rank": reward.get("rank", 0), "title": reward.get("title"), "xp": int(xp)})
+    return brackets
+
+def reward_for_rank(brackets: List[Dict[str, Any]], rank: int) -> Optional[Dict[str, Any]]:
+    """Find the reward bracket that covers a final standing position"""
+    for bracket in brackets:
+        if rank <= bracket["rank"]:
+            return bracket
+    return None
+
+async def get_active_season(now: Optional[datetime] = None) -> Optional[dict]:
+    """Resolve the season whose date range contains now"""
+    now = now or datetime.now(timezone.utc)
+    return await db.seasons.find_one(
+        {
+            "is_active": True,
+            "start_date": {"$lte": now},
+            "end_date": {"$gt": now}
+        },
+        {"_id": 0},
+        sort=[("start_date", -1)]
+    )
+
+async def get_season_standings(season: dict, category: str, limit: int) -> dict:
+    """Get standings for a season, served from a snapshot instead of raw history"""
+    final = await db.leaderboard_snapshots.find_one(
+        {"season_id": season["season_id"], "category": category, "is_final": True},
+        {"_id": 0}
+    )
+    if final:
+        return final
+    
+    now = datetime.now(timezone.utc)
+    size = max(limit, SEASON_STANDINGS_SIZE)
+    cached = await db.leaderboard_snapshots.find_one(
+        {"season_id": season["season_id"], "category": category, "is_final": False},
+        {"_id": 0}
+    )
+    if (
+        cached
+        and cached.get("size", 0) >= size
+        and as_utc(cached["calculated_at"]) > now - SEASON_STANDINGS_TTL
+    ):
+        return cached
+    
+    end_date = min(as_utc(season["end_date"]), now)
+    results = await compute_leaderboard(category, as_utc(season["start_date"]), end_date, size)
+    snapshot = LeaderboardSnapshot(
+        category=category,
+        period=LeaderboardPeriod.SEASONAL,
+        season_id=season["season_id"],
+        entries=await build_leaderboard_entries(results),
+        size=size,
+        calculated_at=now
+    ).dict()
+    snapshot["category"] = category
+    snapshot["period"] = LeaderboardPeriod.SEASONAL.value
+    
+    await db.leaderboard_snapshots.update_one(
+        {"season_id": season["season_id"], "category": category, "is_final": False},
+        {"$set": snapshot},
+        upsert=True
+    )
+    return snapshot
+
+async def distribute_season_rewards(season: dict, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Grant season reward XP to the final standings in one batched write"""
+    brackets = parse_season_rewards(season.get("rewards", []))
+    grants = []
+    for entry in entries:
+        bracket = reward_for_rank(brackets, entry["rank"])
+        if bracket and bracket["xp"] > 0:
+            grants.append({"user_id": entry["user_id"], "rank": entry["rank"], **bracket})
+    
+    if not grants:
+        return []
+    
+    season_id = season["season_id"]
+    # The season is recorded on the user in the same write as the XP, so a
+    # retried finalization skips everyone who was already paid
+    mark_rewarded = {"$set": {"season_rewards": {"$concatArrays": [
+        {"$ifNull": ["$season_rewards", []]}, [{"$literal": season_id}]
+    ]}}}
+    await db.users.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": g["user_id"], "season_rewards": {"$ne": season_id}},
+                xp_update_pipeline(g["xp"]) + [mark_rewarded]
+            )
+            for g in grants
+        ],
+        ordered=False
+    )
+    
+    await db.gamification_events.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": g["user_id"], "event_type": "season_reward", "metadata.season_id": season_id},
+                {"$setOnInsert": GamificationEvent(
+                    user_id=g["user_id"],
+                    event_type="season_reward",
+                    xp_amount=g["xp"],
+                    description=f"{season['name']} reward: {g['title']} (rank #{g['rank']})",
+                    metadata={"season_id": season_id, "rank": g["rank"]}
+                ).dict()},
+                upsert=True
+            )
+            for g in grants
+        ],
+        ordered=False
+    )
+    
+    # Level badges for everyone rewarded; award_badge skips badges already
+    # held, and a retry can't tell who the first attempt levelled up
+    after = await db.users.find(
+        {"user_id": {"$in": [g["user_id"] for g in grants]}},
+        {"_id": 0, "user_id": 1, "level": 1, "xp": 1}
+    ).to_list(None)
+    for u in after:
+        xp_ranking.update(u["user_id"], total_xp(u.get("level", 1), u.get("xp", 0)))
+        await check_level_badges(u["user_id"], u.get("level", 1))
+    
+    return grants
+
+async def finalize_season(season_id: str, force: bool = False) -> Optional[dict]:
+    """Freeze final standings for a season and distribute its rewards
+    
+    Returns None if the season is unknown, not yet over (unless forced), or
+    already finalized by another worker.
+    """
+    now = datetime.now(timezone.utc)
+    query = {
+        "season_id": season_id,
+        "finalized": {"$ne": True},
+        "$or": [
+            {"finalizing_at": None},
+            {"finalizing_at": {"$lt": now - SEASON_FINALIZE_LEASE}}
+        ]
+    }
+    if not force:
+        query["end_date"] = {"$lte": now}
+    
+    # Lease the season so concurrent workers don't finalize it at the same time;
+    # a crashed worker's lease expires and the next attempt picks it up
+    season = await db.seasons.find_one_and_update(
+        query,
+        {"$set": {"finalizing_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not season:
+        return None
+    
+    try:
+        return await freeze_season(season, now)
+    except Exception:
+        await db.seasons.update_one(
+            {"season_id": season_id, "finalizing_at": now},
+            {"$unset": {"finalizing_at": ""}}
+        )
+        raise
+
+async def freeze_season(season: dict, now: datetime) -> dict:
+    """Snapshot final standings and pay rewards for a leased season"""
+    season_id = season["season_id"]
+    start_date = as_utc(season["start_date"])
+    end_date = min(as_utc(season["end_date"]), now)
+    standings = {}
+    
+    for category in LeaderboardCategory:
+        results = await compute_leaderboard(category.value, start_date, end_date, SEASON_STANDINGS_SIZE)
+        snapshot = LeaderboardSnapshot(
+            category=category,
+            period=LeaderboardPeriod.SEASONAL,
+            season_id=season_id,
+            entries=await build_leaderboard_entries(results),
+            size=SEASON_STANDINGS_SIZE,
+            is_final=True,
+            calculated_at=now
+        ).dict()
+        snapshot["category"] = category.value
+        snapshot["period"] = LeaderboardPeriod.SEASONAL.value
+        try:
+            await db.leaderboard_snapshots.insert_one(snapshot)
+        except DuplicateKeyError:
+            # Already frozen; final snapshots are never overwritten
+            snapshot = await db.leaderboard_snapshots.find_one(
+                {"season_id": season_id, "category": category.value, "is_final": True},
+                {"_id": 0}
+            )
+        standings[category.value] = snapshot
+    
+    reward_category = season.get("category", LeaderboardCategory.HYBRID_MASTER.value)
+    grants = await distribute_season_rewards(season, standings[reward_category]["entries"])
+    
+    await db.leaderboard_snapshots.delete_many({"season_id": season_id, "is_final": False})
+    await db.seasons.update_one(
+        {"season_id": season_id},
+        {
+            "$set": {"is_active": False, "finalized": True, "finalized_at": now},
+            "$unset": {"finalizing_at": "", "finalizing": ""}
+        }
+    )
+    
+    logger.info(f"Finalized season {season_id}: {len(grants)} rewards granted")
+    return {"season_id": season_id, "rewards": grants}
+
+async def finalize_due_seasons():
+    """Finalize every season whose end_date has passed"""
+    now = datetime.now(timezone.utc)
+    due = await db.seasons.find(
+        {"end_date": {"$lte": now}, "finalized": {"$ne": True}},
+        {"_id": 0, "season_id": 1}
+    ).to_list(None)
+    
+    for season in due:
+        await finalize_season(season["season_id"])
+
+async def season_rollover_loop():
+    """Background job that rolls seasons over once they end"""
+    while True:
+        try:
+            await finalize_due_seasons()
+        except Exception:
+            logger.exception("Season rollover failed")
+        await asyncio.sleep(SEASON_ROLLOVER_INTERVAL)
+
+@api_router.get("/seasons/current")
+async def get_current_season(user: User = Depends(get_current_user)):
+    """Get the active season"""
+    season = await get_active_season()
+    if not season:
+        raise HTTPException(status_code=404, detail="No active season")
+    
+    return season
+
+@api_router.get("/seasons/{season_id}/standings")
+async def get_season_standings_endpoint(
+    season_id: str,
+    category: LeaderboardCategory = LeaderboardCategory.HYBRID_MASTER,
+    limit: int = 50,
+    user: User = Depends(get_current_user)
+):
+    """Get standings for a season (final snapshot once the season has ended)"""
+    season = await db.seasons.find_one({"season_id": season_id}, {"_id": 0})
+    if not season:
+        raise HTTPException(status_code=404, detail="Season not found")
+    
+    snapshot = await get_season_standings(season, category.value, limit)
     
     return {
-        "category": category,
-        "period": period.value,
-        "entries": entries,
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "season_id": season_id,
+        "category": category.value,
+        "is_final": snapshot.get("is_final", False),
+        "entries": snapshot["entries"][:limit],
+        "updated_at": as_utc(snapshot["calculated_at"]).isoformat()
     }
 
 # ============== GAMIFICATION ==============
@@ -1177,10 +4405,17 @@ async def get_gamification_stats(user: User = Depends(get_current_user)):
         "recent_events": events
     }
 
+badge_catalog_flight = SingleFlight("badges", ttl=30)
+
 @api_router.get("/badges")
 async def get_all_badges(user: User = Depends(get_current_user)):
     """Get all available badges"""
-    badges = await db.badges.find({}, {"_id": 0}).to_list(100)
+    catalog = await badge_catalog_flight.do(
+        "all",
+        lambda: db.badges.find({}, {"_id": 0}).to_list(100)
+    )
+    # The catalog is shared between callers, so annotate copies
+    badges = [dict(badge) for badge in catalog]
     
     # Get user's earned badges
     user_badges = await db.user_badges.find(
@@ -1217,42 +4452,223 @@ async def get_user_badges(user: User = Depends(get_current_user)):
 
 # ============== ACTIVITY FEED ==============
 
+activity_feed_flight = SingleFlight("activity_feed", ttl=2)
+
 @api_router.get("/activity/feed")
 async def get_activity_feed(limit: int = 30, user: User = Depends(get_current_user)):
     """Get community activity feed"""
-    activities = await db.activity_feed.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+    activities = await activity_feed_flight.do(
+        limit,
+        lambda: db.activity_feed.find(
+            {},
+            {"_id": 0}
+        ).sort("created_at", -1).limit(limit).to_list(limit)
+    )
     
     return activities
 
+# log_activity publishes here; streamed to clients instead of polling the feed
+activity_channel = EventChannel(buffer_size=500)
+
+@api_router.get("/activity/stream")
+async def stream_activity(request: Request, user: User = Depends(get_current_user)):
+    """Stream new community activity as Server-Sent Events"""
+    queue = activity_channel.subscribe(parse_last_event_id(request))
+    return sse_response(request, activity_channel, queue)
+
 # ============== ADMIN ENDPOINTS ==============
 
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque keyset cursor for the last row of a page"""
+    encoded = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode()).decode()
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [as_utc(v["dt"]) if isinstance(v, dict) else v for v in values]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(field: str, value: Any, tie_field: str, tie_value: Any, descending: bool) -> Dict[str, Any]:
+    """Rows strictly after (value, tie_value) in (field, tie_field) order
+    
+    MongoDB sorts null/missing below every other value, so they come last
+    when descending and first when ascending.
+    """
+    after = "$lt" if descending else "$gt"
+    same = {field: value, tie_field: {after: tie_value}}
+    if value is None:
+        return {"$or": [same]} if descending else {"$or": [same, {field: {"$ne": None}}]}
+    beyond = [{field: {after: value}}]
+    if descending:
+        beyond.append({field: None})
+    return {"$or": [same, *beyond]}
+
+ADMIN_USER_SORTS = {"xp", "level", "last_active", "created_at"}
+ADMIN_USER_FIELDS = [
+    "user_id", "name", "email", "picture", "roles", "level", "xp", "streak_days",
+    "last_active", "onboarding_completed", "is_admin", "created_at"
+]
+
+def user_search_fields(name: Optional[str] = None, email: Optional[str] = None) -> Dict[str, str]:
+    """Lowercased copies of name/email that back the admin prefix search"""
+    fields = {}
+    if name is not None:
+        fields["name_lower"] = name.lower()
+    if email is not None:
+        fields["email_lower"] = email.lower()
+    return fields
+
+@api_router.get("/admin/users")
+async def get_all_users(
+    q: Optional[str] = None,
+    role: Optional[UserRole] = None,
+    onboarding_completed: Optional[bool] = None,
+    is_admin: Optional[bool] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    full: bool = False,
+    user: User = Depends(get_current_user)
+):
+    """Page through users with filters and name/email prefix search (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if sort not in ADMIN_USER_SORTS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {', '.join(sorted(ADMIN_USER_SORTS))}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Order must be asc or desc")
+    descending = order == "desc"
+    limit = max(1, min(limit, 200))
+    
+    conditions: List[Dict[str, Any]] = []
+    if q and q.strip():
+        prefix = {"$regex": f"^{re.escape(q.strip().lower())}"}
+        conditions.append({"$or": [{"name_lower": prefix}, {"email_lower": prefix}]})
+    if role:
+        conditions.append({"roles": role.value})
+    if onboarding_completed is not None:
+        conditions.append({"onboarding_completed": onboarding_completed})
+    if is_admin is not None:
+        conditions.append({"is_admin": is_admin})
+    if cursor:
+        value, last_user_id = decode_cursor(cursor)
+        conditions.append(keyset_filter(sort, value, "user_id", last_user_id, descending))
+    
+    direction = -1 if descending else 1
+    projection = {"_id": 0, "name_lower": 0, "email_lower": 0} if full else {"_id": 0, **{f: 1 for f in ADMIN_USER_FIELDS}}
+    users = await db.users.find(
+        {"$and": conditions} if conditions else {},
+        projection
+    ).sort([(sort, direction), ("user_id", direction)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor([users[-1].get(sort), users[-1]["user_id"]])
+    
+    return {"users": users, "next_cursor": next_cursor}
+
+# Counts above this are reported as a lower bound instead of scanned exactly
+COUNT_ESTIMATE_CAP = 10000
+
+async def estimate_count(collection, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Matching document count without scanning past COUNT_ESTIMATE_CAP"""
+    if not query:
+        return {"count": await collection.estimated_document_count(), "exact": False}
+    count = await collection.count_documents(query, limit=COUNT_ESTIMATE_CAP + 1)
+    return {"count": min(count, COUNT_ESTIMATE_CAP), "exact": count <= COUNT_ESTIMATE_CAP}
+
+async def query_log_page(
+    collection,
+    query: Dict[str, Any],
+    id_field: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: int,
+    cursor: Optional[str]
+) -> Dict[str, Any]:
+    """Newest-first page of a log collection with a keyset cursor and count estimate"""
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = as_utc(start)
+        if end:
+            query["created_at"]["$lt"] = as_utc(end)
+    
+    count = await estimate_count(collection, dict(query))
+    
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = {"$and": [query, keyset_filter("created_at", created_at, id_field, last_id, True)]}
+    
+    limit = max(1, min(limit, 500))
+    items = await collection.find(
+        query,
+        {"_id": 0}
+    ).sort([("created_at", -1), (id_field, -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1]["created_at"], items[-1][id_field]])
+    
+    return {"items": items, "next_cursor": next_cursor, "total": count}
+
 @api_router.get("/admin/audit-logs")
 async def get_audit_logs(
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     user: User = Depends(get_current_user)
 ):
-    """Get audit logs (admin only)"""
+    """Query audit logs, newest first (admin only)"""
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    logs = await db.audit_logs.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+    query: Dict[str, Any] = {}
+    if user_id:
+        query["user_id"] = user_id
+    if action:
+        query["action"] = action
+    if resource_type:
+        query["resource_type"] = resource_type
+    if resource_id:
+        query["resource_id"] = resource_id
     
-    return logs
+    return await query_log_page(db.audit_logs, query, "log_id", start, end, limit, cursor)
 
-@api_router.get("/admin/users")
-async def get_all_users(user: User = Depends(get_current_user)):
-    """Get all users (admin only)"""
+@api_router.get("/admin/gamification-events")
+async def get_gamification_events(
+    user_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    flagged: Optional[bool] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Query gamification events, e.g. everything flagged for review (admin only)"""
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
-    return users
+    query: Dict[str, Any] = {}
+    if user_id:
+        query["user_id"] = user_id
+    if event_type:
+        query["event_type"] = event_type
+    if flagged is not None:
+        query["flagged"] = flagged
+    
+    return await query_log_page(db.gamification_events, query, "event_id", start, end, limit, cursor)
 
 @api_router.post("/admin/flag-event")
 async def flag_event(
@@ -1274,8 +4690,555 @@ async def flag_event(
     
     return {"success": True}
 
+@api_router.post("/admin/seasons/{season_id}/finalize")
+async def force_finalize_season(season_id: str, user: User = Depends(get_current_user)):
+    """Freeze a season's standings and distribute rewards now (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    result = await finalize_season(season_id, force=True)
+    if not result:
+        raise HTTPException(status_code=400, detail="Season not found or already finalized")
+    
+    # Log audit
+    await log_audit(user.user_id, "finalize_season", "season", season_id, {"rewards": len(result["rewards"])})
+    
+    return result
+
+@api_router.get("/admin/metrics")
+async def get_metrics(user: User = Depends(get_current_user)):
+    """Get in-process performance counters (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "single_flight": {name: flight.stats() for name, flight in SINGLE_FLIGHTS.items()},
+        "streams": {"activity": activity_channel.stats(), "live_matches": len(live_matches)},
+        "image_cache": image_cache.stats(),
+        "rate_limits": rate_limiter.stats()
+    }
+
+# Datasets admins can export: collection, time field for date filters, columns
+EXPORTS = {
+    "users": ("users", "created_at", [
+        "user_id", "email", "name", "roles", "level", "xp", "streak_days",
+        "last_active", "onboarding_completed", "is_admin", "created_at"
+    ]),
+    "attendance": ("attendance", "check_in", [
+        "attendance_id", "user_id", "session_id", "check_in", "check_out", "duration_minutes", "xp_earned"
+    ]),
+    "game_scores": ("game_scores", "created_at", [
+        "score_id", "match_id", "user_id", "game_type", "game_name", "score",
+        "kills", "deaths", "assists", "rank_position", "xp_earned", "created_at"
+    ]),
+    "gamification_events": ("gamification_events", "created_at", [
+        "event_id", "user_id", "event_type", "xp_amount", "description", "metadata",
+        "flagged", "flag_reason", "created_at"
+    ]),
+    "audit_logs": ("audit_logs", "created_at", [
+        "log_id", "user_id", "action", "resource_type", "resource_id", "details", "created_at"
+    ])
+}
+# Documents fetched per cursor batch and written per response chunk
+EXPORT_BATCH_SIZE = 1000
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return as_utc(value).isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+def csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return as_utc(value).isoformat()
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=export_value)
+    return value
+
+async def export_rows(cursor, fields: List[str], fmt: str):
+    """Encode cursor documents as NDJSON or CSV, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+    
+    rows = 0
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([csv_cell(doc.get(f)) for f in fields])
+        else:
+            buffer.write(json.dumps(doc, default=export_value))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+@api_router.get("/admin/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Stream a dataset as NDJSON or CSV, oldest first (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    export = EXPORTS.get(dataset)
+    if not export:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+    collection, time_field, columns = export
+    
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(requested) - set(columns)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        columns = requested
+    
+    query: Dict[str, Any] = {}
+    if start or end:
+        query[time_field] = {}
+        if start:
+            query[time_field]["$gte"] = as_utc(start)
+        if end:
+            query[time_field]["$lt"] = as_utc(end)
+    if user_id:
+        query["user_id"] = user_id
+    
+    await log_audit(user.user_id, "export", dataset, format, {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "user_id": user_id
+    })
+    
+    cursor = db[collection].find(
+        query,
+        {"_id": 0, **{f: 1 for f in columns}}
+    ).sort(time_field, 1).batch_size(EXPORT_BATCH_SIZE)
+    
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        export_rows(cursor, columns, format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{dataset}-{stamp}.{format}"'}
+    )
+
+# Data backfills that can be re-run from the admin API
+async def backfill_user_search_fields() -> Dict[str, Any]:
+    """Fill the lowercased name/email fields used by the admin user search"""
+    result = await db.users.update_many(
+        {},
+        [{"$set": {"name_lower": {"$toLower": "$name"}, "email_lower": {"$toLower": "$email"}}}]
+    )
+    return {"updated": result.modified_count}
+
+async def backfill_track_contribution_types() -> Dict[str, Any]:
+    """Copy the contribution types of each track onto the track for search facets"""
+    await db.tracks.aggregate([
+        {"$lookup": {
+            "from": "track_contributions",
+            "localField": "track_id",
+            "foreignField": "track_id",
+            "as": "contributions"
+        }},
+        {"$project": {"_id": 1, "contribution_types": {"$setUnion": ["$contributions.contribution_type", []]}}},
+        {"$merge": {"into": "tracks", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]).to_list(None)
+    
+    return {"tracks": await db.tracks.count_documents({})}
+
+async def backfill_event_flags() -> Dict[str, Any]:
+    """Mark events logged before flagged was stored as not flagged"""
+    result = await db.gamification_events.update_many(
+        {"flagged": {"$exists": False}},
+        {"$set": {"flagged": False}}
+    )
+    return {"updated": result.modified_count}
+
+BACKFILLS = {
+    "score_buckets": backfill_score_buckets,
+    "match_summaries": backfill_match_summaries,
+    "score_game_types": backfill_score_game_types,
+    "ratings": rebuild_ratings,
+    "track_contribution_types": backfill_track_contribution_types,
+    "image_variants": backfill_image_variants,
+    "user_search_fields": backfill_user_search_fields,
+    "event_flags": backfill_event_flags
+}
+
+@api_router.post("/admin/backfill/{name}")
+async def run_backfill(name: str, user: User = Depends(get_current_user)):
+    """Run a data backfill job (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = BACKFILLS.get(name)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill not found")
+    
+    result = await job()
+    
+    # Log audit
+    await log_audit(user.user_id, "run_backfill", "backfill", name, result)
+    
+    return {"backfill": name, **result}
+
+@api_router.get("/admin/rollups/verify")
+async def verify_rollups(
+    category: LeaderboardCategory,
+    period: LeaderboardPeriod = LeaderboardPeriod.MONTHLY,
+    limit: int = 1000,
+    user: User = Depends(get_current_user)
+):
+    """Check that rollup leaderboards match the raw formulas (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if category.value not in BUCKETED_CATEGORIES:
+        raise HTTPException(status_code=400, detail="Category is not served from rollups")
+    
+    return await verify_score_buckets(category.value, period, limit)
+
+# ============== ANALYTICS ==============
+
+# Seconds a computed report is reused before it is rebuilt
+ANALYTICS_TTL = 600
+# Rows per cursor batch converted to NumPy arrays while loading
+ANALYTICS_BATCH_SIZE = 50000
+WEEK_SECONDS = 7 * 86400
+# 1970-01-05 was a Monday; weeks are counted from there
+WEEK_ORIGIN = 4 * 86400
+ATTENDANCE_DURATION_BINS = [0, 15, 30, 60, 90, 120, 180, 240, 360]
+
+analytics_reports = SingleFlight("analytics", ttl=ANALYTICS_TTL)
+
+async def load_columns(
+    collection,
+    query: Dict[str, Any],
+    columns: Dict[str, str],
+    codes: Optional[Dict[str, Dict[Any, int]]] = None
+) -> Dict[str, np.ndarray]:
+    """Stream projected fields of matching documents into NumPy arrays
+    
+    `columns` maps each field to a kind: "time" (epoch seconds, converted
+    server-side), "number", or "code" (dense int ids assigned through the
+    per-field dicts in `codes`). Rows are converted batch by batch so no
+    Python-object copy of the whole result is ever held.
+    """
+    codes = codes if codes is not None else {}
+    project: Dict[str, Any] = {"_id": 0}
+    for field, kind in columns.items():
+        project[field] = {"$toLong": {"$toDate": f"${field}"}} if kind == "time" else 1
+        if kind == "code":
+            codes.setdefault(field, {})
+    
+    chunks: Dict[str, List[np.ndarray]] = {field: [] for field in columns}
+    rows: Dict[str, List[Any]] = {field: [] for field in columns}
+    
+    def flush():
+        for field, kind in columns.items():
+            values = rows[field]
+            if kind == "code":
+                mapping = codes[field]
+                chunks[field].append(np.fromiter(
+                    (mapping.setdefault(v, len(mapping)) for v in values), dtype=np.int64, count=len(values)
+                ))
+            else:
+                array = np.array(values, dtype=float)
+                chunks[field].append(array / 1000 if kind == "time" else array)
+            rows[field] = []
+    
+    cursor = collection.aggregate(
+        [{"$match": query}, {"$project": project}],
+        batchSize=ANALYTICS_BATCH_SIZE
+    )
+    count = 0
+    async for doc in cursor:
+        for field in columns:
+            rows[field].append(doc.get(field))
+        count += 1
+        if count % ANALYTICS_BATCH_SIZE == 0:
+            flush()
+    flush()
+    
+    return {
+        field: np.concatenate(parts) if parts else np.zeros(0)
+        for field, parts in chunks.items()
+    }
+
+def week_index(seconds: np.ndarray) -> np.ndarray:
+    return np.floor((seconds - WEEK_ORIGIN) / WEEK_SECONDS)
+
+def week_start(index: float) -> str:
+    return datetime.fromtimestamp(index * WEEK_SECONDS + WEEK_ORIGIN, tz=timezone.utc).isoformat()
+
+def retention_cohorts(
+    user_codes: np.ndarray,
+    signups: np.ndarray,
+    active_codes: np.ndarray,
+    active_times: np.ndarray,
+    weeks: int,
+    now: float
+) -> List[Dict[str, Any]]:
+    """Share of each weekly signup cohort active N weeks after joining"""
+    n_users = int(user_codes.max()) + 1 if len(user_codes) else 0
+    # Duplicate user documents share a code; the earliest signup wins
+    signup_by_user = np.full(n_users, np.inf)
+    np.minimum.at(signup_by_user, user_codes, np.nan_to_num(signups, nan=np.inf))
+    
+    first_week = week_index(np.array([now]))[0] - weeks + 1
+    cohort = week_index(signup_by_user) - first_week
+    in_window = np.isfinite(cohort) & (cohort >= 0)
+    sizes = np.bincount(cohort[in_window].astype(np.int64), minlength=weeks)
+    
+    # Events from users without a user document have codes past n_users
+    known = (active_codes < n_users) & np.isfinite(active_times)
+    users = active_codes[known]
+    offset = week_index(active_times[known]) - first_week - cohort[users]
+    keep = in_window[users] & (offset >= 0) & (offset < weeks)
+    users, offset = users[keep], offset[keep].astype(np.int64)
+    
+    # Count each user at most once per week offset
+    pairs = np.unique(users * weeks + offset)
+    active_users = pairs // weeks
+    cells = cohort[active_users].astype(np.int64) * weeks + pairs % weeks
+    active = np.bincount(cells, minlength=weeks * weeks).reshape(weeks, weeks)
+    
+    return [
+        {
+            "week_start": week_start(first_week + c),
+            "users": int(sizes[c]),
+            # Offsets that haven't happened yet for this cohort are omitted
+            "retention": [
+                round(float(active[c, o] / sizes[c]), 4) if sizes[c] else None
+                for o in range(weeks - c)
+            ]
+        }
+        for c in range(weeks)
+    ]
+
+def duration_distribution(durations: np.ndarray) -> Dict[str, Any]:
+    """Histogram and summary statistics of session lengths in minutes"""
+    if not len(durations):
+        return {"count": 0, "histogram": [], "percentiles": {}, "mean": None}
+    
+    edges = np.array(ATTENDANCE_DURATION_BINS + [np.inf])
+    counts, _ = np.histogram(durations, bins=edges)
+    p50, p75, p90, p99 = np.percentile(durations, [50, 75, 90, 99])
+    
+    return {
+        "count": int(len(durations)),
+        "mean": round(float(durations.mean()), 2),
+        "percentiles": {
+            "p50": float(p50), "p75": float(p75), "p90": float(p90), "p99": float(p99)
+        },
+        "histogram": [
+            {
+                "min_minutes": int(lo),
+                "max_minutes": None if np.isinf(hi) else int(hi),
+                "count": int(n),
+                "share": round(float(n / len(durations)), 4)
+            }
+            for lo, hi, n in zip(edges[:-1], edges[1:], counts)
+        ]
+    }
+
+def xp_source_mix(types: np.ndarray, amounts: np.ndarray, times: np.ndarray, type_names: List[str]) -> Dict[str, Any]:
+    """XP totals per event type, overall and per week"""
+    n_types = len(type_names)
+    amounts = np.nan_to_num(amounts)
+    totals = np.bincount(types, weights=amounts, minlength=n_types)
+    events = np.bincount(types, minlength=n_types)
+    grand_total = totals.sum()
+    
+    weeks = week_index(times)
+    first = np.nanmin(weeks) if len(weeks) else 0
+    week_pos = np.nan_to_num(weeks - first).astype(np.int64)
+    n_weeks = int(week_pos.max()) + 1 if len(week_pos) else 0
+    weekly = np.bincount(week_pos * n_types + types, weights=amounts, minlength=n_weeks * n_types)
+    weekly = weekly.reshape(n_weeks, n_types)
+    
+    order = np.argsort(-totals)
+    return {
+        "total_xp": int(grand_total),
+        "sources": [
+            {
+                "event_type": type_names[t],
+                "xp": int(totals[t]),
+                "events": int(events[t]),
+                "share": round(float(totals[t] / grand_total), 4) if grand_total else 0
+            }
+            for t in order
+        ],
+        "weekly": [
+            {
+                "week_start": week_start(first + w),
+                "xp": {type_names[t]: int(weekly[w, t]) for t in order if weekly[w, t]}
+            }
+            for w in range(n_weeks)
+        ]
+    }
+
+def analytics_range(start: Optional[datetime], end: Optional[datetime]) -> tuple:
+    # Open-ended ranges stop at the next full hour so repeated calls share a cache key
+    end = as_utc(end) if end else start_of_hour(datetime.now(timezone.utc)) + timedelta(hours=1)
+    start = as_utc(start) if start else end - timedelta(days=90)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@api_router.get("/admin/analytics/retention")
+async def get_retention_cohorts(weeks: int = 12, user: User = Depends(get_current_user)):
+    """Weekly signup cohorts and their week-over-week activity (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    weeks = max(1, min(weeks, 52))
+    
+    async def build():
+        now = time.time()
+        since = datetime.fromtimestamp(
+            (week_index(np.array([now]))[0] - weeks + 1) * WEEK_SECONDS + WEEK_ORIGIN, tz=timezone.utc
+        )
+        codes: Dict[str, Dict[Any, int]] = {}
+        users = await load_columns(
+            db.users, {"created_at": {"$gte": since}}, {"user_id": "code", "created_at": "time"}, codes
+        )
+        events = await load_columns(
+            db.gamification_events, {"created_at": {"$gte": since}}, {"user_id": "code", "created_at": "time"}, codes
+        )
+        cohorts = await asyncio.to_thread(
+            retention_cohorts,
+            users["user_id"], users["created_at"], events["user_id"], events["created_at"], weeks, now
+        )
+        return {"weeks": weeks, "cohorts": cohorts, "generated_at": datetime.now(timezone.utc)}
+    
+    return await analytics_reports.do(("retention", weeks), build)
+
+@api_router.get("/admin/analytics/attendance-durations")
+async def get_attendance_durations(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user: User = Depends(get_current_user)
+):
+    """Distribution of completed studio session lengths (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    start, end = analytics_range(start, end)
+    
+    async def build():
+        columns = await load_columns(
+            db.attendance,
+            {"check_in": {"$gte": start, "$lt": end}, "check_out": {"$ne": None}},
+            {"duration_minutes": "number"}
+        )
+        durations = columns["duration_minutes"]
+        result = await asyncio.to_thread(duration_distribution, durations[np.isfinite(durations)])
+        return {"start": start, "end": end, **result, "generated_at": datetime.now(timezone.utc)}
+    
+    return await analytics_reports.do(("durations", start, end), build)
+
+@api_router.get("/admin/analytics/xp-sources")
+async def get_xp_sources(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user: User = Depends(get_current_user)
+):
+    """Where XP comes from, by gamification event type (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    start, end = analytics_range(start, end)
+    
+    async def build():
+        codes: Dict[str, Dict[Any, int]] = {}
+        columns = await load_columns(
+            db.gamification_events,
+            {"created_at": {"$gte": start, "$lt": end}},
+            {"event_type": "code", "xp_amount": "number", "created_at": "time"},
+            codes
+        )
+        type_names = [str(name) for name in codes["event_type"]]
+        result = await asyncio.to_thread(
+            xp_source_mix, columns["event_type"], columns["xp_amount"], columns["created_at"], type_names
+        )
+        return {"start": start, "end": end, **result, "generated_at": datetime.now(timezone.utc)}
+    
+    return await analytics_reports.do(("xp_sources", start, end), build)
+
 # ============== HELPER FUNCTIONS ==============
 
+# XP and badge rules; rebuild.py replays history with these same values
+TRACK_CREATED_XP = 50
+CONTRIBUTION_XP = 30
+MATCH_WIN_XP = 50
+ATTENDANCE_XP_CAP = 120
+STREAK_BADGES = {7: "week_warrior", 30: "monthly_legend", 100: "century_club"}
+LEVEL_BADGES = {5: "rising_star", 10: "veteran", 25: "elite_member", 50: "legend"}
+
+def attendance_xp(duration_minutes: int) -> int:
+    """1 XP per minute in the studio, up to ATTENDANCE_XP_CAP"""
+    return min(duration_minutes, ATTENDANCE_XP_CAP)
+
+def score_xp(score: int, kills: int, rank_position: int) -> int:
+    """XP for a submitted game score"""
+    xp_earned = min(score // 100, 50) + (kills * 5)
+    if rank_position == 1:
+        xp_earned += 100
+    elif rank_position <= 3:
+        xp_earned += 50
+    return xp_earned
+
+def level_progress(lifetime_xp: int) -> tuple:
+    """(level, xp into that level) for a lifetime XP total; inverse of total_xp"""
+    level = max(1, int((1 + math.sqrt(1 + lifetime_xp / 125)) / 2))
+    # Correct for float rounding at exact level boundaries
+    while total_xp(level + 1, 0) <= lifetime_xp:
+        level += 1
+    while level > 1 and total_xp(level, 0) > lifetime_xp:
+        level -= 1
+    return level, lifetime_xp - total_xp(level, 0)
+
+def xp_update_pipeline(amount: int) -> List[Dict[str, Any]]:
+    """Update pipeline that adds XP and applies level ups in a single write
+    
+    Mirrors add_xp's rule (level N needs N * 1000 XP) in closed form: a user at
+    level L has 500 * L * (L - 1) XP banked in previous levels.
+    """
+    total = {"$add": [
+        {"$multiply": [500, {"$ifNull": ["$level", 1]}, {"$subtract": [{"$ifNull": ["$level", 1]}, 1]}]},
+        {"$ifNull": ["$xp", 0]},
+        amount
+    ]}
+    return [
+        {"$set": {"_total_xp": total}},
+        {"$set": {"level": {"$toInt": {"$floor": {"$divide": [
+            {"$add": [1, {"$sqrt": {"$add": [1, {"$divide": ["$_total_xp", 125]}]}}]},
+            2
+        ]}}}}},
+        {"$set": {"xp": {"$toInt": {"$subtract": [
+            "$_total_xp",
+            {"$multiply": [500, "$level", {"$subtract": ["$level", 1]}]}
+        ]}}}},
+        {"$set": {"xp_updated_at": "$$NOW"}},
+        {"$unset": "_total_xp"}
+    ]
+
+
 async def add_xp(user_id: str, amount: int, category: str, description: str):
     """Add XP to user and handle level ups"""
     user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
@@ -1293,8 +5256,9 @@ async def add_xp(user_id: str, amount: int, category: str, description: str):
     
     await db.users.update_one(
         {"user_id": user_id},
-        {"$set": {"xp": new_xp, "level": new_level}}
+        {"$set": {"xp": new_xp, "level": new_level, "xp_updated_at": datetime.now(timezone.utc)}}
     )
+    xp_ranking.update(user_id, total_xp(new_level, new_xp))
     
     # Log gamification event
     await log_gamification_event(user_id, category, amount, description)
@@ -1323,6 +5287,7 @@ async def log_activity(user_id: str, user_name: str, activity_type: str, descrip
         metadata=metadata or {}
     )
     await db.activity_feed.insert_one(activity.dict())
+    activity_channel.publish("activity", activity.dict())
 
 async def log_audit(user_id: str, action: str, resource_type: str, resource_id: str, details: dict = None):
     """Log an admin audit action"""
@@ -1336,44 +5301,79 @@ async def log_audit(user_id: str, action: str, resource_type: str, resource_id:
     await db.audit_logs.insert_one(log.dict())
 
 async def update_streak(user_id: str):
-    """Update user's attendance streak"""
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-    if not user:
-        return
-    
-    last_active = user.get("last_active")
+    """Update user's attendance streak in one conditional write"""
     now = datetime.now(timezone.utc)
+    # Calendar days (UTC) since the last check-in, null for first-timers
+    days_diff = {"$cond": [
+        {"$ifNull": ["$last_active", False]},
+        {"$dateDiff": {
+            "startDate": {"$toDate": "$last_active"},
+            "endDate": now,
+            "unit": "day",
+            "timezone": "UTC"
+        }},
+        None
+    ]}
     
-    if last_active:
-        if isinstance(last_active, str):
-            last_active = datetime.fromisoformat(last_active)
-        if last_active.tzinfo is None:
-            last_active = last_active.replace(tzinfo=timezone.utc)
-        
-        days_diff = (now.date() - last_active.date()).days
-        
-        if days_diff == 1:
-            # Continue streak
-            new_streak = user.get("streak_days", 0) + 1
-        elif days_diff == 0:
-            # Same day, keep streak
-            new_streak = user.get("streak_days", 0)
-        else:
-            # Streak broken
-            new_streak = 1
-    else:
-        new_streak = 1
-    
-    await db.users.update_one(
+    user = await db.users.find_one_and_update(
         {"user_id": user_id},
-        {"$set": {
-            "streak_days": new_streak,
+        [{"$set": {
+            "streak_days": {"$let": {
+                "vars": {"days_diff": days_diff},
+                "in": {"$switch": {
+                    "branches": [
+                        # Continue streak
+                        {"case": {"$eq": ["$$days_diff", 1]}, "then": {"$add": [{"$ifNull": ["$streak_days", 0]}, 1]}},
+                        # Same day, keep streak
+                        {"case": {"$eq": ["$$days_diff", 0]}, "then": {"$ifNull": ["$streak_days", 0]}}
+                    ],
+                    # Streak broken or first check-in
+                    "default": 1
+                }}
+            }},
             "last_active": now
-        }}
+        }}],
+        projection={"_id": 0, "streak_days": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not user:
+        return
     
     # Check for streak badges
-    await check_streak_badges(user_id, new_streak)
+    await check_streak_badges(user_id, user["streak_days"])
+
+async def reconcile_streaks() -> int:
+    """Reset the streaks of everyone who missed a day, in one batched write"""
+    # Active yesterday can still continue today; anything older is broken
+    cutoff = start_of_day(datetime.now(timezone.utc)) - timedelta(days=1)
+    broken = db.users.aggregate([
+        {"$match": {"streak_days": {"$gt": 0}, "last_active": {"$lt": cutoff}}},
+        {"$project": {"_id": 0, "user_id": 1}}
+    ])
+    
+    updates = [
+        UpdateOne(
+            {"user_id": u["user_id"], "last_active": {"$lt": cutoff}},
+            {"$set": {"streak_days": 0}}
+        )
+        async for u in broken
+    ]
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+    
+    logger.info(f"Reset {len(updates)} broken streaks")
+    return len(updates)
+
+async def streak_reconciliation_loop():
+    """Nightly job resetting lapsed streaks shortly after UTC midnight"""
+    while True:
+        now = datetime.now(timezone.utc)
+        next_run = start_of_day(now) + timedelta(days=1, minutes=5)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            await reconcile_streaks()
+        except Exception:
+            logger.exception("Streak reconciliation failed")
 
 async def award_badge(user_id: str, badge_id: str):
     """Award a badge to user if not already earned"""
@@ -1400,26 +5400,13 @@ async def award_badge(user_id: str, badge_id: str):
 
 async def check_streak_badges(user_id: str, streak_days: int):
     """Check and award streak badges"""
-    streak_badges = {
-        7: "week_warrior",
-        30: "monthly_legend",
-        100: "century_club"
-    }
-    
-    for threshold, badge_id in streak_badges.items():
+    for threshold, badge_id in STREAK_BADGES.items():
         if streak_days >= threshold:
             await award_badge(user_id, badge_id)
 
 async def check_level_badges(user_id: str, level: int):
     """Check and award level badges"""
-    level_badges = {
-        5: "rising_star",
-        10: "veteran",
-        25: "elite_member",
-        50: "legend"
-    }
-    
-    for threshold, badge_id in level_badges.items():
+    for threshold, badge_id in LEVEL_BADGES.items():
         if level >= threshold:
             await award_badge(user_id, badge_id)
 
@@ -1590,6 +5577,7 @@ async def seed_data():
         "start_date": datetime(2025, 6, 1, tzinfo=timezone.utc),
         "end_date": datetime(2025, 8, 31, tzinfo=timezone.utc),
         "is_active": True,
+        "category": "hybrid_master",
         "rewards": [
             {"rank": 1, "title": "Gold", "reward": "Exclusive Gold Badge + 5000 XP"},
             {"rank": 2, "title": "Silver", "reward": "Silver Badge + 3000 XP"},
@@ -1634,6 +5622,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def ensure_indexes():
+    """Create the indexes used by range aggregations and snapshots"""
+    await db.attendance.create_index([("check_in", ASCENDING)])
+    await db.attendance.create_index([("check_out", ASCENDING), ("user_id", ASCENDING)])
+    await db.activity_feed.create_index([("created_at", DESCENDING)])
+    for field in ("xp", "level", "last_active", "created_at"):
+        await db.users.create_index([(field, DESCENDING), ("user_id", DESCENDING)])
+    await db.users.create_index([("xp_updated_at", ASCENDING)])
+    await db.users.create_index([("name_lower", ASCENDING)])
+    await db.users.create_index([("email_lower", ASCENDING)])
+    await db.gamification_events.create_index([("created_at", DESCENDING), ("event_id", DESCENDING)])
+    await db.attendance.create_index([("user_id", ASCENDING), ("check_in", ASCENDING)])
+    await db.tracks.create_index([("created_by", ASCENDING), ("created_at", ASCENDING)])
+    await db.track_contributions.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+    await db.game_scores.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+    await db.game_matches.create_index([("winner_id", ASCENDING), ("status", ASCENDING)])
+    await db.user_badges.create_index([("user_id", ASCENDING), ("badge_id", ASCENDING)])
+    await db.gamification_events.create_index([
+        ("user_id", ASCENDING), ("created_at", DESCENDING), ("event_id", DESCENDING)
+    ])
+    await db.gamification_events.create_index([
+        ("event_type", ASCENDING), ("created_at", DESCENDING), ("event_id", DESCENDING)
+    ])
+    # Replaces an index that covered flagged events only; both filters use it now
+    flag_index = "flagged_1_created_at_-1_event_id_-1"
+    if "partialFilterExpression" in (await db.gamification_events.index_information()).get(flag_index, {}):
+        await db.gamification_events.drop_index(flag_index)
+    await db.gamification_events.create_index([
+        ("flagged", ASCENDING), ("created_at", DESCENDING), ("event_id", DESCENDING)
+    ])
+    await db.audit_logs.create_index([("created_at", DESCENDING), ("log_id", DESCENDING)])
+    await db.audit_logs.create_index([("user_id", ASCENDING), ("created_at", DESCENDING), ("log_id", DESCENDING)])
+    await db.audit_logs.create_index([("action", ASCENDING), ("created_at", DESCENDING), ("log_id", DESCENDING)])
+    await db.audit_logs.create_index([
+        ("resource_type", ASCENDING), ("resource_id", ASCENDING), ("created_at", DESCENDING), ("log_id", DESCENDING)
+    ])
+    await db.tracks.create_index([
+        ("created_at", ASCENDING), ("created_by", ASCENDING), ("listens", ASCENDING), ("likes", ASCENDING)
+    ])
+    await db.track_contributions.create_index([("created_at", ASCENDING), ("user_id", ASCENDING)])
+    await db.tracks.create_index([("trending_score", DESCENDING), ("created_at", DESCENDING)])
+    await db.tracks.create_index(
+        [("title", TEXT), ("description", TEXT)],
+        weights={"title": 10, "description": 2},
+        name="tracks_text"
+    )
+    await db.tracks.create_index([("genre", ASCENDING), ("created_at", DESCENDING)])
+    await db.tracks.create_index([("contributors", ASCENDING), ("created_at", DESCENDING)])
+    await db.tracks.create_index([("contribution_types", ASCENDING), ("created_at", DESCENDING)])
+    await db.track_activity.create_index([("track_id", ASCENDING), ("hour", ASCENDING)], unique=True)
+    await db.track_activity.create_index([("hour", ASCENDING)])
+    await db["images.files"].create_index([("filename", ASCENDING), ("uploadDate", ASCENDING)])
+    await db.rate_limits.create_index([("key", ASCENDING)], unique=True)
+    await db.rate_limits.create_index([("updated_at", ASCENDING)], expireAfterSeconds=3600)
+    await db.audio_uploads.create_index([("upload_id", ASCENDING)], unique=True)
+    await db.audio_uploads.create_index([("updated_at", ASCENDING)])
+    await db["track_audio.chunks"].create_index([("files_id", ASCENDING), ("n", ASCENDING)], unique=True)
+    await db["track_audio.files"].create_index([("filename", ASCENDING), ("uploadDate", ASCENDING)])
+    await db.game_matches.create_index([("match_id", ASCENDING)], unique=True)
+    await db.game_matches.create_index([("status", ASCENDING), ("ended_at", ASCENDING)])
+    await db.player_ratings.create_index([("user_id", ASCENDING), ("game_type", ASCENDING)], unique=True)
+    await db.player_ratings.create_index([("game_type", ASCENDING), ("rating", DESCENDING)])
+    await db.job_leases.create_index("name", unique=True)
+    await db.game_matches.create_index(
+        [("ratings_pending", ASCENDING), ("ended_at", ASCENDING)],
+        partialFilterExpression={"ratings_pending": True}
+    )
+    await db.game_scores.create_index([("match_id", ASCENDING), ("score", DESCENDING)])
+    await db.game_scores.create_index([("match_id", ASCENDING), ("created_at", ASCENDING)])
+    await db.game_scores.create_index([
+        ("created_at", ASCENDING), ("user_id", ASCENDING), ("score", ASCENDING),
+        ("kills", ASCENDING), ("deaths", ASCENDING), ("rank_position", ASCENDING)
+    ])
+    await db.game_scores.create_index([
+        ("game_type", ASCENDING), ("created_at", ASCENDING), ("user_id", ASCENDING), ("score", ASCENDING),
+        ("kills", ASCENDING), ("deaths", ASCENDING), ("rank_position", ASCENDING)
+    ])
+    await db.seasons.create_index([("is_active", ASCENDING), ("start_date", DESCENDING)])
+    await db.seasons.create_index([("end_date", ASCENDING)])
+    await db.studio_sessions.create_index([("session_id", ASCENDING)], unique=True)
+    await db.studio_presence.create_index([("user_id", ASCENDING)], unique=True)
+    await db.users.create_index([("user_id", ASCENDING)])
+    await db.users.create_index(
+        [("last_active", ASCENDING)],
+        partialFilterExpression={"streak_days": {"$gt": 0}}
+    )
+    await db.session_bookings.create_index([("session_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+    await db.session_bookings.create_index([("session_id", ASCENDING), ("status", ASCENDING), ("queued_at", ASCENDING)])
+    await db.score_buckets.create_index(
+        [("user_id", ASCENDING), ("category", ASCENDING), ("day", ASCENDING)],
+        unique=True
+    )
+    await db.score_buckets.create_index([("category", ASCENDING), ("day", ASCENDING)])
+    await db.leaderboard_snapshots.create_index(
+        [("season_id", ASCENDING), ("category", ASCENDING), ("is_final", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"season_id": {"$type": "string"}}
+    )
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await ensure_indexes()
+    await build_xp_ranking()
+    await skill_cache.load()
+    await seed_presence()
+    await build_collaborator_graph()
+    start_image_pool()
+    app.state.background_tasks = [
+        asyncio.create_task(season_rollover_loop()),
+        asyncio.create_task(presence_sync_loop()),
+        asyncio.create_task(streak_reconciliation_loop()),
+        asyncio.create_task(trending_loop()),
+        asyncio.create_task(collaborator_sync_loop()),
+        asyncio.create_task(ranking_sync_loop()),
+        asyncio.create_task(live_match_sync_loop()),
+        asyncio.create_task(audio_upload_cleanup_loop()),
+        asyncio.create_task(ratings_sweep_loop())
+    ]
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    stop_image_pool()
     client.close()
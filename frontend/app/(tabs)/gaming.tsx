@@ -204,7 +204,7 @@ export default function Gaming() {
                         <View style={styles.avatarStack}>
                           {match.participant_details?.slice(0, 4).map((p: any, i: number) => (
                             <View key={p.user_id} style={[styles.stackedAvatar, { marginLeft: i > 0 ? -10 : 0 }]}>
-                              <Avatar uri={p.picture} name={p.name} size="sm" />
+                              <Avatar uri={p.picture} variants={p.picture_variants} name={p.name} size="sm" />
                             </View>
                           ))}
                         </View>
@@ -255,7 +255,7 @@ export default function Gaming() {
                     {match.scores && match.scores.length > 0 && (
                       <View style={styles.scoresRow}>
                         {match.scores.slice(0, 3).map((score: any, i: number) => (
-                          <View key={score.score_id} style={styles.scoreItem}>
+                          <View key={score.user_id} style={styles.scoreItem}>
                             <Text style={styles.scoreRank}>#{i + 1}</Text>
                             <Text style={styles.scoreValue}>{score.score}</Text>
                           </View>
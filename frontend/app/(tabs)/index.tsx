@@ -121,7 +121,7 @@ export default function Dashboard() {
               <Text style={styles.userName}>{user?.name?.split(' ')[0] || 'Membro'}</Text>
             </View>
             <PressableScale onPress={() => router.push('/(tabs)/profile')}>
-              <Avatar uri={user?.picture} name={user?.name} size="md" showBorder />
+              <Avatar uri={user?.picture} variants={stats?.picture_variants} name={user?.name} size="md" showBorder />
             </PressableScale>
           </View>
         </AnimatedContainer>
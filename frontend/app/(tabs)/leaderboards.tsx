@@ -191,6 +191,7 @@ export default function Leaderboards() {
                   <View style={[styles.podiumPlace, styles.podiumSecond]}>
                     <Avatar
                       uri={leaderboardData.entries[1].picture}
+                      variants={leaderboardData.entries[1].picture_variants}
                       name={leaderboardData.entries[1].name}
                       size="md"
                     />
@@ -212,6 +213,7 @@ export default function Leaderboards() {
                     <Ionicons name="trophy" size={24} color="#FFD700" style={{ marginBottom: 8 }} />
                     <Avatar
                       uri={leaderboardData.entries[0].picture}
+                      variants={leaderboardData.entries[0].picture_variants}
                       name={leaderboardData.entries[0].name}
                       size="lg"
                       showBorder
@@ -233,6 +235,7 @@ export default function Leaderboards() {
                   <View style={[styles.podiumPlace, styles.podiumThird]}>
                     <Avatar
                       uri={leaderboardData.entries[2].picture}
+                      variants={leaderboardData.entries[2].picture_variants}
                       name={leaderboardData.entries[2].name}
                       size="md"
                     />
@@ -261,7 +264,7 @@ export default function Leaderboards() {
                 >
                   <View style={styles.rankContent}>
                     <Text style={styles.rankNumber}>#{entry.rank}</Text>
-                    <Avatar uri={entry.picture} name={entry.name} size="sm" />
+                    <Avatar uri={entry.picture} variants={entry.picture_variants} name={entry.name} size="sm" />
                     <View style={styles.rankInfo}>
                       <Text style={styles.rankName}>{entry.name}</Text>
                       <Text style={styles.rankLevel}>{t('gamification.level')} {entry.level}</Text>
@@ -192,7 +192,7 @@ export default function Music() {
                       <View style={styles.avatarStack}>
                         {track.contributor_details.slice(0, 4).map((c: any, i: number) => (
                           <View key={c.user_id} style={[styles.stackedAvatar, { marginLeft: i > 0 ? -10 : 0 }]}>
-                            <Avatar uri={c.picture} name={c.name} size="sm" />
+                            <Avatar uri={c.picture} variants={c.picture_variants} name={c.name} size="sm" />
                           </View>
                         ))}
                       </View>
@@ -116,7 +116,7 @@ export default function Profile() {
         <AnimatedContainer animation="fadeInUp">
           <Card variant="elevated" style={styles.profileCard}>
             <View style={styles.profileHeader}>
-              <Avatar uri={user?.picture} name={user?.name} size="xl" showBorder />
+              <Avatar uri={user?.picture} variants={profile?.picture_variants} name={user?.name} size="xl" showBorder />
               <PressableScale style={styles.editButton}>
                 <Ionicons name="pencil" size={16} color={colors.text.primary} />
               </PressableScale>
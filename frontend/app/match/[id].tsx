@@ -248,7 +248,7 @@ export default function MatchDetail() {
                 style={[styles.participantCard, isWinner && styles.winnerCard]}
               >
                 <View style={styles.participantContent}>
-                  <Avatar uri={participant.picture} name={participant.name} size="md" />
+                  <Avatar uri={participant.picture} variants={participant.picture_variants} name={participant.name} size="md" />
                   <View style={styles.participantInfo}>
                     <View style={styles.participantNameRow}>
                       <Text style={styles.participantName}>{participant.name}</Text>
@@ -170,6 +170,7 @@ export default function TrackDetail() {
                 <View style={styles.contributorContent}>
                   <Avatar
                     uri={contributorDetails?.picture}
+                    variants={contributorDetails?.picture_variants}
                     name={contributorDetails?.name || 'Unknown'}
                     size="md"
                   />
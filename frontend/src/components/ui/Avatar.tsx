@@ -2,9 +2,11 @@ import React from 'react';
 import { View, Text, StyleSheet, ViewStyle } from 'react-native';
 import { Image } from 'expo-image';
 import { colors, borderRadius, typography } from '../../theme/colors';
+import { ImageVariants, imageVariantUrl } from '../../utils/api';
 
 interface AvatarProps {
   uri?: string | null;
+  variants?: ImageVariants | null;
   name?: string;
   size?: 'sm' | 'md' | 'lg' | 'xl';
   style?: ViewStyle;
@@ -13,6 +15,7 @@ interface AvatarProps {
 
 export const Avatar: React.FC<AvatarProps> = ({
   uri,
+  variants,
   name = '',
   size = 'md',
   style,
@@ -58,11 +61,14 @@ export const Avatar: React.FC<AvatarProps> = ({
     }),
   };
   
-  if (uri) {
+  // Uploaded pictures come in resized variants; small avatars only need the thumbnail
+  const source = imageVariantUrl(variants, size === 'sm' ? 'thumb' : 'small') || uri;
+  
+  if (source) {
     return (
       <View style={[containerStyle, style]}>
         <Image
-          source={{ uri }}
+          source={{ uri: source }}
           style={{ width: dimensions, height: dimensions }}
           contentFit="cover"
         />
@@ -5,6 +5,15 @@ const API_BASE = Constants.expoConfig?.extra?.EXPO_PUBLIC_BACKEND_URL ||
   process.env.EXPO_PUBLIC_BACKEND_URL || 
   'https://hub-elite-app.preview.emergentagent.com';
 
+export type ImageSize = 'thumb' | 'small' | 'large';
+export type ImageVariants = Record<ImageSize, { webp: string; jpg: string }>;
+
+// Absolute URL of a resized variant served by the backend, if the image has any
+export const imageVariantUrl = (
+  variants: ImageVariants | null | undefined,
+  size: ImageSize,
+): string | null => (variants?.[size] ? `${API_BASE}${variants[size].webp}` : null);
+
 export const api = {
   baseUrl: API_BASE,
 
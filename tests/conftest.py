@@ -0,0 +1,21 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py reads these at import time; the tests never reach a real MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "studio_hub_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """Point server.db at an in-memory mongomock database"""
+    from mongomock_motor import AsyncMongoMockClient
+    
+    database = AsyncMongoMockClient(tz_aware=True)["studio_hub_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
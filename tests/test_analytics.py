@@ -0,0 +1,76 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import server
+
+WEEK = server.WEEK_SECONDS
+
+def brute_force_cohorts(users, events, weeks, now):
+    """Reference retention table computed one row at a time"""
+    def week(t):
+        return math.floor((t - server.WEEK_ORIGIN) / WEEK)
+    
+    first_week = week(now) - weeks + 1
+    signup = {}
+    for code, t in users:
+        if not math.isnan(t):
+            signup[code] = min(signup.get(code, math.inf), t)
+    
+    cohort_of = {code: week(t) - first_week for code, t in signup.items() if week(t) >= first_week}
+    active = {}
+    for code, t in events:
+        if code not in cohort_of or math.isnan(t):
+            continue
+        offset = week(t) - first_week - cohort_of[code]
+        if 0 <= offset < weeks:
+            active.setdefault((cohort_of[code], offset), set()).add(code)
+    
+    table = []
+    for c in range(weeks):
+        size = sum(1 for cohort in cohort_of.values() if cohort == c)
+        table.append({
+            "week_start": server.week_start(first_week + c),
+            "users": size,
+            "retention": [
+                round(len(active.get((c, o), ())) / size, 4) if size else None
+                for o in range(weeks - c)
+            ]
+        })
+    return table
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_retention_cohorts_match_brute_force(seed):
+    rng = random.Random(seed)
+    weeks = 6
+    now = 1_750_000_000.0
+    start = now - weeks * WEEK
+    
+    users = []
+    for code in range(60):
+        users.append((code, start + rng.uniform(-WEEK, weeks * WEEK)))
+        if rng.random() < 0.1:
+            # Duplicate user document with a later signup
+            users.append((code, users[-1][1] + rng.uniform(0, WEEK)))
+    users.append((60, float("nan")))
+    
+    events = [
+        (rng.randrange(0, 65), start + rng.uniform(-WEEK, weeks * WEEK))
+        for _ in range(500)
+    ]
+    events.append((3, float("nan")))
+    
+    result = server.retention_cohorts(
+        np.array([u for u, _ in users]), np.array([t for _, t in users]),
+        np.array([u for u, _ in events]), np.array([t for _, t in events]),
+        weeks, now
+    )
+    assert result == brute_force_cohorts(users, events, weeks, now)
+
+def test_retention_cohorts_empty():
+    empty = np.zeros(0)
+    result = server.retention_cohorts(empty.astype(np.int64), empty, empty.astype(np.int64), empty, 3, 1_750_000_000.0)
+    assert [row["users"] for row in result] == [0, 0, 0]
+    assert [row["retention"] for row in result] == [[None, None, None], [None, None], [None]]
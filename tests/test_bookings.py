@@ -0,0 +1,53 @@
+import asyncio
+
+import server
+
+async def make_session(db, capacity: int, booked=(), waitlisted=()):
+    await db.session_bookings.create_index(
+        [("session_id", server.ASCENDING), ("user_id", server.ASCENDING)], unique=True
+    )
+    await db.studio_sessions.insert_one({"session_id": "session_1", "max_participants": capacity, "booked": len(booked)})
+    for user_id in booked:
+        await db.session_bookings.insert_one(server.SessionBooking(session_id="session_1", user_id=user_id).dict())
+    for user_id in waitlisted:
+        await db.session_bookings.insert_one(
+            server.SessionBooking(session_id="session_1", user_id=user_id, status="waitlisted").dict()
+        )
+
+async def seats(db):
+    session = await db.studio_sessions.find_one({"session_id": "session_1"})
+    bookings = await db.session_bookings.find({"status": "booked"}, {"_id": 0, "user_id": 1}).to_list(None)
+    return session["booked"], sorted(b["user_id"] for b in bookings)
+
+def test_walk_ins_take_seats_until_full(mock_db):
+    async def run():
+        await make_session(mock_db, 2, booked=["user_1"])
+        admitted = [await server.seat_for_check_in("session_1", u) for u in ("user_1", "user_2", "user_3")]
+        return admitted, await seats(mock_db)
+    
+    admitted, (booked, holders) = asyncio.run(run())
+    assert admitted == [True, True, False]
+    assert booked == 2
+    assert holders == ["user_1", "user_2"]
+
+def test_waitlisted_member_is_promoted_at_check_in(mock_db):
+    async def run():
+        await make_session(mock_db, 2, booked=["user_1"], waitlisted=["user_2"])
+        admitted = await server.seat_for_check_in("session_1", "user_2")
+        return admitted, await seats(mock_db)
+    
+    admitted, (booked, holders) = asyncio.run(run())
+    assert admitted
+    assert booked == 2
+    assert holders == ["user_1", "user_2"]
+
+def test_concurrent_walk_ins_never_overbook(mock_db):
+    async def run():
+        await make_session(mock_db, 3)
+        users = [f"user_{i}" for i in range(8)] * 2
+        admitted = await asyncio.gather(*[server.seat_for_check_in("session_1", u) for u in users])
+        return admitted, await seats(mock_db)
+    
+    admitted, (booked, holders) = asyncio.run(run())
+    assert booked == len(holders) == 3
+    assert sum(admitted) >= 3
@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+import server
+
+def dense_scores(graph, u):
+    """Reference recommendation scores from the dense adjacency matrix"""
+    n = len(graph.user_ids)
+    adjacency = np.zeros((n, n))
+    for x in range(n):
+        indices, data = graph.row(x)
+        np.add.at(adjacency[x], indices, data)
+    two_hop = adjacency[u] @ adjacency
+    
+    profiles = graph.profiles[:n]
+    totals = profiles.sum(axis=1, keepdims=True)
+    shares = np.divide(profiles, totals, out=np.zeros_like(profiles), where=totals > 0)
+    complement = shares @ (server.COMPLEMENT_MATRIX @ shares[u])
+    if two_hop.max() > 0:
+        two_hop = two_hop / two_hop.max()
+    scores = two_hop * (1 + complement) + 0.1 * complement
+    scores[u] = 0
+    scores[adjacency[u] > 0] = 0
+    return scores
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_recommend_matches_dense_two_hop(compact):
+    rng = random.Random(8)
+    graph = server.CollaboratorGraph()
+    for _ in range(300):
+        graph.add(f"track_{rng.randrange(40)}", f"user_{rng.randrange(30)}", rng.choice(server.CONTRIBUTION_TYPES))
+    if compact:
+        graph.compact()
+    
+    for user_id in ("user_0", "user_7", "user_19"):
+        expected = dense_scores(graph, graph.user_index[user_id])
+        recommended = graph.recommend(user_id, 10)
+        assert recommended
+        for r in recommended:
+            assert r["score"] == pytest.approx(expected[graph.user_index[r["user_id"]]], abs=1e-4)
+        top = sorted(expected, reverse=True)[:len(recommended)]
+        assert [r["score"] for r in recommended] == pytest.approx(top, abs=1e-4)
+
+def test_recommend_without_collaborators():
+    graph = server.CollaboratorGraph()
+    graph.add("track_1", "user_1", server.CONTRIBUTION_TYPES[0])
+    assert graph.recommend("user_1", 5) == []
+    assert graph.recommend("unknown", 5) == []
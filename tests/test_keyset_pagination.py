@@ -0,0 +1,89 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+async def page_through(collection, field: str, descending: bool, page_size: int):
+    """Walk the collection with keyset pagination, as the admin endpoints do"""
+    direction = -1 if descending else 1
+    seen, last = [], None
+    while True:
+        query = {}
+        if last is not None:
+            query = server.keyset_filter(field, last.get(field), "user_id", last["user_id"], descending)
+        page = await collection.find(query, {"_id": 0}).sort(
+            [(field, direction), ("user_id", direction)]
+        ).limit(page_size).to_list(page_size)
+        if not page:
+            return seen
+        seen.extend(page)
+        last = page[-1]
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("page_size", [1, 3, 7])
+def test_keyset_pages_match_full_sort(mock_db, descending, page_size):
+    rng = random.Random(5)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    
+    async def run():
+        for i in range(40):
+            doc = {"user_id": f"user_{i:02d}", "xp": rng.choice([0, 10, 10, 50, 200])}
+            # Ties, explicit nulls and missing fields all need a stable position
+            roll = rng.random()
+            if roll < 0.15:
+                doc["last_active"] = None
+            elif roll < 0.75:
+                doc["last_active"] = base + timedelta(days=rng.randrange(0, 5))
+            await mock_db.users.insert_one(doc)
+        
+        direction = -1 if descending else 1
+        results = {}
+        for field in ("xp", "last_active"):
+            expected = await mock_db.users.find({}, {"_id": 0}).sort(
+                [(field, direction), ("user_id", direction)]
+            ).to_list(None)
+            paged = await page_through(mock_db.users, field, descending, page_size)
+            results[field] = ([d["user_id"] for d in expected], [d["user_id"] for d in paged])
+        return results
+    
+    for expected, paged in asyncio.run(run()).values():
+        assert paged == expected
+
+def test_cursor_round_trip():
+    when = datetime(2025, 6, 1, 12, 30, tzinfo=timezone.utc)
+    values = [when, "user_1", None, 42]
+    assert server.decode_cursor(server.encode_cursor(values)) == values
+
+def test_invalid_cursor_rejected():
+    with pytest.raises(HTTPException) as error:
+        server.decode_cursor("not-a-cursor")
+    assert error.value.status_code == 400
+
+def test_flagged_filter_after_backfill(mock_db):
+    admin = server.User(user_id="admin", email="admin@example.com", name="Admin", is_admin=True)
+    
+    async def run():
+        for i in range(4):
+            await server.log_gamification_event(f"user_{i}", "attendance", 10, "Studio session")
+        # Logged before flagged was stored
+        await mock_db.gamification_events.insert_one({"event_id": "event_legacy", "user_id": "user_9", "event_type": "gaming"})
+        events = await mock_db.gamification_events.find({}, {"_id": 0, "event_id": 1}).to_list(None)
+        await server.flag_event(events[0]["event_id"], "duplicate", admin)
+        
+        backfilled = await server.backfill_event_flags()
+        pages = {}
+        for flagged in (True, False, None):
+            page = await server.get_gamification_events(flagged=flagged, user=admin)
+            pages[flagged] = page["items"]
+        return backfilled, pages
+    
+    backfilled, pages = asyncio.run(run())
+    assert backfilled == {"updated": 1}
+    assert len(pages[True]) == 1
+    assert len(pages[False]) == 4
+    assert "event_legacy" in {e["event_id"] for e in pages[False]}
+    assert len(pages[None]) == 5
@@ -0,0 +1,108 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+END = datetime(2025, 4, 1, tzinfo=timezone.utc)
+GAME_TYPES = [t.value for t in server.GameType]
+
+async def seed_history(db, seed: int = 7):
+    """Raw activity plus the buckets the live write paths record for it"""
+    rng = random.Random(seed)
+    users = [f"user_{i}" for i in range(12)]
+    
+    # A few days either side of the window to check the range edges
+    def when():
+        return START - timedelta(days=3) + timedelta(minutes=rng.randrange(0, 37 * 24 * 60))
+    
+    for _ in range(120):
+        user_id, check_in = rng.choice(users), when()
+        duration = rng.randrange(5, 240)
+        await db.attendance.insert_one({
+            "user_id": user_id, "check_in": check_in, "duration_minutes": duration
+        })
+        await server.record_bucket(user_id, "attendance", check_in, {"sessions": 1})
+        await server.record_bucket(user_id, "attendance", check_in, {"duration": duration})
+    
+    for _ in range(40):
+        user_id, created_at = rng.choice(users), when()
+        await db.tracks.insert_one({"created_by": user_id, "created_at": created_at, "listens": 0, "likes": 0})
+        await server.record_bucket(user_id, "music", created_at, {"tracks": 1})
+    
+    for _ in range(60):
+        user_id, created_at = rng.choice(users), when()
+        await db.track_contributions.insert_one({"user_id": user_id, "created_at": created_at})
+        await server.record_bucket(user_id, "music", created_at, {"contributions": 1})
+    
+    for _ in range(200):
+        user_id, created_at = rng.choice(users), when()
+        score = {
+            "user_id": user_id,
+            "created_at": created_at,
+            "game_type": rng.choice(GAME_TYPES),
+            "score": rng.randrange(0, 20000),
+            "kills": rng.randrange(0, 30),
+            "deaths": rng.randrange(0, 30),
+            "rank_position": rng.randrange(1, 6)
+        }
+        await db.game_scores.insert_one(score)
+        increments = {
+            "score": score["score"],
+            "kills": score["kills"],
+            "deaths": score["deaths"],
+            "wins": 1 if score["rank_position"] == 1 else 0,
+            "matches": 1
+        }
+        await server.record_bucket(user_id, "gaming", created_at, increments)
+        await server.record_bucket(
+            user_id, server.gaming_bucket_category(score["game_type"]), created_at, increments
+        )
+
+def scores(results):
+    return {r["_id"]: round(r["score"], 6) for r in results}
+
+@pytest.mark.parametrize("category,game_type", [
+    ("attendance_monthly", None),
+    ("gaming_ranked", None),
+    ("gaming_ranked", "fps"),
+    ("hybrid_master", None),
+])
+def test_bucket_leaderboard_matches_raw(mock_db, category, game_type):
+    async def run():
+        await seed_history(mock_db)
+        raw = await server.compute_leaderboard(category, START, END, 100, game_type)
+        rolled = await server.compute_leaderboard_from_buckets(category, START, END, 100, game_type)
+        return raw, rolled
+    
+    raw, rolled = asyncio.run(run())
+    
+    assert raw
+    assert scores(rolled) == scores(raw)
+    assert [r["_id"] for r in rolled] == [r["_id"] for r in raw]
+
+def test_seasonal_genre_board_uses_season_dates(mock_db):
+    now = datetime.now(timezone.utc)
+    
+    async def run():
+        await mock_db.seasons.insert_one({
+            "season_id": "season_test", "is_active": True,
+            "start_date": now - timedelta(days=5), "end_date": now + timedelta(days=5)
+        })
+        for user_id, days_ago in [("user_old", 20), ("user_new", 2)]:
+            await mock_db.users.insert_one({"user_id": user_id, "name": user_id, "level": 1})
+            await mock_db.game_scores.insert_one({
+                "user_id": user_id, "created_at": now - timedelta(days=days_ago), "game_type": "fps",
+                "score": 100, "kills": 1, "deaths": 1, "rank_position": 2
+            })
+        return await server.load_leaderboard(
+            "gaming_ranked", server.LeaderboardPeriod.SEASONAL, 10, "fps"
+        )
+    
+    board = asyncio.run(run())
+    
+    assert board["season_id"] == "season_test"
+    assert [e["user_id"] for e in board["entries"]] == ["user_new"]
@@ -0,0 +1,50 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import server
+
+@pytest.mark.parametrize("players,team_count", [(8, 2), (10, 3), (13, 4), (5, 5)])
+def test_balance_teams_partitions_players(players, team_count):
+    skills = np.random.default_rng(players).uniform(0, 100, players)
+    teams = server.balance_teams(skills, team_count)
+    
+    assert len(teams) == team_count
+    assert sorted(i for team in teams for i in team) == list(range(players))
+    sizes = [len(team) for team in teams]
+    assert max(sizes) - min(sizes) <= 1
+
+def test_balance_teams_splits_evenly_when_possible():
+    skills = np.array([10.0, 9.0, 8.0, 7.0, 6.0, 5.0, 4.0, 3.0])
+    teams = server.balance_teams(skills, 2)
+    assert [skills[team].sum() for team in teams] == [26.0, 26.0]
+
+def test_balance_teams_no_swap_narrows_the_gap():
+    for seed in range(20):
+        skills = np.random.default_rng(seed).uniform(0, 100, 12)
+        teams = server.balance_teams(skills, 3)
+        sums = [skills[team].sum() for team in teams]
+        hi, lo = int(np.argmax(sums)), int(np.argmin(sums))
+        gap = sums[hi] - sums[lo]
+        for a, b in itertools.product(teams[hi], teams[lo]):
+            assert abs(gap - 2 * (skills[a] - skills[b])) >= gap - 1e-9
+
+def test_seed_bracket_standard_order():
+    # Players listed weakest first, so index 7 is the top seed
+    skills = np.arange(8, dtype=float)
+    pairs = server.seed_bracket(skills)
+    seeds = [tuple(8 - p for p in pair) for pair in pairs]
+    assert seeds == [(1, 8), (4, 5), (2, 7), (3, 6)]
+
+def test_seed_bracket_byes_go_to_top_seeds():
+    skills = np.array([50.0, 90.0, 10.0, 70.0, 30.0])
+    pairs = server.seed_bracket(skills)
+    
+    assert len(pairs) == 4
+    byes = {player for player, opponent in pairs if opponent is None}
+    assert byes == {1, 3, 0}
+    assert sorted(p for pair in pairs for p in pair if p is not None) == list(range(5))
+    # The top two seeds sit in opposite halves
+    top_half = {p for pair in pairs[:2] for p in pair}
+    assert (1 in top_half) != (3 in top_half)
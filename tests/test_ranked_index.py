@@ -0,0 +1,39 @@
+import random
+
+import server
+
+def expected_order(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+def test_rank_and_slice_match_sorted_order():
+    rng = random.Random(3)
+    index = server.RankedIndex()
+    scores = {}
+    
+    for _ in range(3000):
+        user_id = f"user_{rng.randrange(400)}"
+        if rng.random() < 0.1:
+            index.discard(user_id)
+            scores.pop(user_id, None)
+        else:
+            score = rng.randrange(0, 50)
+            index.update(user_id, score)
+            scores[user_id] = score
+    
+    order = expected_order(scores)
+    assert len(index) == len(order)
+    assert index.slice(0, len(order)) == order
+    assert index.slice(10, 25) == order[10:25]
+    for position, (user_id, _) in enumerate(order):
+        assert index.rank(user_id) == position + 1
+
+def test_ties_rank_by_user_id_and_unknown_users():
+    index = server.RankedIndex()
+    index.update("b", 10)
+    index.update("a", 10)
+    index.update("c", 20)
+    
+    assert index.slice(0, 3) == [("c", 20), ("a", 10), ("b", 10)]
+    assert index.rank("b") == 3
+    assert index.rank("missing") is None
+    assert index.slice(5, 10) == []
@@ -0,0 +1,146 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import server
+
+def test_elo_deltas_head_to_head():
+    deltas = server.elo_deltas(np.array([1500.0, 1500.0]), np.array([1.0, 2.0]))
+    assert deltas[0] == pytest.approx(server.RATING_K_FACTOR / 2)
+    assert deltas[1] == pytest.approx(-server.RATING_K_FACTOR / 2)
+
+def test_elo_deltas_draw_between_equals():
+    deltas = server.elo_deltas(np.array([1600.0, 1600.0, 1600.0]), np.array([1.0, 1.0, 1.0]))
+    assert deltas == pytest.approx([0.0, 0.0, 0.0])
+
+def test_elo_deltas_zero_sum_and_upset():
+    ratings = np.array([1800.0, 1500.0, 1400.0, 1200.0])
+    deltas = server.elo_deltas(ratings, np.array([4.0, 3.0, 2.0, 1.0]))
+    assert deltas.sum() == pytest.approx(0.0)
+    # The favourite finishing last loses the most
+    assert deltas.argmin() == 0
+    assert deltas.argmax() == 3
+
+def test_elo_deltas_batch_ignores_padding():
+    rng = np.random.default_rng(3)
+    first = rng.uniform(1200, 1800, 4)
+    second = rng.uniform(1200, 1800, 2)
+    ratings = np.zeros((2, 4))
+    places = np.zeros((2, 4))
+    mask = np.zeros((2, 4), dtype=bool)
+    ratings[0], places[0], mask[0] = first, [2, 1, 4, 3], True
+    ratings[1, :2], places[1, :2], mask[1, :2] = second, [1, 2], True
+    
+    batch = server.elo_deltas_batch(ratings, places, mask)
+    assert batch[0] == pytest.approx(server.elo_deltas(first, np.array([2.0, 1.0, 4.0, 3.0])))
+    assert batch[1, :2] == pytest.approx(server.elo_deltas(second, np.array([1.0, 2.0])))
+    assert batch[1, 2:] == pytest.approx([0.0, 0.0])
+
+async def play_matches(db, seed: int = 11):
+    """Complete random matches, rating each one as complete_match does"""
+    rng = random.Random(seed)
+    users = [f"user_{i}" for i in range(8)]
+    game_types = [t.value for t in server.GameType][:2]
+    ended_at = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    for i in range(25):
+        match = {"match_id": f"match_{i}", "game_type": rng.choice(game_types)}
+        for position, user_id in enumerate(rng.sample(users, rng.randrange(2, 5)), start=1):
+            await db.game_scores.insert_one({
+                "match_id": match["match_id"], "user_id": user_id,
+                "score": rng.randrange(0, 100), "rank_position": rng.choice([0, position])
+            })
+        ended_at += timedelta(minutes=5)
+        await db.game_matches.insert_one({**match, "status": "completed", "ended_at": ended_at, "ratings_pending": True})
+        await server.apply_match_ratings(match["match_id"])
+
+def test_rebuild_ratings_matches_live_updates(mock_db, monkeypatch):
+    monkeypatch.setattr(server, "RATINGS_REBUILD_GRACE", 0)
+    
+    async def run():
+        await play_matches(mock_db)
+        live = await mock_db.player_ratings.find({}, {"_id": 0}).to_list(None)
+        result = await server.rebuild_ratings()
+        rebuilt = await mock_db.player_ratings.find({}, {"_id": 0}).to_list(None)
+        names = await mock_db.list_collection_names()
+        return live, rebuilt, result, names
+    
+    live, rebuilt, result, names = asyncio.run(run())
+    assert result["matches"] == 25
+    assert not [name for name in names if name.startswith("player_ratings_rebuild")]
+    
+    def by_key(docs):
+        return {(d["user_id"], d["game_type"]): (round(d["rating"], 6), d["matches"]) for d in docs}
+    assert by_key(rebuilt) == by_key(live)
+
+async def add_match(db, match_id: str, scores, ended_at):
+    await db.game_matches.insert_one({
+        "match_id": match_id, "game_type": server.GameType.FPS.value,
+        "status": "completed", "ended_at": ended_at, "ratings_pending": True
+    })
+    for user_id, score in scores:
+        await db.game_scores.insert_one({"match_id": match_id, "user_id": user_id, "score": score, "rank_position": 0})
+
+def test_concurrent_matches_sharing_a_player_both_count(mock_db):
+    ended_at = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    
+    async def run():
+        await add_match(mock_db, "match_a", [("user_1", 90), ("user_2", 10)], ended_at)
+        await add_match(mock_db, "match_b", [("user_1", 80), ("user_3", 20)], ended_at)
+        applied = await asyncio.gather(
+            server.apply_match_ratings("match_a"), server.apply_match_ratings("match_b"),
+            server.apply_match_ratings("match_a")
+        )
+        docs = await mock_db.player_ratings.find({"game_type": server.OVERALL_RATING}, {"_id": 0}).to_list(None)
+        return applied, {d["user_id"]: d for d in docs}
+    
+    applied, docs = asyncio.run(run())
+    # The repeated claim of match_a is a no-op
+    assert sorted(applied) == [False, True, True]
+    assert docs["user_1"]["matches"] == 2
+    # Elo is zero-sum, so a lost update would show up in the total
+    assert sum(d["rating"] for d in docs.values()) == pytest.approx(3 * server.DEFAULT_RATING)
+    win = server.elo_deltas(np.array([server.DEFAULT_RATING] * 2), np.array([1.0, 2.0]))[0]
+    assert docs["user_1"]["rating"] > server.DEFAULT_RATING + win
+
+def test_rebuild_applies_matches_completed_meanwhile(mock_db, monkeypatch):
+    monkeypatch.setattr(server, "RATINGS_REBUILD_GRACE", 0)
+    ended_at = datetime(2025, 4, 1, tzinfo=timezone.utc)
+    
+    async def run():
+        await mock_db.job_leases.create_index("name", unique=True)
+        await play_matches(mock_db)
+        # Completed while a rebuild holds the lease, so its rating is deferred
+        await mock_db.job_leases.insert_one({
+            "name": server.RATINGS_REBUILD_JOB, "expires_at": datetime.now(timezone.utc) + timedelta(minutes=1)
+        })
+        await add_match(mock_db, "match_late", [("user_1", 5), ("user_2", 50)], ended_at)
+        deferred = await server.apply_match_ratings("match_late")
+        with pytest.raises(server.HTTPException) as busy:
+            await server.rebuild_ratings()
+        await mock_db.job_leases.delete_many({})
+        
+        result = await server.rebuild_ratings()
+        rebuilt = await mock_db.player_ratings.find({}, {"_id": 0}).to_list(None)
+        pending = await mock_db.game_matches.count_documents({"ratings_pending": True})
+        leases = await mock_db.job_leases.count_documents({})
+        
+        # Rating the same history live gives the same pools
+        await mock_db.player_ratings.drop()
+        await mock_db.game_matches.update_many({}, {"$set": {"ratings_pending": True}})
+        await server.apply_pending_ratings()
+        live = await mock_db.player_ratings.find({}, {"_id": 0}).to_list(None)
+        return deferred, busy.value.status_code, result, rebuilt, pending, leases, live
+    
+    deferred, status, result, rebuilt, pending, leases, live = asyncio.run(run())
+    assert not deferred
+    assert status == 409
+    assert result["matches"] == 25
+    assert result["pending_applied"] == 1
+    assert pending == 0 and leases == 0
+    
+    def by_key(docs):
+        return {(d["user_id"], d["game_type"]): (round(d["rating"], 6), d["matches"]) for d in docs}
+    assert by_key(rebuilt) == by_key(live)
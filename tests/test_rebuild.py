@@ -0,0 +1,90 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import rebuild
+import server
+
+SIGNUP = datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc)
+
+def replay(check_in_days, now_day, created_at=SIGNUP):
+    user = {"user_id": "user_1", "created_at": created_at}
+    events = [(SIGNUP + timedelta(days=d, hours=2), 0, "check_in", None) for d in check_in_days]
+    return rebuild.replay_user(user, events, {}, {}, SIGNUP + timedelta(days=now_day, hours=12))
+
+def test_signup_day_check_in_keeps_streak_at_zero():
+    assert replay([0], 0)["streak_days"] == 0
+
+def test_streak_counts_days_after_signup():
+    assert replay([0, 1, 2], 2)["streak_days"] == 2
+    assert replay([1, 2, 3], 3)["streak_days"] == 3
+
+def test_gap_restarts_streak():
+    assert replay([1, 2, 4, 5], 5)["streak_days"] == 2
+
+def test_missed_yesterday_resets_streak():
+    assert replay([1, 2], 3)["streak_days"] == 2
+    assert replay([1, 2], 4)["streak_days"] == 0
+
+def test_replay_leaves_last_active_alone():
+    assert "last_active" not in replay([1, 2], 2)
+
+def test_replayed_xp_matches_live_awards(mock_db, monkeypatch):
+    """Capped attendance XP and a level badge paying its own xp_reward"""
+    monkeypatch.setattr(server, "xp_ranking", server.RankedIndex())
+    rng = random.Random(4)
+    rewards = {"rising_star": 800, "veteran": 0}
+    user = {"user_id": "user_1", "created_at": SIGNUP, "xp": 0, "level": 1}
+    events = []
+    
+    async def run():
+        await mock_db.users.insert_one(dict(user))
+        for badge_id, xp_reward in rewards.items():
+            await mock_db.badges.insert_one({"badge_id": badge_id, "name": badge_id, "xp_reward": xp_reward})
+        for day in range(60):
+            duration = rng.choice([30, 119, 120, 121, 600])
+            amount = server.attendance_xp(duration)
+            events.append((SIGNUP + timedelta(days=day, hours=3), 1, "xp", amount))
+            await server.add_xp("user_1", amount, "attendance", "Studio session")
+            if day % 7 == 0:
+                events.append((SIGNUP + timedelta(days=day, hours=4), 1, "xp", server.MATCH_WIN_XP * 10))
+                await server.add_xp("user_1", server.MATCH_WIN_XP * 10, "gaming", "Match victory!")
+        live = await mock_db.users.find_one({"user_id": "user_1"}, {"_id": 0})
+        badges = await mock_db.user_badges.find({"user_id": "user_1"}, {"_id": 0, "badge_id": 1}).to_list(None)
+        return live, {b["badge_id"] for b in badges}
+    
+    live, live_badges = asyncio.run(run())
+    rebuilt = rebuild.replay_user(user, events, {}, rewards, SIGNUP + timedelta(days=60))
+    assert live_badges == {"rising_star"}
+    assert set(rebuilt["badges"]) == live_badges
+    assert (rebuilt["level"], rebuilt["xp"]) == (live["level"], live["xp"])
+
+def test_rebuild_write_skips_users_changed_meanwhile(mock_db):
+    diff = {
+        "user_id": "user_1",
+        "state": {"level": 3, "xp": 250, "streak_days": 2},
+        "read": {"level": 2, "xp": 900, "streak_days": 2},
+        "badges_added": {},
+        "badges_removed": []
+    }
+    
+    async def run():
+        await mock_db.users.insert_one({"user_id": "user_1", "level": 2, "xp": 900, "streak_days": 2})
+        # XP earned between the replay's read and its write
+        await mock_db.users.update_one({"user_id": "user_1"}, {"$set": {"xp": 950}})
+        skipped = await mock_db.users.bulk_write(rebuild.diff_writes(diff)["users"])
+        await mock_db.users.update_one({"user_id": "user_1"}, {"$set": {"xp": 900}})
+        applied = await mock_db.users.bulk_write(rebuild.diff_writes(diff)["users"])
+        return skipped.matched_count, applied.matched_count, await mock_db.users.find_one({"user_id": "user_1"})
+    
+    skipped, applied, user = asyncio.run(run())
+    assert (skipped, applied) == (0, 1)
+    assert (user["level"], user["xp"]) == (3, 250)
+
+@pytest.mark.parametrize("lifetime_xp", [0, 1, 999, 1000, 1001, 2999, 3000, 123456, 10 ** 7])
+def test_level_progress_inverts_total_xp(lifetime_xp):
+    level, xp = server.level_progress(lifetime_xp)
+    assert server.total_xp(level, xp) == lifetime_xp
+    assert 0 <= xp < level * 1000
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+def bucket(hour, listens=0, likes=0):
+    return {"hour": hour, "listens": listens, "likes": likes}
+
+def test_trending_score_empty():
+    assert server.trending_score([]) is None
+    assert server.trending_score([bucket(server.TRENDING_EPOCH)]) is None
+
+def test_trending_score_halves_per_half_life():
+    hour = server.TRENDING_EPOCH + timedelta(days=30)
+    earlier = hour - timedelta(hours=server.TRENDING_HALF_LIFE_HOURS)
+    # The same activity one half-life earlier is worth half as much
+    assert server.trending_score([bucket(hour, listens=10)]) == pytest.approx(
+        server.trending_score([bucket(earlier, listens=20)])
+    )
+
+def test_trending_score_weights_likes():
+    hour = server.TRENDING_EPOCH + timedelta(days=3)
+    assert server.trending_score([bucket(hour, likes=1)]) == pytest.approx(
+        server.trending_score([bucket(hour, listens=server.TRENDING_LIKE_WEIGHT)])
+    )
+
+def test_trending_score_is_log2_of_decayed_sum():
+    hours = [server.TRENDING_EPOCH + timedelta(hours=h) for h in (0, 5, 50)]
+    buckets = [bucket(hours[0], listens=3), bucket(hours[1], likes=2), bucket(hours[2], listens=7)]
+    expected = sum(
+        w * 2 ** ((h - server.TRENDING_EPOCH).total_seconds() / 3600 / server.TRENDING_HALF_LIFE_HOURS)
+        for h, w in zip(hours, (3, 2 * server.TRENDING_LIKE_WEIGHT, 7))
+    )
+    assert 2 ** server.trending_score(buckets) == pytest.approx(expected)
+
+def test_new_activity_never_lowers_the_score(mock_db):
+    now = datetime.now(timezone.utc)
+    old_hour = server.start_of_hour(now - timedelta(days=8))
+    
+    async def run():
+        await mock_db.tracks.insert_one({"track_id": "track_1"})
+        await mock_db.track_activity.insert_one({"track_id": "track_1", **bucket(old_hour, listens=10000)})
+        await server.recompute_trending(old_hour)
+        idle = (await mock_db.tracks.find_one({"track_id": "track_1"}))["trending_score"]
+        
+        await server.record_track_activity("track_1", {"listens": 1})
+        await server.recompute_trending(now)
+        return idle, (await mock_db.tracks.find_one({"track_id": "track_1"}))["trending_score"]
+    
+    idle, after = asyncio.run(run())
+    assert idle == pytest.approx(server.trending_score([bucket(old_hour, listens=10000)]))
+    assert after > idle